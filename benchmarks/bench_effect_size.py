@@ -0,0 +1,66 @@
+"""Benchmark closed-form one-way ANOVA effect sizes against ols + anova_lm refits.
+
+Synthetic item scores are split into --groupings random subgroups (as when
+computing effect sizes per dataset or per bootstrap resample); the closed-form
+kernel evaluates all of them in one call, the formula API refits each one.
+The refits only run up to --refit-max groupings. Run from the repository root:
+
+    python benchmarks/bench_effect_size.py --groupings 10 100 1000 10000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from statsmodels.formula.api import ols
+from statsmodels.stats.anova import anova_lm
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from effect_size import get_group_statistics, get_one_way_anova  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groupings", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--systems", type=int, default=4)
+    parser.add_argument("--refit-max", type=int, default=100)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'groupings':>10} {'kernel (s)':>11} {'refits (s)':>11} {'max |eta2 diff|':>16}")
+    for grouping_count in args.groupings:
+        values = rng.integers(-9, 10, size=(grouping_count * args.items, args.systems)).ravel()
+        group_codes = np.tile(np.arange(args.systems), grouping_count * args.items)
+        grouping_codes = np.repeat(np.arange(grouping_count), args.items * args.systems)
+
+        start = time.perf_counter()
+        anova = get_one_way_anova(
+            *get_group_statistics(values, group_codes, grouping_codes, args.systems, grouping_count)
+        )
+        kernel_seconds = time.perf_counter() - start
+
+        refit_columns = f"{'-':>11} {'-':>16}"
+        if grouping_count <= args.refit_max:
+            start = time.perf_counter()
+            eta_squared = []
+            for grouping in range(grouping_count):
+                is_grouping = grouping_codes == grouping
+                data = pd.DataFrame(
+                    {"predictor": group_codes[is_grouping], "response": values[is_grouping]}
+                )
+                anova_table = anova_lm(ols("response ~ C(predictor)", data=data).fit(), typ=2)
+                eta_squared.append(anova_table["sum_sq"].iloc[0] / anova_table["sum_sq"].sum())
+            refit_seconds = time.perf_counter() - start
+            difference = np.abs(np.array(eta_squared) - anova["eta_squared"]).max()
+            refit_columns = f"{refit_seconds:11.3f} {difference:16.1e}"
+
+        print(f"{grouping_count:>10} {kernel_seconds:11.4f} {refit_columns}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark Krippendorff's alpha from sparse triplets against the dense krippendorff package.
+
+Synthetic studies mirror ours: every rater judges 32 tasks and every task is
+judged by about --raters-per-task raters, so the rater x task matrix the
+krippendorff package needs grows quadratically while the number of judgments
+grows linearly. The dense computation only runs up to --dense-max raters.
+Run from the repository root:
+
+    python benchmarks/bench_krippendorff_alpha.py --raters 100 1000 10000 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import krippendorff
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from agreement import krippendorff_alpha_nominal  # noqa: E402
+
+TASKS_PER_RATER = 32
+
+
+def make_synthetic_judgments(rater_count, raters_per_task, rng):
+    task_count = max(TASKS_PER_RATER, rater_count * TASKS_PER_RATER // raters_per_task)
+    rater_ids = np.repeat(np.arange(rater_count), TASKS_PER_RATER)
+    # each rater gets a contiguous block of tasks, wrapping around the task pool
+    task_ids = (
+        rng.integers(0, task_count, size=rater_count)[:, None] + np.arange(TASKS_PER_RATER)
+    ).ravel() % task_count
+    # raters agree with a per-task majority value 75% of the time
+    task_majority = rng.integers(0, 2, size=task_count)
+    agrees = rng.random(len(task_ids)) < 0.75
+    values = np.where(agrees, task_majority[task_ids], 1 - task_majority[task_ids])
+    return rater_ids, task_ids, values, task_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--raters", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--raters-per-task", type=int, default=3)
+    parser.add_argument("--dense-max", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(
+        f"{'raters':>8} {'tasks':>9} {'judgments':>10} {'sparse (s)':>11} {'dense (s)':>10}"
+        f" {'dense MB':>9} {'alpha':>8} {'|diff|':>9}"
+    )
+    for rater_count in args.raters:
+        rater_ids, task_ids, values, task_count = make_synthetic_judgments(
+            rater_count, args.raters_per_task, rng
+        )
+
+        start = time.perf_counter()
+        alpha = krippendorff_alpha_nominal(task_ids, values)
+        sparse_seconds = time.perf_counter() - start
+
+        dense_columns = f"{'-':>10} {'-':>9}"
+        difference_column = f"{'-':>9}"
+        if rater_count <= args.dense_max:
+            start = time.perf_counter()
+            reliability_data = np.full((rater_count, task_count), np.nan)
+            reliability_data[rater_ids, task_ids] = values
+            dense_alpha = krippendorff.alpha(reliability_data, level_of_measurement="nominal")
+            dense_seconds = time.perf_counter() - start
+            dense_columns = f"{dense_seconds:10.3f} {reliability_data.nbytes / 2**20:9.1f}"
+            difference_column = f"{abs(alpha - dense_alpha):9.1e}"
+
+        print(
+            f"{rater_count:>8} {task_count:>9} {len(values):>10} {sparse_seconds:11.3f}"
+            f" {dense_columns} {alpha:8.4f} {difference_column}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Benchmark the Bradley-Terry and Thurstone fits on large synthetic studies.
+
+Every system gets a normal latent strength and is compared with --opponents
+random other systems, so the pairings are sparse and unbalanced; the winner of
+each comparison is drawn from the Bradley-Terry model. The benchmark reports
+the fit time and the correlation of the fitted with the true strengths.
+Run from the repository root:
+
+    python benchmarks/bench_pairwise_ranking.py --systems 100 1000 3000 --comparisons 1000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pairwise_ranking import MODELS, fit_pairwise_model  # noqa: E402
+
+
+def make_synthetic_comparisons(system_count, comparison_count, opponent_count, rng):
+    true_strengths = rng.normal(size=system_count)
+    # each system only meets a few fixed opponents
+    opponents = (
+        np.arange(system_count)[:, None] + rng.integers(1, system_count, size=(system_count, opponent_count))
+    ) % system_count
+    systema = rng.integers(0, system_count, size=comparison_count)
+    systemb = opponents[systema, rng.integers(0, opponent_count, size=comparison_count)]
+    a_wins = rng.random(comparison_count) < 1 / (1 + np.exp(true_strengths[systemb] - true_strengths[systema]))
+    winners = np.where(a_wins, systema, systemb)
+    losers = np.where(a_wins, systemb, systema)
+    return true_strengths, winners, losers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--systems", type=int, nargs="+", default=[100, 1000, 3000])
+    parser.add_argument("--comparisons", type=int, default=1000000)
+    parser.add_argument("--opponents", type=int, default=10)
+    parser.add_argument("--prior", type=float, default=0.5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'systems':>8} {'comparisons':>12} {'model':>14} {'seconds':>8} {'corr':>7} {'mean se':>8}")
+    for system_count in args.systems:
+        true_strengths, winners, losers = make_synthetic_comparisons(
+            system_count, args.comparisons, args.opponents, rng
+        )
+        for model in MODELS:
+            start = time.perf_counter()
+            strengths, standard_errors = fit_pairwise_model(
+                winners, losers, system_count, model, args.prior
+            )
+            seconds = time.perf_counter() - start
+            correlation = np.corrcoef(strengths, true_strengths)[0, 1]
+            print(
+                f"{system_count:>8} {args.comparisons:>12} {model:>14} {seconds:8.2f}"
+                f" {correlation:7.4f} {standard_errors.mean():8.4f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
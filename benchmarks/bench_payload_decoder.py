@@ -0,0 +1,100 @@
+"""Micro-benchmark the json_string payload decoder.
+
+Decodes the json_string column of responses/tasks_joined.csv with the
+literal_eval-only parser that preprocess_responses used before and with
+decode_json_str, both on the payloads as collected (Python repr) and on the
+same payloads re-encoded as strict JSON. When tasks_joined.csv is not
+available, the payloads are rebuilt from the response_dict column of
+responses/responses.csv. Run from the repository root:
+
+    python benchmarks/bench_payload_decoder.py --repeat 10
+"""
+
+import argparse
+import ast
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from preprocess_responses import decode_json_str  # noqa: E402
+
+
+def parse_json_str_literal_eval(json_str):
+    # reference implementation: the decoder used before the JSON fast path
+    response_dict = ast.literal_eval(json_str)
+    response_dict["clicks"] = ast.literal_eval(response_dict["clicks"])
+    response_dict["steps"] = ast.literal_eval(response_dict["steps"])
+    return response_dict
+
+
+def load_json_strings(tasks_joined_path, responses_path):
+    if os.path.exists(tasks_joined_path):
+        json_strings = pd.read_csv(tasks_joined_path)["json_string"].dropna().tolist()
+        return [json_str for json_str in json_strings if json_str not in ("", "nan")]
+
+    json_strings = []
+    for response_dict_str in pd.read_csv(responses_path)["response_dict"].dropna():
+        response_dict = ast.literal_eval(response_dict_str)
+        response_dict["clicks"] = repr(response_dict["clicks"])
+        response_dict["steps"] = repr(response_dict["steps"])
+        json_strings.append(repr(response_dict))
+    return json_strings
+
+
+def to_strict_json(json_str):
+    response_dict = parse_json_str_literal_eval(json_str)
+    response_dict["clicks"] = json.dumps(response_dict["clicks"])
+    response_dict["steps"] = json.dumps(response_dict["steps"])
+    return json.dumps(response_dict)
+
+
+def time_decoder(decoder, json_strings, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for json_str in json_strings:
+            decoder(json_str)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks-joined", default="responses/tasks_joined.csv")
+    parser.add_argument("--responses", default="responses/responses.csv")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    repr_json_strings = load_json_strings(args.tasks_joined, args.responses)
+    strict_json_strings = [to_strict_json(json_str) for json_str in repr_json_strings]
+    payload_count = len(repr_json_strings) * args.repeat
+
+    def decode(json_str):
+        return decode_json_str(json_str, anonymize=False)
+
+    for repr_json_str, strict_json_str in zip(repr_json_strings, strict_json_strings):
+        expected_dict = parse_json_str_literal_eval(repr_json_str)
+        assert decode(repr_json_str)[:2] == (expected_dict, "literal_eval")
+        assert decode(strict_json_str)[:2] == (expected_dict, "json")
+
+    timings = [
+        ("literal_eval only, repr payloads", parse_json_str_literal_eval, repr_json_strings),
+        ("decode_json_str, repr payloads", decode, repr_json_strings),
+        ("decode_json_str, JSON payloads", decode, strict_json_strings),
+    ]
+    baseline_seconds = None
+    print(f"{payload_count} payloads")
+    for name, decoder, json_strings in timings:
+        seconds = time_decoder(decoder, json_strings, args.repeat)
+        baseline_seconds = baseline_seconds or seconds
+        print(
+            f"{name:<34} {seconds:8.3f} s  {payload_count / seconds:10.0f} payloads/s"
+            f"  {baseline_seconds / seconds:6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Benchmark the batched permutation test as the number of systems grows.
+
+Synthetic item scores have the shape of get_task_scores output: --items rows
+of bounded integer scores, one column per system. The test runs in a single
+process so the reported peak is the memory of one batch, which stays flat as
+the number of permutations grows. Run from the repository root:
+
+    python benchmarks/bench_permutation_test.py --systems 4 10 100 --permutations 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from permutation import permutation_test  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--systems", type=int, nargs="+", default=[4, 10, 100])
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--permutations", type=int, default=100000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'systems':>8} {'pairs':>6} {'seconds':>8} {'peak MB':>8} {'omnibus p':>10} {'min p-adj':>10}")
+    for system_count in args.systems:
+        scores = rng.integers(-9, 10, size=(args.items, system_count))
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        omnibus_p, _, pair_p_adjusted = permutation_test(
+            scores, args.permutations, max_workers=1
+        )
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        print(
+            f"{system_count:>8} {len(pair_p_adjusted):>6} {seconds:8.2f} {peak / 2**20:8.1f}"
+            f" {omnibus_p:10.4f} {pair_p_adjusted.min():10.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
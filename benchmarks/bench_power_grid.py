@@ -0,0 +1,80 @@
+"""Benchmark the vectorized power grid against per-point FTestAnovaPower solves.
+
+Sweeps --effect-sizes effect sizes x 3 alphas x 3 group counts, computing the
+power at --nobs sample sizes and the sample size required for 80% power. The
+statsmodels loop only runs for the first --loop-max design points and is
+extrapolated. Run from the repository root:
+
+    python benchmarks/bench_power_grid.py --effect-sizes 100 --nobs 100
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import statsmodels.stats.power as smp
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from power_grid import get_power_grid, get_sample_size_grid  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--effect-sizes", type=int, default=100)
+    parser.add_argument("--nobs", type=int, default=100)
+    parser.add_argument("--loop-max", type=int, default=50)
+    args = parser.parse_args()
+
+    k_groups = np.array([2, 4, 10])
+    effect_sizes = np.linspace(0.05, 0.8, args.effect_sizes)
+    alphas = np.array([0.01, 0.05, 0.1])
+    nobs = np.linspace(20, 2000, args.nobs)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        start = time.perf_counter()
+        power = get_power_grid(k_groups, effect_sizes, alphas, nobs, cache_dir)
+        sample_sizes = get_sample_size_grid(k_groups, effect_sizes, alphas, cache_dir=cache_dir)
+        grid_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        get_power_grid(k_groups, effect_sizes, alphas, nobs, cache_dir)
+        get_sample_size_grid(k_groups, effect_sizes, alphas, cache_dir=cache_dir)
+        cached_seconds = time.perf_counter() - start
+
+    power_analysis = smp.FTestAnovaPower()
+    design_points = [
+        (k_index, f_index, a_index)
+        for k_index in range(len(k_groups))
+        for f_index in range(len(effect_sizes))
+        for a_index in range(len(alphas))
+    ]
+    loop_points = design_points[: args.loop_max]
+    start = time.perf_counter()
+    max_difference = 0.0
+    for k_index, f_index, a_index in loop_points:
+        for n_index, n in enumerate(nobs):
+            loop_power = power_analysis.power(
+                effect_sizes[f_index], n, alphas[a_index], k_groups[k_index]
+            )
+            max_difference = max(max_difference, abs(loop_power - power[k_index, f_index, a_index, n_index]))
+        loop_sample_size = power_analysis.solve_power(
+            effect_size=effect_sizes[f_index], nobs=None, alpha=alphas[a_index], power=0.8,
+            k_groups=k_groups[k_index],
+        )
+        max_difference = max(
+            max_difference,
+            abs(loop_sample_size - sample_sizes[k_index, f_index, a_index, 0]) / loop_sample_size,
+        )
+    loop_seconds = (time.perf_counter() - start) * len(design_points) / len(loop_points)
+
+    print(f"design points: {len(design_points)} x {len(nobs)} sample sizes")
+    print(f"grid: {grid_seconds:.3f} s, cached: {cached_seconds:.4f} s, "
+          f"statsmodels loop (extrapolated): {loop_seconds:.1f} s, max difference: {max_difference:.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark the wide-to-long reshaping of responses.csv.
+
+Synthetic collection rounds are built by resampling HITs from
+responses/responses.csv, then reshaped with the vectorized
+`reshape_responses_wide_to_long` and, for small sizes, with the original
+iterrows loop it replaced. Run from the repository root:
+
+    python benchmarks/bench_reshape_responses.py --sizes 100 1000 10000 100000 1000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from analyze_responses import get_slot_indices, reshape_responses_wide_to_long  # noqa: E402
+
+
+def reshape_responses_iterrows(responses_df):
+    # reference implementation: the per-row loop used before the vectorized reshape
+    results_list = []
+    slot_indices = get_slot_indices(responses_df.columns)
+    for _, row in responses_df.iterrows():
+        for i in slot_indices:
+            results_list.append(
+                {
+                    "systema": row[f"systema{i}"],
+                    "systemb": row[f"systemb{i}"],
+                    "dataset": row[f"dataset{i}"],
+                    "dataset_index": row[f"ix{i}"],
+                    "dataset_id": f"{row[f'dataset{i}']}-{row[f'ix{i}']}",
+                    "selected_system": row[f"meaning{i}"],
+                    "input": row[f"input{i}"],
+                    "outputa": row[f"outputa{i}"],
+                    "outputb": row[f"outputb{i}"],
+                    "task_id": f"{row[f'dataset{i}']}-{row[f'ix{i}']}-{row[f'systema{i}']}-{row[f'systemb{i}']}",
+                    "task_uuid": row["task_id"],
+                    "participant_id": row["prolific_pid"],
+                }
+            )
+    return pd.DataFrame(results_list)
+
+
+def make_synthetic_responses(responses_df, hit_count, seed=0):
+    rng = np.random.default_rng(seed)
+    sampled_rows = rng.integers(0, len(responses_df), size=hit_count)
+    return responses_df.iloc[sampled_rows].reset_index(drop=True)
+
+
+def time_call(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--responses", default="responses/responses.csv")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000, 1000000]
+    )
+    parser.add_argument(
+        "--legacy-max",
+        type=int,
+        default=1000,
+        help="largest HIT count to also run through the iterrows loop",
+    )
+    args = parser.parse_args()
+
+    responses_df = pd.read_csv(args.responses)
+
+    print(f"{'HITs':>10} {'rows':>12} {'vectorized (s)':>15} {'iterrows (s)':>13} {'speedup':>8}")
+    for hit_count in args.sizes:
+        synthetic_df = make_synthetic_responses(responses_df, hit_count)
+        long_df, vectorized_seconds = time_call(reshape_responses_wide_to_long, synthetic_df)
+
+        legacy_column = f"{'-':>13}"
+        speedup_column = f"{'-':>8}"
+        if hit_count <= args.legacy_max:
+            legacy_df, legacy_seconds = time_call(reshape_responses_iterrows, synthetic_df)
+            pd.testing.assert_frame_equal(long_df, legacy_df)
+            legacy_column = f"{legacy_seconds:13.3f}"
+            speedup_column = f"{legacy_seconds / vectorized_seconds:7.1f}x"
+
+        print(
+            f"{hit_count:>10} {len(long_df):>12} {vectorized_seconds:15.3f} "
+            f"{legacy_column} {speedup_column}"
+        )
+        del synthetic_df, long_df
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Benchmark loading responses from the CSV and from the parquet store.
+
+Each load runs in a fresh subprocess so that its wall time and peak RSS are
+measured in isolation. The responses table is replicated --scale times into a
+temporary directory first, to show how both formats behave on larger rounds.
+Run from the repository root:
+
+    python benchmarks/bench_response_store.py --scale 1 10 100
+"""
+
+import argparse
+import functools
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from analyze_responses import is_analysis_column  # noqa: E402
+from response_store import read_responses, write_responses_parquet  # noqa: E402
+
+COLUMN_SELECTIONS = {
+    "all columns": None,
+    "selections, no texts": functools.partial(is_analysis_column, include_text=False),
+    "steps only": ["steps"],
+}
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_in_subprocess(csv_path, parquet_path, columns, result_queue):
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    responses_df = read_responses(columns=columns, csv_path=csv_path, parquet_path=parquet_path)
+    seconds = time.perf_counter() - start
+    result_queue.put((seconds, peak_rss_mb() - rss_before, responses_df.shape))
+
+
+def measure(csv_path, parquet_path, columns):
+    context = multiprocessing.get_context("spawn")
+    result_queue = context.Queue()
+    process = context.Process(
+        target=load_in_subprocess, args=(csv_path, parquet_path, columns, result_queue)
+    )
+    process.start()
+    result = result_queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--responses", default="responses/responses.csv")
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 10, 100])
+    args = parser.parse_args()
+
+    responses_df = pd.read_csv(args.responses)
+
+    print(f"{'HITs':>8} {'columns':<22} {'format':<8} {'size (MB)':>10} {'load (s)':>9} {'+RSS (MB)':>9}")
+    for scale in args.scale:
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, "responses.csv")
+            parquet_path = os.path.join(directory, "responses.parquet")
+            scaled_df = pd.concat([responses_df] * scale, ignore_index=True)
+            scaled_df.to_csv(csv_path, index=False)
+            write_responses_parquet(scaled_df, parquet_path)
+            del scaled_df
+
+            file_sizes = {
+                "csv": os.path.getsize(csv_path) / 2**20,
+                "parquet": os.path.getsize(parquet_path) / 2**20,
+            }
+            for selection_name, columns in COLUMN_SELECTIONS.items():
+                for format_name in ["csv", "parquet"]:
+                    # the CSV path is taken when no parquet store exists
+                    store_path = parquet_path if format_name == "parquet" else parquet_path + ".missing"
+                    seconds, rss_mb, shape = measure(csv_path, store_path, columns)
+                    print(
+                        f"{shape[0]:>8} {selection_name:<22} {format_name:<8} "
+                        f"{file_sizes[format_name]:10.1f} {seconds:9.3f} {rss_mb:9.1f}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Benchmark the vectorized session timing table against per-row timestamp parsing.
+
+Tiles the `steps` column of the responses to --sessions sessions and times
+the extraction of the seconds spent on every page plus the caps and deciles,
+once with the literal_eval / strptime / per-quantile loop the plots used to
+run and once with session_timing. Run from the repository root:
+
+    python benchmarks/bench_session_timing.py --sessions 100000
+"""
+
+import argparse
+import ast
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from response_store import read_responses  # noqa: E402
+from session_timing import cap_timings, get_session_timings  # noqa: E402
+
+CAP_LEVELS = {"welcome": 0.95, "instructions": 0.99, "task": 0.99}
+QUANTILE_LEVELS = [0.1 * i for i in range(10)]
+
+
+def get_loop_quantiles(steps):
+    def parse_time(time_str):
+        return datetime.strptime(time_str.split("GMT")[0].strip(), "%a %b %d %Y %H:%M:%S")
+
+    steps = steps.apply(ast.literal_eval)
+    pages = {
+        page: steps.apply(lambda x: parse_time(x[page]))
+        for page in ["welcome_page", "instructions_page", "task_page", "finished_page"]
+    }
+    timings = {
+        "welcome": (pages["instructions_page"] - pages["welcome_page"]).dt.total_seconds(),
+        "instructions": (pages["task_page"] - pages["instructions_page"]).dt.total_seconds(),
+        "task": (pages["finished_page"] - pages["task_page"]).dt.total_seconds(),
+    }
+    quantiles = {}
+    for page, level in CAP_LEVELS.items():
+        cap = timings[page].quantile(level)
+        timings[page] = timings[page].where(timings[page] <= cap, cap)
+        quantiles[page] = [timings[page].quantile(q) for q in QUANTILE_LEVELS]
+    return pd.DataFrame(quantiles, index=QUANTILE_LEVELS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100000)
+    args = parser.parse_args()
+
+    responses_df = read_responses(columns=["task_id", "steps"])
+    repeats = -(-args.sessions // len(responses_df))
+    responses_df = pd.concat([responses_df] * repeats, ignore_index=True).iloc[: args.sessions]
+
+    start = time.perf_counter()
+    loop_quantiles = get_loop_quantiles(responses_df["steps"])
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    timings_df, _ = cap_timings(get_session_timings(responses_df), CAP_LEVELS)
+    quantiles = timings_df[list(CAP_LEVELS)].quantile(QUANTILE_LEVELS)
+    vectorized_seconds = time.perf_counter() - start
+
+    max_difference = np.abs(quantiles.to_numpy() - loop_quantiles.to_numpy()).max()
+    print(f"sessions: {len(responses_df)}")
+    print(f"per-row loop: {loop_seconds:.3f} s, vectorized: {vectorized_seconds:.3f} s, "
+          f"speedup: {loop_seconds / vectorized_seconds:.1f}x, max difference: {max_difference:.1e}")
+
+
+if __name__ == "__main__":
+    main()
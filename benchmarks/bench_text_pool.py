@@ -0,0 +1,77 @@
+"""Report the memory saved by interning the sentence texts of the long table.
+
+Builds the processed comparison table once with the input/outputa/outputb
+texts as strings and once with TextPool ids, on the current responses and on
+synthetic rounds made by resampling HITs (--scale 100 is 100x the current
+data). Run from the repository root:
+
+    python benchmarks/bench_text_pool.py --scale 1 100
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from analyze_responses import preprocess_responses_df  # noqa: E402
+from text_pool import TextPool  # noqa: E402
+
+TEXT_COLUMNS = ["input", "outputa", "outputb"]
+TEXT_ID_COLUMNS = ["input_id", "outputa_id", "outputb_id"]
+
+
+def frame_megabytes(df):
+    return df.memory_usage(deep=True, index=False).sum() / 2**20
+
+
+def copy_seconds(df, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        df.copy()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--responses", default="responses/responses.csv")
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 100])
+    args = parser.parse_args()
+
+    responses_df = pd.read_csv(args.responses)
+    rng = np.random.default_rng(0)
+
+    print(
+        f"{'rows':>9} {'texts (MB)':>11} {'text ids (MB)':>14}"
+        f" {'strings (MB)':>13} {'ids (MB)':>9} {'pool (MB)':>10} {'saving':>7}"
+        f" {'pool size':>10} {'copy strings (s)':>17} {'copy ids (s)':>13}"
+    )
+    for scale in args.scale:
+        hit_count = len(responses_df) * scale
+        sampled_df = responses_df.iloc[rng.integers(0, len(responses_df), size=hit_count)]
+        sampled_df = sampled_df.reset_index(drop=True)
+
+        text_pool = TextPool()
+        with contextlib.redirect_stdout(io.StringIO()):
+            string_df = preprocess_responses_df(sampled_df)
+            id_df = preprocess_responses_df(sampled_df, text_pool)
+
+        string_mb = frame_megabytes(string_df)
+        id_mb = frame_megabytes(id_df)
+        pool_mb = text_pool.memory_usage() / 2**20
+        saving = 1 - (id_mb + pool_mb) / string_mb
+        print(
+            f"{len(string_df):>9} {frame_megabytes(string_df[TEXT_COLUMNS]):11.1f}"
+            f" {frame_megabytes(id_df[TEXT_ID_COLUMNS]):14.1f} {string_mb:13.1f} {id_mb:9.1f} {pool_mb:10.2f} {saving:7.1%}"
+            f" {len(text_pool):>10} {copy_seconds(string_df):17.4f} {copy_seconds(id_df):13.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Benchmark the streaming timing sketches against exact in-memory quantiles.
+
+Writes --sessions synthetic sessions (log-normal seconds per page) as `steps`
+logs split over --files parquet files, streams each file into its own
+sketches, merges them and compares the caps, deciles and ECDF data with the
+exact capped quantiles of all sessions. Run from the repository root:
+
+    python benchmarks/bench_timing_sketch.py --sessions 1000000 --files 4
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from session_timing import (  # noqa: E402
+    PAGE_TRANSITIONS,
+    TIME_SPENT_CAP_LEVELS,
+    TIME_SPENT_QUANTILE_LEVELS,
+    get_timing_sketches,
+    merge_timing_sketches,
+    summarize_timing_sketches,
+)
+
+PAGE_SECONDS = {"welcome": (2.5, 1.0), "instructions": (4.0, 0.8), "task": (6.0, 0.5)}
+
+
+def get_synthetic_steps(session_count, rng):
+    """
+    :return: (series of steps dict literals, dataframe of the seconds per page)
+    """
+    seconds_df = pd.DataFrame(
+        {page: np.round(rng.lognormal(mu, sigma, session_count)) for page, (mu, sigma) in PAGE_SECONDS.items()}
+    )
+    timestamp = pd.Timestamp("2025-05-13") + pd.to_timedelta(
+        pd.Series(rng.integers(0, 30 * 86400, session_count)), unit="s"
+    )
+    steps = pd.Series("{", index=seconds_df.index)
+    for i, (page, (page_start, next_page)) in enumerate(PAGE_TRANSITIONS.items()):
+        if i == 0:
+            steps += f"'{page_start}': '" + timestamp.dt.strftime("%a %b %d %Y %H:%M:%S") + " GMT-0400', "
+        timestamp = timestamp + pd.to_timedelta(seconds_df[page], unit="s")
+        steps += f"'{next_page}': '" + timestamp.dt.strftime("%a %b %d %Y %H:%M:%S") + " GMT-0400'"
+        steps += ", " if i < len(PAGE_TRANSITIONS) - 1 else "}"
+    return steps, seconds_df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200000)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    steps, seconds_df = get_synthetic_steps(args.sessions, rng)
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i, file_steps in enumerate(np.array_split(steps, args.files)):
+            paths.append(os.path.join(directory, f"round{i}.parquet"))
+            pd.DataFrame({"steps": file_steps}).to_parquet(paths[-1], index=False)
+
+        start = time.perf_counter()
+        sketches = merge_timing_sketches(
+            [get_timing_sketches([path], args.chunk_size) for path in paths]
+        )
+        caps, quantiles, ecdf_df = summarize_timing_sketches(sketches)
+        sketch_seconds = time.perf_counter() - start
+
+    levels = np.r_[TIME_SPENT_QUANTILE_LEVELS, ecdf_df["probability"]]
+    max_rank_error = 0.0
+    for page, cap_level in TIME_SPENT_CAP_LEVELS.items():
+        seconds = np.sort(seconds_df[page].to_numpy())
+        exact_cap = np.quantile(seconds, cap_level)
+        capped = np.minimum(seconds, exact_cap)
+        estimates = np.r_[quantiles[page], ecdf_df[page]]
+        # the timings are whole seconds, so an estimate between two seconds
+        # (a centroid mixing both) is consistent with the levels of either
+        rank_low = np.searchsorted(capped, np.floor(estimates), side="left") / len(capped)
+        rank_high = np.searchsorted(capped, np.ceil(estimates), side="right") / len(capped)
+        rank_error = np.maximum(rank_low - levels, levels - rank_high).clip(min=0)
+        # the top of the ECDF is flat at the cap, compare only below it
+        rank_error = rank_error[levels < cap_level]
+        max_rank_error = max(max_rank_error, rank_error.max())
+        print(f"{page}: cap {caps[page]:.2f} (exact {exact_cap:.2f}), "
+              f"centroids: {len(sketches[page].weights)}")
+    print(f"sessions: {args.sessions} in {args.files} files, sketches: {sketch_seconds:.2f} s, "
+          f"max rank error of the deciles and ECDF: {max_rank_error:.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""Inter-rater agreement coefficients computed from long (unit, rater, value) judgments.
+
+The dense rater x unit reliability matrix that the krippendorff package expects
+is almost entirely empty in our design (each participant rates 32 of thousands
+of tasks), so the coefficients here are built from per-unit value counts
+instead, with cost linear in the number of judgments.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def get_reliability_triplets(responses_processed_df, unit_column="task_id", rater_column="participant_id",
+                             value_column="selected_system"):
+    """
+    :return: dataframe of (unit, rater, value) judgments, keeping the first
+        value of a rater for a unit like pivot_table(aggfunc="first") does
+    """
+    triplets_df = responses_processed_df[[unit_column, rater_column, value_column]].dropna()
+    return triplets_df.drop_duplicates(subset=[unit_column, rater_column], keep="first")
+
+
+def get_unit_value_counts(unit_values, values):
+    """
+    :return: (units x categories matrix of how many raters gave each category to
+        each unit, units in order of first appearance, categories sorted)
+    """
+    unit_codes, units = pd.factorize(np.asarray(unit_values))
+    value_codes, categories = pd.factorize(np.asarray(values), sort=True)
+    category_count = len(categories)
+    counts = np.bincount(
+        unit_codes * category_count + value_codes, minlength=len(units) * category_count
+    ).reshape(len(units), category_count)
+    return counts, units, categories
+
+
+def get_coincidence_matrix(unit_value_counts):
+    """
+    Krippendorff's coincidence matrix o_ck = sum_u (n_uc n_uk - [c = k] n_uc) / (m_u - 1),
+    summed over the pairable units (m_u >= 2 values).
+    """
+    unit_value_counts = np.asarray(unit_value_counts, dtype=float)
+    pairable_counts = unit_value_counts[unit_value_counts.sum(axis=1) >= 2]
+    unit_weights = 1.0 / (pairable_counts.sum(axis=1) - 1.0)
+    coincidences = (pairable_counts * unit_weights[:, None]).T @ pairable_counts
+    coincidences -= np.diag((pairable_counts * unit_weights[:, None]).sum(axis=0))
+    return coincidences
+
+
+def krippendorff_alpha_nominal_from_counts(unit_value_counts):
+    coincidences = get_coincidence_matrix(unit_value_counts)
+    category_totals = coincidences.sum(axis=0)
+    total = category_totals.sum()
+
+    observed_disagreement = total - np.trace(coincidences)
+    expected_disagreement = (total ** 2 - np.square(category_totals).sum()) / (total - 1.0)
+    if expected_disagreement == 0:
+        raise ValueError("There has to be more than one value in the domain.")
+    return 1.0 - observed_disagreement / expected_disagreement
+
+
+def krippendorff_alpha_nominal(unit_values, values):
+    """
+    Krippendorff's alpha for nominal data, matching
+    krippendorff.alpha(reliability_data, level_of_measurement="nominal").
+    :param unit_values: unit (e.g. task_id) of every judgment
+    :param values: value of every judgment, one judgment per rater and unit
+    """
+    unit_value_counts, _, _ = get_unit_value_counts(unit_values, values)
+    return krippendorff_alpha_nominal_from_counts(unit_value_counts)
+
+
+def fleiss_kappa_from_counts(item_category_counts):
+    """
+    Fleiss' kappa of an items x categories count matrix. Items may have been
+    judged by different numbers of raters: the per-item agreement uses each
+    item's own rater count and items with fewer than 2 judgments are ignored.
+    With equal rater counts this equals statsmodels' fleiss_kappa(method="fleiss").
+    """
+    item_category_counts = np.asarray(item_category_counts, dtype=float)
+    rater_counts = item_category_counts.sum(axis=1)
+    is_pairable = rater_counts >= 2
+    item_category_counts = item_category_counts[is_pairable]
+    rater_counts = rater_counts[is_pairable]
+
+    item_agreement = (np.square(item_category_counts).sum(axis=1) - rater_counts) / (
+        rater_counts * (rater_counts - 1)
+    )
+    mean_agreement = item_agreement.mean()
+    category_proportions = item_category_counts.sum(axis=0) / rater_counts.sum()
+    expected_agreement = np.square(category_proportions).sum()
+    return (mean_agreement - expected_agreement) / (1 - expected_agreement)
+
+
+class FleissKappaAccumulator:
+    """
+    Per-item category counts for Fleiss' kappa, updated batch by batch.
+
+    Only the counts are kept, so judgments can be added as they are collected,
+    partial states from different shards or collection days can be merged, and
+    kappa is available at any point without reprocessing earlier batches.
+    """
+
+    def __init__(self):
+        self._item_to_row = {}
+        self._items = []
+        self._category_to_column = {}
+        self._categories = []
+        self._counts = np.zeros((0, 0), dtype=np.int64)
+
+    def __len__(self):
+        return len(self._items)
+
+    @staticmethod
+    def _get_codes(keys, key_to_code, key_list):
+        codes, uniques = pd.factorize(np.asarray(keys))
+        unique_codes = np.empty(len(uniques), dtype=np.int64)
+        for i, key in enumerate(uniques):
+            code = key_to_code.get(key)
+            if code is None:
+                code = len(key_list)
+                key_to_code[key] = code
+                key_list.append(key)
+            unique_codes[i] = code
+        return unique_codes[codes]
+
+    def _grow(self):
+        row_count, column_count = len(self._items), len(self._categories)
+        if self._counts.shape[0] >= row_count and self._counts.shape[1] >= column_count:
+            return
+        # over-allocate rows so that many small batches stay amortized O(batch)
+        row_capacity = max(row_count, 2 * self._counts.shape[0])
+        counts = np.zeros((row_capacity, column_count), dtype=np.int64)
+        counts[: self._counts.shape[0], : self._counts.shape[1]] = self._counts
+        self._counts = counts
+
+    def update(self, items, values):
+        """
+        Add a batch of judgments.
+        :param items: item (e.g. task_id) of every judgment
+        :param values: category given in every judgment
+        :return: self
+        """
+        rows = self._get_codes(items, self._item_to_row, self._items)
+        columns = self._get_codes(values, self._category_to_column, self._categories)
+        self._grow()
+        np.add.at(self._counts, (rows, columns), 1)
+        return self
+
+    def update_counts(self, count_matrix):
+        """
+        Add an items x categories count dataframe, e.g. one written by
+        count_matrix() for an earlier shard. Its column labels must match the
+        categories passed to update() (convert them back to int after read_csv).
+        :return: self
+        """
+        rows = self._get_codes(count_matrix.index, self._item_to_row, self._items)
+        columns = self._get_codes(count_matrix.columns, self._category_to_column, self._categories)
+        self._grow()
+        self._counts[np.ix_(rows, columns)] += count_matrix.to_numpy(dtype=np.int64)
+        return self
+
+    def merge(self, other):
+        """
+        Add the counts of another accumulator.
+        :return: self
+        """
+        return self.update_counts(other.count_matrix())
+
+    def count_matrix(self):
+        """
+        :return: items x categories dataframe of judgment counts, items and
+            categories sorted
+        """
+        count_matrix = pd.DataFrame(
+            self._counts[: len(self._items), : len(self._categories)],
+            index=pd.Index(self._items, name="item"),
+            columns=self._categories,
+        )
+        return count_matrix.sort_index().sort_index(axis=1)
+
+    def kappa(self):
+        return fleiss_kappa_from_counts(self._counts[: len(self._items), : len(self._categories)])
+
+
+def _sum_by_rater(rater_codes, rater_count, values):
+    """Sum the rows of a judgments x k array per rater, one bincount per column."""
+    values = values.reshape(len(values), -1)
+    return np.column_stack(
+        [np.bincount(rater_codes, weights=values[:, k], minlength=rater_count) for k in range(values.shape[1])]
+    )
+
+
+def _unit_coincidences(unit_value_counts):
+    """Coincidence contribution of each unit, zero for units with fewer than 2 values."""
+    value_totals = unit_value_counts.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weights = np.where(value_totals >= 2, 1.0 / (value_totals - 1.0), 0.0)
+    category_count = unit_value_counts.shape[1]
+    coincidences = unit_value_counts[:, :, None] * unit_value_counts[:, None, :]
+    coincidences -= unit_value_counts[:, :, None] * np.eye(category_count)
+    return coincidences * weights[:, None, None]
+
+
+def _fleiss_item_terms(item_category_counts):
+    """Per-item agreement, pairable indicator and pairable category counts for Fleiss' kappa."""
+    rater_counts = item_category_counts.sum(axis=1)
+    is_pairable = rater_counts >= 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        item_agreement = np.where(
+            is_pairable,
+            (np.square(item_category_counts).sum(axis=1) - rater_counts) / (rater_counts * (rater_counts - 1)),
+            0.0,
+        )
+    return item_agreement, is_pairable.astype(float), item_category_counts * is_pairable[:, None]
+
+
+def get_rater_influence(unit_values, rater_values, values):
+    """
+    Leave-one-rater-out Krippendorff's alpha (nominal) and Fleiss' kappa for every rater.
+
+    The per-unit value counts are built once. Removing a rater only changes
+    the units that rater judged, so for each of their judgments the change of
+    that unit's contribution to the coincidence matrix (alpha) and to the
+    agreement sums (kappa) is computed and summed per rater. The cost is linear
+    in the number of judgments instead of one full recomputation per rater.
+    :param unit_values: unit (e.g. task_id) of every judgment
+    :param rater_values: rater (e.g. participant_id) of every judgment
+    :param values: value of every judgment, one judgment per rater and unit
+    :return: dataframe indexed by rater with the number of judgments, both
+        coefficients without the rater and their change (positive: removing
+        the rater raises agreement), sorted by the change of alpha
+    """
+    unit_value_counts, units, categories = get_unit_value_counts(unit_values, values)
+    unit_value_counts = unit_value_counts.astype(float)
+    unit_codes = pd.Index(units).get_indexer(np.asarray(unit_values))
+    value_codes = pd.Index(categories).get_indexer(np.asarray(values))
+    rater_codes, raters = pd.factorize(np.asarray(rater_values))
+    rater_count = len(raters)
+    category_count = len(categories)
+
+    # unit counts before and after removing each judgment
+    judgment_counts = unit_value_counts[unit_codes]
+    downdated_counts = judgment_counts - np.eye(category_count)[value_codes]
+
+    # Krippendorff's alpha: downdate the coincidence matrix
+    coincidences = get_coincidence_matrix(unit_value_counts)
+    coincidence_deltas = _unit_coincidences(downdated_counts) - _unit_coincidences(judgment_counts)
+    rater_coincidences = coincidences[None] + _sum_by_rater(
+        rater_codes, rater_count, coincidence_deltas
+    ).reshape(rater_count, category_count, category_count)
+    category_totals = rater_coincidences.sum(axis=2)
+    totals = category_totals.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        observed_disagreement = totals - np.trace(rater_coincidences, axis1=1, axis2=2)
+        expected_disagreement = (totals ** 2 - np.square(category_totals).sum(axis=1)) / (totals - 1.0)
+        alpha_without = 1.0 - observed_disagreement / expected_disagreement
+
+    # Fleiss' kappa: downdate the sums of item agreement, pairable items and category counts
+    item_agreement, is_pairable, pairable_counts = _fleiss_item_terms(unit_value_counts)
+    judgment_terms = _fleiss_item_terms(judgment_counts)
+    downdated_terms = _fleiss_item_terms(downdated_counts)
+    agreement_sums = item_agreement.sum() + _sum_by_rater(
+        rater_codes, rater_count, downdated_terms[0] - judgment_terms[0]
+    )[:, 0]
+    pairable_sums = is_pairable.sum() + _sum_by_rater(
+        rater_codes, rater_count, downdated_terms[1] - judgment_terms[1]
+    )[:, 0]
+    category_sums = pairable_counts.sum(axis=0)[None] + _sum_by_rater(
+        rater_codes, rater_count, downdated_terms[2] - judgment_terms[2]
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        category_proportions = category_sums / category_sums.sum(axis=1, keepdims=True)
+        expected_agreement = np.square(category_proportions).sum(axis=1)
+        kappa_without = (agreement_sums / pairable_sums - expected_agreement) / (1 - expected_agreement)
+
+    alpha = krippendorff_alpha_nominal_from_counts(unit_value_counts)
+    kappa = fleiss_kappa_from_counts(unit_value_counts)
+    influence_df = pd.DataFrame(
+        {
+            "judgments": np.bincount(rater_codes, minlength=rater_count),
+            "krippendorff_alpha_without": alpha_without,
+            "krippendorff_alpha_influence": alpha_without - alpha,
+            "fleiss_kappa_without": kappa_without,
+            "fleiss_kappa_influence": kappa_without - kappa,
+        },
+        index=pd.Index(raters, name="rater"),
+    )
+    return influence_df.sort_values("krippendorff_alpha_influence", ascending=False)
@@ -1,11 +1,29 @@
 import csv
 import os
+import re
 
-import krippendorff
+import numpy as np
 import pandas as pd
 from scipy import stats
 from statsmodels.stats.multicomp import MultiComparison
-from statsmodels.stats.inter_rater import fleiss_kappa
+
+from agreement import (
+    FleissKappaAccumulator,
+    get_rater_influence,
+    get_reliability_triplets,
+    krippendorff_alpha_nominal,
+)
+from artifact_cache import ArtifactCache
+from bootstrap import (
+    bootstrap_best_worst_metrics,
+    get_best_worst_metrics,
+    get_cluster_counts,
+    get_percentile_intervals,
+)
+from pairwise_ranking import get_pairwise_strengths
+from permutation import get_permutation_test_table, permutation_test
+from response_store import RESPONSES_CSV_PATH, RESPONSES_PARQUET_PATH, read_responses
+from text_pool import TextPool
 
 
 def get_selected_systems(meaning_i):
@@ -18,168 +36,356 @@ def get_selected_systems(meaning_i):
     return value
 
 
-def filter_attention_checks(results_df):
+ATTENTION_CHECK_SYSTEMS = ["distractor", "golds", "inputs"]
+# default order of the systems in the reports, systems not listed come last
+SYSTEM_ORDER = ["vae", "sep_ae", "lbow", "dips"]
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+# modules whose source is part of the cache key of the processed table and the metrics
+PREPROCESSING_CODE_PATHS = [
+    os.path.join(SRC_DIR, module)
+    for module in ("analyze_responses.py", "agreement.py", "response_store.py", "text_pool.py")
+]
+METRICS_CODE_PATHS = [
+    os.path.join(SRC_DIR, module) for module in ("analyze_responses.py", "bootstrap.py")
+]
+
+
+def get_attention_check_report(results_df):
     """
     when the system is 'distractor', the output is a random sample with a completely different meaning,
     and should never be chosen as best for 'meaning'.
     HITs where either of these controls were failed were rejected and resubmitted to MTurk.
-    :param results_df:
-    :return:
-    """
-    attention_check_list = ["distractor", "golds", "inputs"]
-
-    system_a_is_ditractor = results_df[results_df["systema"] == "distractor"]
-    system_b_is_distractor = results_df[results_df["systemb"] == "distractor"]
-
-    desired_task_uuid = "df51b2dd-7f64-437d-824a-f472ffc011cd"
-
-    matching_task_uuid = results_df[results_df["task_uuid"] == desired_task_uuid]
 
-    system_a_is_distractor_and_selected = system_a_is_ditractor[
-        system_a_is_ditractor["selected_system"] == 0
-    ]
-    system_b_is_distractor_and_selected = system_b_is_distractor[
-        system_b_is_distractor["selected_system"] == 1
-    ]
+    All checks are computed in one vectorized pass over the long table.
+    :param results_df: long comparison table, before the control rows are removed
+    :return: dict with the failed participants, the participants without any
+        distractor check, the task UUIDs of failed checks and a per-participant
+        dataframe of control counts
+    """
+    systema = results_df["systema"].to_numpy()
+    systemb = results_df["systemb"].to_numpy()
+    selected_system = results_df["selected_system"].to_numpy()
 
-    distractor_is_selected = pd.concat(
-        [
-            system_a_is_distractor_and_selected,
-            system_b_is_distractor_and_selected,
-        ]
+    is_failed_check = ((systema == "distractor") & (selected_system == 0)) | (
+        (systemb == "distractor") & (selected_system == 1)
     )
-    invalid_task_uuid_list = distractor_is_selected["task_uuid"].tolist()
-
-    users_with_failed_attention_checks = system_a_is_distractor_and_selected[
-        "participant_id"
-    ].tolist()
-    users_with_failed_attention_checks += system_b_is_distractor_and_selected[
-        "participant_id"
-    ].tolist()
 
-    users_with_attention_checks = system_a_is_ditractor["participant_id"].tolist()
-    users_with_attention_checks += system_b_is_distractor["participant_id"].tolist()
+    control_counts = {"comparisons": np.ones(len(results_df), dtype=np.int64)}
+    for system in ATTENTION_CHECK_SYSTEMS:
+        control_counts[f"{system}_count"] = (systema == system) | (systemb == system)
+    control_counts["failed_distractor_count"] = is_failed_check
 
-    users_with_failed_attention_checks = list(set(users_with_failed_attention_checks))
+    participant_checks = (
+        pd.DataFrame(control_counts, index=results_df["participant_id"].to_numpy())
+        .groupby(level=0, sort=False)
+        .sum()
+        .rename_axis("participant_id")
+    )
+    participant_checks["checked"] = participant_checks["distractor_count"] > 0
+    participant_checks["failed"] = participant_checks["failed_distractor_count"] > 0
 
     # Three round plates filled with artistically presented food.,T
     # wo halves of an onion and a carrot positioned to represent either a Goofy face or male Genetalia.,
     # Three pans filled with different types of food.
-    print(f"Users with failed attention checks: {users_with_failed_attention_checks}")
-    print(f"Task UUIDs with failed attention checks: {invalid_task_uuid_list}")
-
-    results_with_failed_attention_checks = results_df[
-        results_df["participant_id"].isin(users_with_failed_attention_checks)
-    ]
+    return {
+        "failed_participants": participant_checks.index[participant_checks["failed"]].tolist(),
+        "unchecked_participants": participant_checks.index[~participant_checks["checked"]].tolist(),
+        "invalid_task_uuids": results_df["task_uuid"].to_numpy()[is_failed_check].tolist(),
+        "participant_checks": participant_checks,
+    }
 
-    users_without_attention_checks = results_df[
-        ~results_df["participant_id"].isin(users_with_attention_checks)
-    ]["participant_id"].tolist()
 
-    print(f"Users without attention checks: {len(users_without_attention_checks)}")
+def filter_attention_checks(results_df, agreement_influence_threshold=None):
+    """
+    Remove the participants who failed a distractor check and every control
+    (distractor, golds, inputs) comparison.
+    :param results_df: long comparison table
+    :param agreement_influence_threshold: if given, also remove the participants
+        whose removal raises Krippendorff's alpha of the remaining comparisons
+        by more than this (see agreement.get_rater_influence)
+    :return: (filtered results dataframe, attention check report, see
+        get_attention_check_report, with the rater influence table and the
+        low agreement participants added when a threshold is given)
+    """
+    attention_check_report = get_attention_check_report(results_df)
 
     # print(f"Warning, redo analysis with the line below uncommented")
-    filtered_results_df = results_df[
-        ~results_df["participant_id"].isin(users_with_failed_attention_checks)
-    ]
-    # filtered_results_df = results_df
+    is_kept = ~results_df["participant_id"].isin(attention_check_report["failed_participants"])
+    # is_kept = True
+
+    is_kept &= ~results_df["systema"].isin(ATTENTION_CHECK_SYSTEMS)
+    is_kept &= ~results_df["systemb"].isin(ATTENTION_CHECK_SYSTEMS)
+
+    if agreement_influence_threshold is not None:
+        reliability_data = get_reliability_triplets(results_df[is_kept])
+        rater_influence = get_rater_influence(
+            reliability_data["task_id"],
+            reliability_data["participant_id"],
+            reliability_data["selected_system"],
+        )
+        low_agreement_participants = rater_influence.index[
+            rater_influence["krippendorff_alpha_influence"] > agreement_influence_threshold
+        ].tolist()
+        attention_check_report["rater_influence"] = rater_influence
+        attention_check_report["low_agreement_participants"] = low_agreement_participants
+        is_kept &= ~results_df["participant_id"].isin(low_agreement_participants)
+
+    return results_df[is_kept], attention_check_report
+
+
+SLOT_FIELDS = [
+    "systema",
+    "systemb",
+    "meaning",
+    "dataset",
+    "ix",
+]
+SLOT_TEXT_FIELDS = [
+    "input",
+    "outputa",
+    "outputb",
+]
+HIT_COLUMNS = ["task_id", "prolific_pid"]
+
+SLOT_COLUMN_PATTERN = re.compile(
+    rf"^({'|'.join(SLOT_FIELDS + SLOT_TEXT_FIELDS)})\d+$"
+)
+
+
+def get_slot_indices(columns):
+    """
+    Detect the comparison slots of a HIT from the response header, i.e. every i
+    for which a `systema{i}` column exists, in ascending order.
+    :param columns: columns of the wide responses dataframe
+    :return: sorted list of slot indices
+    """
+    slot_pattern = re.compile(r"^systema(\d+)$")
+    slot_indices = sorted(
+        int(match.group(1))
+        for match in (slot_pattern.match(str(column)) for column in columns)
+        if match is not None
+    )
 
-    filtered_results_df = filtered_results_df[
-        ~filtered_results_df["systema"].isin(attention_check_list)
-    ]
-    filtered_results_df = filtered_results_df[
-        ~filtered_results_df["systemb"].isin(attention_check_list)
+    column_set = set(columns)
+    missing_columns = [
+        f"{field}{i}"
+        for i in slot_indices
+        for field in SLOT_FIELDS
+        if f"{field}{i}" not in column_set
     ]
+    if missing_columns:
+        raise ValueError(f"Missing slot columns: {missing_columns}")
 
-    return filtered_results_df
-
-
-def preprocess_responses_df(responses_df):
-    results_list = []
-
-    for _, row in responses_df.iterrows():
-        for i in range(32):
-            selected_system = row[f"meaning{i}"]
-            results_dict = dict()
-            results_dict["systema"] = row[f"systema{i}"]
-            results_dict["systemb"] = row[f"systemb{i}"]
-            system_a_and_b = [results_dict["systema"], results_dict["systemb"]]
-
-            # if any([x in attention_check_list for x in system_a_and_b]):
-            #     # it is not clear what to do when a participant fails the attention check
-            #     continue
-
-            results_dict["dataset"] = row[f"dataset{i}"]
-            results_dict["dataset_index"] = row[f"ix{i}"]
-            results_dict["dataset_id"] = f"{row[f'dataset{i}']}-{row[f'ix{i}']}"
-            results_dict["selected_system"] = selected_system
-            results_dict["input"] = row[f"input{i}"]
-            results_dict["outputa"] = row[f"outputa{i}"]
-            results_dict["outputb"] = row[f"outputb{i}"]
-            results_dict["task_id"] = (
-                f"{row[f'dataset{i}']}-{row[f'ix{i}']}-{row[f'systema{i}']}-{row[f'systemb{i}']}"
-            )
-            results_dict["task_uuid"] = row["task_id"]
-            results_dict["participant_id"] = row["prolific_pid"]
+    return slot_indices
+
+
+def reshape_responses_wide_to_long(responses_df, text_pool=None):
+    """
+    Convert the per-slot column blocks of the wide responses dataframe into the
+    long comparison table, one row per (HIT, slot), ordered by HIT and then slot.
+    The input/outputa/outputb texts are included only if responses_df has them.
+    :param responses_df: one row per HIT, as written by preprocess_responses.py
+    :param text_pool: if given, the texts are interned into this TextPool and
+        stored as input_id/outputa_id/outputb_id columns instead of strings
+    :return: long comparison dataframe
+    """
+    slot_indices = get_slot_indices(responses_df.columns)
+    slot_count = len(slot_indices)
+    include_text = all(
+        f"{field}{i}" in responses_df.columns
+        for field in SLOT_TEXT_FIELDS
+        for i in slot_indices
+    )
+
+    def stack_slots(field):
+        # row-major ravel keeps the (HIT, slot) order of the original loop
+        return responses_df[[f"{field}{i}" for i in slot_indices]].to_numpy().ravel()
+
+    dataset = pd.Series(stack_slots("dataset"))
+    dataset_index = pd.Series(stack_slots("ix"))
+    systema = pd.Series(stack_slots("systema"))
+    systemb = pd.Series(stack_slots("systemb"))
+
+    dataset_id = dataset.astype(str) + "-" + dataset_index.astype(str)
+    task_id = dataset_id + "-" + systema.astype(str) + "-" + systemb.astype(str)
+
+    results_dict = {
+        "systema": systema,
+        "systemb": systemb,
+        "dataset": dataset,
+        "dataset_index": dataset_index,
+        "dataset_id": dataset_id,
+        "selected_system": stack_slots("meaning"),
+    }
+    if include_text and text_pool is not None:
+        row_count = len(responses_df) * slot_count
+        # one pass over the three text fields, they share most of their sentences
+        text_ids = text_pool.intern(
+            np.concatenate([stack_slots(field) for field in SLOT_TEXT_FIELDS])
+        )
+        for i, field in enumerate(SLOT_TEXT_FIELDS):
+            results_dict[f"{field}_id"] = text_ids[i * row_count : (i + 1) * row_count]
+    elif include_text:
+        for field in SLOT_TEXT_FIELDS:
+            results_dict[field] = stack_slots(field)
+    results_dict["task_id"] = task_id
+    results_dict["task_uuid"] = np.repeat(responses_df["task_id"].to_numpy(), slot_count)
+    results_dict["participant_id"] = np.repeat(
+        responses_df["prolific_pid"].to_numpy(), slot_count
+    )
+
+    results_df = pd.DataFrame(results_dict)
+
+    return results_df
 
-            results_list.append(results_dict)
 
-    results_df = pd.DataFrame(results_list)
+def preprocess_responses_df(
+    responses_df,
+    text_pool=None,
+    return_attention_check_report=False,
+    agreement_influence_threshold=None,
+):
+    results_df = reshape_responses_wide_to_long(responses_df, text_pool)
 
-    results_df = filter_attention_checks(results_df)
+    results_df, attention_check_report = filter_attention_checks(
+        results_df, agreement_influence_threshold
+    )
 
     results_df["selected_system"] = results_df["selected_system"].apply(int)
 
+    if return_attention_check_report:
+        return results_df, attention_check_report
     return results_df
 
 
-def load_and_preprocess_responses():
-    responses_df = pd.read_csv("responses/responses.csv")
-    responses_processed_df = preprocess_responses_df(responses_df)
-    return responses_processed_df
+def is_analysis_column(column, include_text=False):
+    match = SLOT_COLUMN_PATTERN.match(column)
+    if match is not None:
+        return include_text or match.group(1) not in SLOT_TEXT_FIELDS
+    return column in HIT_COLUMNS
+
+
+def load_and_preprocess_responses(
+    include_text=False,
+    return_attention_check_report=False,
+    agreement_influence_threshold=None,
+    cache=None,
+):
+    """
+    :param include_text: add the input/outputa/outputb texts to the long table,
+        interned into a TextPool as input_id/outputa_id/outputb_id columns; the
+        pool is returned last, a report looks the texts of its rows up with
+        resolve_texts
+    :param return_attention_check_report: also return the attention check report
+    :param agreement_influence_threshold: optional data-driven quality filter,
+        see filter_attention_checks
+    :param cache: ArtifactCache to reuse the processed table from while the
+        responses and the preprocessing code are unchanged
+    """
+    if cache is not None:
+        key = cache.get_key(
+            "processed_responses",
+            inputs=[RESPONSES_CSV_PATH, RESPONSES_PARQUET_PATH],
+            parameters={
+                "include_text": include_text,
+                "agreement_influence_threshold": agreement_influence_threshold,
+            },
+            code=PREPROCESSING_CODE_PATHS,
+        )
+        responses_processed_df, attention_check_report, *text_pool = cache.get_or_compute(
+            key,
+            lambda: load_and_preprocess_responses(
+                include_text,
+                return_attention_check_report=True,
+                agreement_influence_threshold=agreement_influence_threshold,
+            ),
+        )
+        if return_attention_check_report:
+            return (responses_processed_df, attention_check_report, *text_pool)
+        return (responses_processed_df, *text_pool) if include_text else responses_processed_df
+
+    responses_df = read_responses(
+        columns=lambda column: is_analysis_column(column, include_text)
+    )
+    text_pool = TextPool() if include_text else None
+    processed = preprocess_responses_df(
+        responses_df,
+        text_pool,
+        return_attention_check_report=return_attention_check_report,
+        agreement_influence_threshold=agreement_influence_threshold,
+    )
+    if not include_text:
+        return processed
+    if return_attention_check_report:
+        return (*processed, text_pool)
+    return processed, text_pool
+
+
+def resolve_texts(responses_processed_df, text_pool):
+    """
+    Look up the input/outputa/outputb texts of the rows of a table loaded with
+    include_text, e.g. only of the rows a report keeps after filtering.
+    :return: dataframe with one text column per field, indexed like responses_processed_df
+    """
+    return pd.DataFrame(
+        {
+            field: text_pool.lookup(responses_processed_df[f"{field}_id"])
+            for field in SLOT_TEXT_FIELDS
+        },
+        index=responses_processed_df.index,
+    )
+
+
+def report_attention_checks(attention_check_report):
+    participant_checks = attention_check_report["participant_checks"]
+    participant_checks.to_csv(
+        "results/lab1/attention_checks.csv", index=True, quoting=csv.QUOTE_NONNUMERIC
+    )
+    print(
+        f"Users with failed attention checks: {attention_check_report['failed_participants']}"
+    )
+    print(
+        f"Task UUIDs with failed attention checks: {attention_check_report['invalid_task_uuids']}"
+    )
+    print(
+        f"Users without attention checks: {len(attention_check_report['unchecked_participants'])}"
+    )
 
 
 def report_fleiss_kappa(responses_processed_df):
     # need itemx x category matrix
     # n columns, represents the options
     # m rows, represents the each task
-
-    matrix = (
-        responses_processed_df.groupby(["task_id", "selected_system"])
-        .size()
-        .unstack(fill_value=0)
+    fleiss_kappa_accumulator = FleissKappaAccumulator().update(
+        responses_processed_df["task_id"], responses_processed_df["selected_system"]
     )
 
-    fleiss_kappa_value = fleiss_kappa(matrix.values, method="fleiss")
+    fleiss_kappa_value = fleiss_kappa_accumulator.kappa()
 
     with open("results/lab1/fleiss_kappa.txt", "w") as f:
         f.write(f"Fleiss Kappa: {fleiss_kappa_value:.3f}")
 
+    matrix = fleiss_kappa_accumulator.count_matrix().rename_axis("task_id")
     matrix.to_csv(
         "results/lab1/fleiss_kappa_matrix.csv",
         index=True,
         quoting=csv.QUOTE_NONNUMERIC,
     )
 
+    return fleiss_kappa_accumulator
+
 
 def report_krippendorff_alpha(responses_processed_df):
-    reliability_data = (
-        responses_processed_df[["task_id", "participant_id", "selected_system"]]
-        .pivot_table(
-            index="participant_id",
-            columns="task_id",
-            values="selected_system",
-            aggfunc="first",
-        )
-        .reset_index(drop=True)
-    )
+    # sparse (task, participant, value) triplets instead of a participant x task matrix
+    reliability_data = get_reliability_triplets(responses_processed_df)
 
     reliability_data.to_csv(
         "results/lab1/reliability_data.csv", index=False, quoting=csv.QUOTE_NONNUMERIC
     )
 
-    alpha = krippendorff.alpha(
-        reliability_data.to_numpy(), level_of_measurement="nominal"
+    alpha = krippendorff_alpha_nominal(
+        reliability_data["task_id"], reliability_data["selected_system"]
     )
 
     with open("results/lab1/krippendorff_alpha.txt", "w") as f:
@@ -188,6 +394,22 @@ def report_krippendorff_alpha(responses_processed_df):
     return alpha
 
 
+def report_rater_influence(responses_processed_df):
+    reliability_data = get_reliability_triplets(responses_processed_df)
+    rater_influence = get_rater_influence(
+        reliability_data["task_id"],
+        reliability_data["participant_id"],
+        reliability_data["selected_system"],
+    ).rename_axis("participant_id")
+
+    rater_influence.to_csv(
+        "results/lab1/rater_influence.csv", index=True, quoting=csv.QUOTE_NONNUMERIC
+    )
+    print("Participants whose removal raises Krippendorff's Alpha the most:")
+    print(rater_influence.head())
+    return rater_influence
+
+
 def report_datasets_used(responses_processed_df):
     responses_processed_df.sort_values(by=["dataset_id", "systema", "systemb"])
     datasets_and_index = responses_processed_df[
@@ -224,66 +446,127 @@ def report_datasets_used(responses_processed_df):
     # c d -
 
 
-def calculate_metrics_alternative_2(responses_processed_df):
-    system_order_dict = {"vae": 0, "sep_ae": 1, "lbow": 1, "dips": 3}
+def order_systems(systems, system_order=None):
+    """
+    :param systems: iterable of system names
+    :param system_order: list of system names, or dict of system name to rank;
+        systems it does not mention come last, sorted by name
+    :return: list of systems in that order
+    """
+    if system_order is None:
+        system_order = SYSTEM_ORDER
+    if not isinstance(system_order, dict):
+        system_order = {system: rank for rank, system in enumerate(system_order)}
+    unranked = len(system_order)
+    return sorted(systems, key=lambda system: (system_order.get(system, unranked), system))
 
-    system_count_dict = {system: 0 for system in system_order_dict.keys()}
 
-    scores_list = []
+def encode_comparisons(responses_processed_df, system_order=None):
+    """
+    Integer-encode the systems of every comparison, the building block of the
+    vectorized scoring and metrics kernels.
+    :return: dict with the ordered list of systems and, per row, the codes of
+        systema, systemb, the selected (winning) and the other (losing) system
+    """
+    systems = order_systems(
+        pd.unique(
+            np.concatenate(
+                [
+                    responses_processed_df["systema"].to_numpy(),
+                    responses_processed_df["systemb"].to_numpy(),
+                ]
+            )
+        ),
+        system_order,
+    )
+    systema_codes = pd.Categorical(
+        responses_processed_df["systema"], categories=systems
+    ).codes.astype(np.int64)
+    systemb_codes = pd.Categorical(
+        responses_processed_df["systemb"], categories=systems
+    ).codes.astype(np.int64)
+
+    selected_system = responses_processed_df["selected_system"].to_numpy()
+    is_unexpected = (selected_system != 0) & (selected_system != 1)
+    if is_unexpected.any():
+        raise ValueError(f"Unexpected value: {selected_system[is_unexpected][0]}")
+    is_a_selected = selected_system == 0
+
+    return {
+        "systems": systems,
+        "systema_codes": systema_codes,
+        "systemb_codes": systemb_codes,
+        "winner_codes": np.where(is_a_selected, systema_codes, systemb_codes),
+        "loser_codes": np.where(is_a_selected, systemb_codes, systema_codes),
+    }
+
+
+def calculate_metrics_alternative_2(responses_processed_df, system_order=None):
+    """
+    :return: (long dataframe with the score (+1 win, -1 loss) of systema and of
+        systemb for every comparison, in row order; dict of system to the number
+        of comparisons it appeared in)
+    """
+    comparisons = encode_comparisons(responses_processed_df, system_order)
+    systems = np.asarray(comparisons["systems"], dtype=object)
 
-    for _, row in responses_processed_df.iterrows():
-        system_a_dict = {"system": row["systema"]}
-        system_b_dict = {"system": row["systemb"]}
-        if row["selected_system"] == 0:
-            system_a_dict["score"] = 1
-            system_b_dict["score"] = -1
-        elif row["selected_system"] == 1:
-            system_a_dict["score"] = -1
-            system_b_dict["score"] = 1
-        else:
-            raise ValueError(f"Unexpected value: {row['selected_system']}")
-        scores_list.append(system_a_dict)
-        scores_list.append(system_b_dict)
+    systema_scores = np.where(
+        comparisons["winner_codes"] == comparisons["systema_codes"], 1, -1
+    )
+    scores_df = pd.DataFrame(
+        {
+            "system": systems[
+                np.column_stack(
+                    [comparisons["systema_codes"], comparisons["systemb_codes"]]
+                ).ravel()
+            ],
+            "score": np.column_stack([systema_scores, -systema_scores]).ravel(),
+        }
+    )
 
-    scores_df = pd.DataFrame(scores_list)
+    exposure_counts = np.bincount(
+        comparisons["winner_codes"], minlength=len(systems)
+    ) + np.bincount(comparisons["loser_codes"], minlength=len(systems))
+    system_count_dict = dict(zip(comparisons["systems"], exposure_counts.tolist()))
 
     return scores_df, system_count_dict
 
 
-def get_task_scores(responses_processed_df):
-    dataset_id_list = responses_processed_df["dataset_id"].unique().tolist()
-
-    system_order_dict = {"vae": 0, "sep_ae": 1, "lbow": 1, "dips": 3}
-
-    system_count_dict = {system: 0 for system in system_order_dict.keys()}
-
-    scores_list = []
-    for dataset_id in dataset_id_list:
-        task_responses_df = responses_processed_df[
-            responses_processed_df["dataset_id"] == dataset_id
-        ]
-        system_scores = {system: 0 for system in system_order_dict.keys()}
-        for _, row in task_responses_df.iterrows():
-            if row["selected_system"] == 0:
-                system_scores[row["systema"]] += 1
-                system_scores[row["systemb"]] -= 1
-            elif row["selected_system"] == 1:
-                system_scores[row["systemb"]] += 1
-                system_scores[row["systema"]] -= 1
-            else:
-                raise ValueError(f"Unexpected value: {row['selected_system']}")
-
-            system_count_dict[row["systema"]] += 1
-            system_count_dict[row["systemb"]] += 1
-
-        scores_list.append(system_scores)
+def get_task_scores(responses_processed_df, system_order=None):
+    """
+    Score every item (dataset_id) for every system: +1 for each comparison of
+    the item the system won and -1 for each it lost, built in one scatter-add.
+    :return: (scores dataframe with one row per item, in order of first
+        appearance, and one column per system; dict of system to the number of
+        comparisons it appeared in)
+    """
+    comparisons = encode_comparisons(responses_processed_df, system_order)
+    systems = comparisons["systems"]
+    system_count = len(systems)
+
+    item_codes, items = pd.factorize(responses_processed_df["dataset_id"])
+    cell_count = len(items) * system_count
+    scores = np.bincount(
+        item_codes * system_count + comparisons["winner_codes"], minlength=cell_count
+    ) - np.bincount(
+        item_codes * system_count + comparisons["loser_codes"], minlength=cell_count
+    )
+    scores_df = pd.DataFrame(scores.reshape(len(items), system_count), columns=systems)
 
-    scores_df = pd.DataFrame(scores_list)
+    exposure_counts = np.bincount(
+        comparisons["systema_codes"], minlength=system_count
+    ) + np.bincount(comparisons["systemb_codes"], minlength=system_count)
+    system_count_dict = dict(zip(systems, exposure_counts.tolist()))
 
     return scores_df, system_count_dict
 
 
-def report_significant_testing(responses_processed_df):
+def report_significant_testing(responses_processed_df, permutation_count=0, seed=0, mp_context=None):
+    """
+    One-way ANOVA and Tukey HSD of the item scores and, with permutation_count,
+    the distribution-free permutation test of the same scores (see permutation.py).
+    :param mp_context: multiprocessing context of the permutation test workers
+    """
     scores_df, system_count_dict = get_task_scores(responses_processed_df)
 
     statistic, p = stats.f_oneway(*(scores_df.values.T).tolist())
@@ -306,63 +589,146 @@ def report_significant_testing(responses_processed_df):
         file.write(f"P value: {p}\n")
         file.write("Tukey HSD:\n")
         file.write(str(result))
-    return scores_df, system_count_dict
-
 
-def report_metrics(responses_processed_df):
-    metrics_list = []
-
-    systems_set = set(
-        responses_processed_df["systema"].tolist()
-        + responses_processed_df["systemb"].tolist()
-    )
-
-    for system in systems_set:
-        system_a_matches = responses_processed_df[
-            responses_processed_df["systema"] == system
-        ]
-        system_b_matches = responses_processed_df[
-            responses_processed_df["systemb"] == system
-        ]
-
-        system_a_wins = len(system_a_matches[system_a_matches["selected_system"] == 0])
-        system_a_losses = len(
-            system_a_matches[system_a_matches["selected_system"] == 1]
-        )
-        system_b_wins = len(system_b_matches[system_b_matches["selected_system"] == 1])
-        system_b_losses = len(
-            system_b_matches[system_b_matches["selected_system"] == 0]
+    if permutation_count:
+        omnibus_p, pair_p, pair_p_adjusted = permutation_test(
+            scores_df.to_numpy(), permutation_count, seed, mp_context=mp_context
         )
-        system_count = len(system_a_matches) + len(system_b_matches)
-
-        wins_count = system_a_wins + system_b_wins
-        losses_count = system_a_losses + system_b_losses
+        permutation_table = get_permutation_test_table(scores_df, pair_p, pair_p_adjusted)
+        print("Permutation test")
+        print("================")
+        print("Permutations:", permutation_count)
+        print("P value", omnibus_p)
+        print(permutation_table.to_string(index=False), "\n")
+
+        with open("results/lab1/permutation_test.txt", "w") as file:
+            file.write("Permutation test\n")
+            file.write(f"Permutations: {permutation_count}\n")
+            file.write(f"P value: {omnibus_p}\n")
+            file.write("Pairwise, max-T adjusted:\n")
+            file.write(permutation_table.to_string(index=False))
+    return scores_df, system_count_dict
 
-        total_count = wins_count + losses_count
 
-        assert total_count == system_count
+def get_system_metrics(responses_processed_df, system_order=None):
+    """
+    Wins, losses, best-worst score/scale and win percentage of every system,
+    aggregated for all systems at once from the encoded comparisons.
+    :param system_order: order of the rows, see order_systems
+    :return: metrics dataframe, one row per system
+    """
+    comparisons = encode_comparisons(responses_processed_df, system_order)
+    system_count = len(comparisons["systems"])
 
-        best_worst_scale = None
-        win_percentage = None
+    wins_count = np.bincount(comparisons["winner_codes"], minlength=system_count)
+    losses_count = np.bincount(comparisons["loser_codes"], minlength=system_count)
 
-        if wins_count + losses_count != 0:
-            best_worst_scale = (wins_count - losses_count) / total_count * 100.0
-            win_percentage = wins_count / total_count * 100.0
+    best_worst_scale, win_percentage = get_best_worst_metrics(wins_count, losses_count)
 
-        metrics_dict = {
-            "system": system,
+    metrics_df = pd.DataFrame(
+        {
+            "system": comparisons["systems"],
             "wins": wins_count,
             "losses": losses_count,
             "best_worst_score": wins_count - losses_count,
             "best_worst_scale": best_worst_scale,
             "win_percentage": win_percentage,
         }
-        metrics_list.append(metrics_dict)
-    system_order_dict = {"vae": 0, "sep_ae": 1, "lbow": 1, "dips": 3}
+    )
+
+    return metrics_df
+
 
-    metrics_list = sorted(metrics_list, key=lambda x: system_order_dict[x["system"]])
+def get_system_metric_intervals(
+    responses_processed_df,
+    resample_level="participant",
+    resample_count=10000,
+    confidence=0.95,
+    seed=0,
+    max_workers=None,
+    system_order=None,
+    mp_context=None,
+):
+    """
+    Bootstrap percentile intervals of the best-worst scale and win percentage.
+    :param resample_level: "participant" or "item" (dataset_id), the cluster
+        that is resampled with replacement
+    :param mp_context: multiprocessing context of the bootstrap workers
+    :return: dataframe with one row per system, in the order of get_system_metrics
+    """
+    resample_columns = {"participant": "participant_id", "item": "dataset_id"}
+    if resample_level not in resample_columns:
+        raise ValueError(f"Unexpected resample level: {resample_level}")
+
+    comparisons = encode_comparisons(responses_processed_df, system_order)
+    win_counts, loss_counts = get_cluster_counts(
+        responses_processed_df[resample_columns[resample_level]],
+        comparisons["winner_codes"],
+        comparisons["loser_codes"],
+        len(comparisons["systems"]),
+    )
+    best_worst_scale, win_percentage = bootstrap_best_worst_metrics(
+        win_counts, loss_counts, resample_count, seed, max_workers=max_workers,
+        mp_context=mp_context,
+    )
+
+    intervals_dict = {"system": comparisons["systems"]}
+    for metric, resampled_values in [
+        ("best_worst_scale", best_worst_scale),
+        ("win_percentage", win_percentage),
+    ]:
+        lower, upper = get_percentile_intervals(resampled_values, confidence)
+        intervals_dict[f"{metric}_ci_low"] = lower
+        intervals_dict[f"{metric}_ci_high"] = upper
+
+    return pd.DataFrame(intervals_dict)
+
+
+def report_metrics(
+    responses_processed_df,
+    system_order=None,
+    resample_count=0,
+    resample_level="participant",
+    seed=0,
+    cache=None,
+    mp_context=None,
+):
+    """
+    :param resample_count: number of bootstrap resamples for the confidence
+        interval columns, 0 to leave them out
+    :param cache: ArtifactCache to reuse the bootstrap intervals from
+    :param mp_context: multiprocessing context of the bootstrap workers
+    """
+    metrics_df = get_system_metrics(responses_processed_df, system_order)
+
+    if resample_count:
+
+        def compute_intervals():
+            return get_system_metric_intervals(
+                responses_processed_df,
+                resample_level,
+                resample_count,
+                seed=seed,
+                system_order=system_order,
+                mp_context=mp_context,
+            )
 
-    metrics_df = pd.DataFrame(metrics_list)
+        if cache is None:
+            intervals_df = compute_intervals()
+        else:
+            key = cache.get_key(
+                "system_metric_intervals",
+                parameters={
+                    "resample_level": resample_level,
+                    "resample_count": resample_count,
+                    "seed": seed,
+                    "system_order": system_order,
+                },
+                code=METRICS_CODE_PATHS,
+                frames=[responses_processed_df],
+            )
+            intervals_df = cache.get_or_compute(key, compute_intervals)
+        metrics_df = metrics_df.merge(intervals_df, on="system", how="left")
 
     metrics_df.to_csv(
         "results/lab1/tables/results.csv", index=False, quoting=csv.QUOTE_NONNUMERIC
@@ -376,16 +742,48 @@ def report_metrics(responses_processed_df):
     return metrics_df
 
 
+def report_pairwise_ranking(responses_processed_df, system_order=None, prior=0.0):
+    """
+    Bradley-Terry and Thurstone strengths with standard errors, written next
+    to results.csv.
+    """
+    comparisons = encode_comparisons(responses_processed_df, system_order)
+    strengths_df = get_pairwise_strengths(
+        comparisons["systems"],
+        comparisons["winner_codes"],
+        comparisons["loser_codes"],
+        prior=prior,
+    )
+
+    strengths_df.to_csv(
+        "results/lab1/tables/pairwise_ranking.csv", index=False, quoting=csv.QUOTE_NONNUMERIC
+    )
+    strengths_df.to_latex(
+        "results/lab1/tables/pairwise_ranking.tex", index=False, escape=True, float_format="%.3f"
+    )
+
+    print(strengths_df)
+
+    return strengths_df
+
+
 def main():
-    responses_processed_df = load_and_preprocess_responses()
+    cache = ArtifactCache()
+    responses_processed_df, attention_check_report = load_and_preprocess_responses(
+        return_attention_check_report=True, cache=cache
+    )
+
+    report_attention_checks(attention_check_report)
 
     report_datasets_used(responses_processed_df)
 
-    report_significant_testing(responses_processed_df)
-    report_metrics(responses_processed_df)
+    report_significant_testing(responses_processed_df, permutation_count=10000)
+    report_metrics(responses_processed_df, resample_count=10000, cache=cache)
+    report_pairwise_ranking(responses_processed_df)
 
     report_fleiss_kappa(responses_processed_df)
     report_krippendorff_alpha(responses_processed_df)
+    report_rater_influence(responses_processed_df)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,183 @@
+"""Content-addressed on-disk cache for the intermediates of the analysis scripts.
+
+Every artifact (processed comparison table, bootstrap intervals, ...) is keyed
+on a hash of everything it is computed from: the contents of its input files,
+the parameters it was computed with, the source of the modules computing it
+and the contents of any dataframe it is derived from. A changed input, a
+changed parameter or an edited module gives a new key, so a stale artifact is
+never returned, while rerunning after editing an unrelated script (e.g. a
+plotting script) reuses everything. Artifacts are pickled, which is the
+fastest round trip for dataframes and arrays alike. The cache is bounded in
+size and evicts the least recently used artifacts first. One instance can be
+shared by threads (e.g. the stages of pipeline.py): the digest index and the
+eviction are guarded by a lock, and every write goes through its own
+temporary file before it is renamed into place.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+
+import pandas as pd
+
+ARTIFACT_CACHE_DIR = ".cache/artifacts"
+ARTIFACT_CACHE_MAX_BYTES = 2 * 2**30
+
+# file digests are reused while the size and modification time do not change
+FILE_DIGEST_INDEX = "file_digests.json"
+
+
+def get_frame_digest(df):
+    """
+    :return: hex digest of the contents, column names and dtypes of a dataframe
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([list(map(str, df.columns)), list(map(str, df.dtypes))]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class ArtifactCache:
+    def __init__(self, cache_dir=ARTIFACT_CACHE_DIR, max_bytes=ARTIFACT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._file_digests = None
+        self._lock = threading.RLock()
+
+    def _get_artifact_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _write_atomically(self, path, write, mode="w"):
+        """
+        Write through a uniquely named temporary file in the cache directory,
+        so concurrent writers never share a temporary path and a reader never
+        sees a partial file.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, mode) as file:
+                write(file)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+    def _load_file_digests(self):
+        # called with self._lock held
+        if self._file_digests is None:
+            try:
+                with open(os.path.join(self.cache_dir, FILE_DIGEST_INDEX)) as file:
+                    self._file_digests = json.load(file)
+            except (OSError, ValueError):
+                self._file_digests = {}
+        return self._file_digests
+
+    def _save_file_digests(self):
+        # called with self._lock held, so the index does not change while it is dumped
+        self._write_atomically(
+            os.path.join(self.cache_dir, FILE_DIGEST_INDEX),
+            lambda file: json.dump(self._file_digests, file),
+        )
+
+    def get_file_digest(self, path):
+        """
+        :return: hex digest of the file contents, None if it does not exist
+        """
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._load_file_digests().get(os.path.abspath(path))
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["digest"]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(2**20), b""):
+                digest.update(block)
+        with self._lock:
+            self._load_file_digests()[os.path.abspath(path)] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "digest": digest.hexdigest(),
+            }
+            self._save_file_digests()
+        return digest.hexdigest()
+
+    def get_key(self, name, inputs=(), parameters=None, code=(), frames=()):
+        """
+        :param name: artifact name, e.g. "processed_responses"
+        :param inputs: paths of the input files
+        :param parameters: JSON-serializable parameters of the computation
+        :param code: paths of the modules computing the artifact
+        :param frames: dataframes the artifact is derived from
+        :return: content-addressed key of the artifact
+        """
+        digest = hashlib.sha256(name.encode())
+        for path in list(inputs) + list(code):
+            digest.update(f"{path}:{self.get_file_digest(path)}".encode())
+        digest.update(json.dumps(parameters, sort_keys=True, default=str).encode())
+        for df in frames:
+            digest.update(get_frame_digest(df).encode())
+        return f"{name}-{digest.hexdigest()[:40]}"
+
+    def get(self, key):
+        """
+        :return: (True, artifact) on a hit, (False, None) on a miss
+        """
+        artifact_path = self._get_artifact_path(key)
+        try:
+            with open(artifact_path, "rb") as file:
+                artifact = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return False, None
+        # the modification time is the recency used for eviction
+        try:
+            os.utime(artifact_path)
+        except FileNotFoundError:
+            # evicted by another thread since it was read
+            pass
+        return True, artifact
+
+    def put(self, key, artifact):
+        self._write_atomically(
+            self._get_artifact_path(key),
+            lambda file: pickle.dump(artifact, file, protocol=pickle.HIGHEST_PROTOCOL),
+            mode="wb",
+        )
+        self.evict()
+
+    def get_or_compute(self, key, compute):
+        is_hit, artifact = self.get(key)
+        if not is_hit:
+            artifact = compute()
+            self.put(key, artifact)
+        return artifact
+
+    def evict(self):
+        """
+        Remove the least recently used artifacts until the cache fits in max_bytes.
+        """
+        with self._lock:
+            artifacts = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(".pkl"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        # removed by another process since the directory was listed
+                        continue
+                    artifacts.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            total_bytes = sum(size for _, size, _ in artifacts)
+            for _, size, path in sorted(artifacts):
+                if total_bytes <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total_bytes -= size
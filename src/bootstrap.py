@@ -0,0 +1,132 @@
+"""Cluster bootstrap of the best-worst metrics on integer-encoded comparisons.
+
+Comparisons are reduced once to per-cluster (participant or item) win and loss
+counts for every system. A resample is then just a vector of multinomial
+cluster weights, so a whole batch of resamples is one matrix product of the
+weights with the count matrices. Batches are spread over a process pool, each
+with its own child of one SeedSequence, so results only depend on the seed and
+batch_size, not on the number of workers.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+def get_cluster_counts(cluster_values, winner_codes, loser_codes, system_count):
+    """
+    :param cluster_values: resampling cluster of every comparison, e.g. participant_id
+    :param winner_codes: code of the selected system of every comparison
+    :param loser_codes: code of the other system of every comparison
+    :return: (clusters x systems win counts, clusters x systems loss counts)
+    """
+    cluster_codes, clusters = pd.factorize(np.asarray(cluster_values))
+    cell_count = len(clusters) * system_count
+    win_counts = np.bincount(
+        cluster_codes * system_count + winner_codes, minlength=cell_count
+    ).reshape(len(clusters), system_count)
+    loss_counts = np.bincount(
+        cluster_codes * system_count + loser_codes, minlength=cell_count
+    ).reshape(len(clusters), system_count)
+    return win_counts, loss_counts
+
+
+def get_best_worst_metrics(win_counts, loss_counts):
+    """
+    :return: (best-worst scale, win percentage), elementwise over any shape;
+        NaN where a system has no comparisons
+    """
+    total_counts = win_counts + loss_counts
+    with np.errstate(divide="ignore", invalid="ignore"):
+        best_worst_scale = (win_counts - loss_counts) / total_counts * 100.0
+        win_percentage = win_counts / total_counts * 100.0
+    return best_worst_scale, win_percentage
+
+
+def bootstrap_batch(win_counts, loss_counts, resample_count, seed_sequence):
+    """
+    :return: (best-worst scale, win percentage), resamples x systems arrays
+    """
+    rng = np.random.default_rng(seed_sequence)
+    cluster_count = len(win_counts)
+    cluster_weights = rng.multinomial(
+        cluster_count, np.full(cluster_count, 1.0 / cluster_count), size=resample_count
+    )
+    return get_best_worst_metrics(cluster_weights @ win_counts, cluster_weights @ loss_counts)
+
+
+def bootstrap_best_worst_metrics(win_counts, loss_counts, resample_count=10000, seed=0,
+                                 batch_size=1000, max_workers=None, mp_context=None):
+    """
+    :param win_counts: clusters x systems win counts, see get_cluster_counts
+    :param loss_counts: clusters x systems loss counts
+    :param mp_context: multiprocessing context of the worker processes, the
+        platform default if None
+    :return: (best-worst scale, win percentage), resamples x systems arrays
+    """
+    if resample_count < 1:
+        raise ValueError(f"resample_count has to be at least 1, got {resample_count}")
+    batch_sizes = [batch_size] * (resample_count // batch_size)
+    if resample_count % batch_size:
+        batch_sizes.append(resample_count % batch_size)
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+    batch_arguments = [
+        (win_counts, loss_counts, size, seed_sequence)
+        for size, seed_sequence in zip(batch_sizes, seed_sequences)
+    ]
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(batch_arguments))
+    if max_workers <= 1:
+        batch_results = [bootstrap_batch(*arguments) for arguments in batch_arguments]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as executor:
+            batch_results = list(executor.map(bootstrap_batch, *zip(*batch_arguments)))
+
+    best_worst_scale = np.concatenate([result[0] for result in batch_results])
+    win_percentage = np.concatenate([result[1] for result in batch_results])
+    return best_worst_scale, win_percentage
+
+
+def get_percentile_intervals(resampled_values, confidence=0.95):
+    """
+    :param resampled_values: resamples x statistics array
+    :return: (lower bounds, upper bounds) of the percentile intervals
+    """
+    tail = (1 - confidence) / 2 * 100
+    lower, upper = np.nanpercentile(resampled_values, [tail, 100 - tail], axis=0)
+    return lower, upper
+
+
+def get_resampled_correlations(reference_values, resampled_values, batch_size=1000):
+    """
+    Pearson and Spearman correlation of a fixed vector with every resampled
+    vector, a batch of resamples at a time: the batch is ranked once and both
+    correlations are row-wise products of the standardized matrices.
+    :param reference_values: length systems vector, e.g. the original scales
+    :param resampled_values: resamples x systems array
+    :return: (Pearson correlations, Spearman correlations), one per resample;
+        NaN for constant resamples
+    """
+    reference_values = np.asarray(reference_values, dtype=float)
+    reference_ranks = stats.rankdata(reference_values)
+
+    def standardize(values):
+        centered = values - values.mean(axis=-1, keepdims=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return centered / np.sqrt((centered**2).sum(axis=-1, keepdims=True))
+
+    pearson_reference = standardize(reference_values)
+    spearman_reference = standardize(reference_ranks)
+
+    pearson = np.empty(len(resampled_values))
+    spearman = np.empty(len(resampled_values))
+    for start in range(0, len(resampled_values), batch_size):
+        batch = np.asarray(resampled_values[start : start + batch_size], dtype=float)
+        pearson[start : start + batch_size] = standardize(batch) @ pearson_reference
+        spearman[start : start + batch_size] = (
+            standardize(stats.rankdata(batch, axis=1)) @ spearman_reference
+        )
+    return pearson, spearman
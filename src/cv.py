@@ -33,70 +33,117 @@ KNOWN ISSUES:
 none
 """
 
-import math
 import numpy as np
 import pandas as pd
+from scipy.special import gammaln
 from scipy.stats import t
 
 
+def get_precision_results_batch(measurements, mask=None, confidence=0.95):
+    """
+    CV* and the other precision stats of many sets of measurements at once,
+    e.g. a labs x systems (x criteria) matrix with one set per system (and
+    criterion). Uses log-gamma for c_4(N), so large samples do not overflow.
+    :param measurements: array whose first axis holds the measurements of each set
+    :param mask: boolean array of the same shape, True for the measurements
+        that exist, so sets can have different sizes; by default the non-NaN ones
+    :return: dict of arrays with one value per set (the shape of
+        measurements without its first axis): sample size, mean, unbiased
+        stdev, stdev CI bounds, CV, CV* and % of measured values within one
+        and two standard deviations; NaN for sets smaller than 2 or with a
+        mean that is 0 or negative
+    """
+    measurements = np.asarray(measurements, dtype=float)
+    if mask is None:
+        mask = ~np.isnan(measurements)
+    mask = np.asarray(mask, dtype=bool)
+    values = np.where(mask, measurements, 0.0)
+
+    sample_size = mask.sum(axis=0)
+    degrees_of_freedom = sample_size - 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sample_mean = values.sum(axis=0) / sample_size
+        is_valid = (sample_size >= 2) & (sample_mean > 0)
+        sum_of_squared_differences = np.sum(
+            np.where(mask, np.square(sample_mean - values), 0.0), axis=0
+        )
+
+        # unbiassed sample variance s^2
+        unbiassed_sample_variance = sum_of_squared_differences / degrees_of_freedom
+        # corrected sample standard deviation s
+        corrected_sample_standard_deviation = np.sqrt(unbiassed_sample_variance)
+        # c_4(N) = sqrt(2 / (N - 1)) * Gamma(N/2) / Gamma((N-1)/2)
+        c_4_N = np.sqrt(2 / degrees_of_freedom) * np.exp(
+            gammaln(sample_size / 2) - gammaln(degrees_of_freedom / 2)
+        )
+        # unbiassed sample std dev s/c_4
+        unbiassed_sample_std_dev_s_c_4 = corrected_sample_standard_deviation / c_4_N
+        # standard error of the unbiassed sample variance (assumes normally distributed population)
+        standard_error_of_unbiassed_sample_variance = unbiassed_sample_variance * np.sqrt(
+            2 / degrees_of_freedom
+        )
+        # estimated std err of std dev based on std err of unbiassed sample variance
+        est_SE_of_SD_based_on_SE_of_unbiassed_sample_variance = (
+            standard_error_of_unbiassed_sample_variance / (2 * unbiassed_sample_std_dev_s_c_4)
+        )
+        t_quantile = t.ppf((1 + confidence) / 2, degrees_of_freedom)
+
+        # COEFFICIENT OF VARIATION CV
+        coefficient_of_variation = (unbiassed_sample_std_dev_s_c_4 / sample_mean) * 100
+        # SMALL SAMPLE CORRECTED COEFFICIENT OF VARIATION CV*
+        small_sample_coefficient_of_variation = (
+            1 + (1 / (4 * sample_size))
+        ) * coefficient_of_variation
+
+        # percentage of measured values within 1 and 2 standard deviations from the mean
+        deviations = np.abs(values - sample_mean)
+        within_1_sd = (
+            np.sum(mask & (deviations < unbiassed_sample_std_dev_s_c_4), axis=0) / sample_size * 100
+        )
+        within_2_sd = (
+            np.sum(mask & (deviations < 2 * unbiassed_sample_std_dev_s_c_4), axis=0)
+            / sample_size
+            * 100
+        )
+
+    results = {
+        "sample size": sample_size,
+        "mean": sample_mean,
+        "unbiased stdev": unbiassed_sample_std_dev_s_c_4,
+        "stdev CI low": unbiassed_sample_std_dev_s_c_4
+        - t_quantile * est_SE_of_SD_based_on_SE_of_unbiassed_sample_variance,
+        "stdev CI high": unbiassed_sample_std_dev_s_c_4
+        + t_quantile * est_SE_of_SD_based_on_SE_of_unbiassed_sample_variance,
+        "CV": coefficient_of_variation,
+        "CV*": small_sample_coefficient_of_variation,
+        "% within one stdev": within_1_sd,
+        "% within two stdev": within_2_sd,
+    }
+    for name, result in results.items():
+        if name != "sample size":
+            results[name] = np.where(is_valid, result, np.nan)
+    return results
+
+
 def get_precision_results(set_of_measurements):
     if len(set_of_measurements) < 2:
         raise ValueError(set_of_measurements, ": set of measurements is smaller than 2")
 
-    sample_mean = np.mean(set_of_measurements)
-    if sample_mean <= 0:
+    if np.mean(set_of_measurements) <= 0:
         raise ValueError(set_of_measurements, ": mean is 0 or negative")
 
-    sample_size = len(set_of_measurements)
-    degrees_of_freedom = sample_size - 1
-    sum_of_squared_differences = np.sum(np.square(sample_mean - set_of_measurements))
-
-    # unbiassed sample variance s^2
-    unbiassed_sample_variance = sum_of_squared_differences / degrees_of_freedom
-    # corrected sample standard deviation s
-    corrected_sample_standard_deviation = np.sqrt(unbiassed_sample_variance)
-    # Gamma(N/2)
-    gamma_N_over_2 = math.gamma(sample_size / 2)
-    # Gamma((N-1)/2)
-    gamma_df_over_2 = math.gamma(degrees_of_freedom / 2)
-    # c_4(N)
-    c_4_N = math.sqrt(2 / degrees_of_freedom) * gamma_N_over_2 / gamma_df_over_2
-    # unbiassed sample std dev s/c_4
-    unbiassed_sample_std_dev_s_c_4 = corrected_sample_standard_deviation / c_4_N
-    # standard error of the unbiassed sample variance (assumes normally distributed population)
-    standard_error_of_unbiassed_sample_variance = unbiassed_sample_variance * np.sqrt(2 / degrees_of_freedom)
-    # estimated std err of std dev based on std err of unbiassed sample variance
-    est_SE_of_SD_based_on_SE_of_unbiassed_sample_variance = standard_error_of_unbiassed_sample_variance / (
-            2 * unbiassed_sample_std_dev_s_c_4)
-
-    # COEFFICIENT OF VARIATION CV
-    coefficient_of_variation = (unbiassed_sample_std_dev_s_c_4 / sample_mean) * 100
-    # SMALL SAMPLE CORRECTED COEFFICIENT OF VARIATION CV*
-    small_sample_coefficient_of_variation = (1 + (1 / (4 * sample_size))) * coefficient_of_variation
-
-    # compute percentage of measured values within 1 and 2 standard deviations from the mean
-    # initialise counts
-    count_within_1_sd = 0
-    count_within_2_sd = 0
-    # for each measured value
-    for m in set_of_measurements:
-        # if it's within two std devs, increment count_within_2_sd
-        if np.abs(m - sample_mean) < 2 * unbiassed_sample_std_dev_s_c_4:
-            count_within_2_sd += 1
-            # if it's also within one std devs, increment count_within_1_sd
-            if np.abs(m - sample_mean) < unbiassed_sample_std_dev_s_c_4:
-                count_within_1_sd += 1
+    results = get_precision_results_batch(np.asarray(set_of_measurements, dtype=float))
 
     result_dict = {
         "values": set_of_measurements,
-        "sample size": sample_size,
-        "mean": sample_mean,
-        "unbiased stdev": unbiassed_sample_std_dev_s_c_4,
+        "sample size": int(results["sample size"]),
+        "mean": float(results["mean"]),
+        "unbiased stdev": float(results["unbiased stdev"]),
         "stdev 95% CI": "[{:.2f}, {:.2f}]".format(
-            *t.interval(0.95, degrees_of_freedom, loc=unbiassed_sample_std_dev_s_c_4,
-                        scale=est_SE_of_SD_based_on_SE_of_unbiassed_sample_variance)),
-        "CV*": small_sample_coefficient_of_variation,
-        # "% of measured values within two standard deviations": count_within_2_sd / sample_size * 100,
-        # "% of measured values within one standard deviations": count_within_1_sd / sample_size * 100,
+            float(results["stdev CI low"]), float(results["stdev CI high"])
+        ),
+        "CV*": float(results["CV*"]),
+        # "% of measured values within two standard deviations": float(results["% within two stdev"]),
+        # "% of measured values within one standard deviations": float(results["% within one stdev"]),
     }
     return result_dict
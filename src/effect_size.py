@@ -0,0 +1,83 @@
+"""Closed-form one-way ANOVA and effect sizes from group sums and counts.
+
+A one-way layout needs only the count, sum and sum of squares of every group,
+so the sums of squares, F test, eta-squared and Cohen's f follow directly
+from those without building a design matrix. Every function works on arrays
+with any number of leading dimensions, so many groupings (datasets, bootstrap
+resamples, subgroups) are evaluated in one call.
+"""
+
+import numpy as np
+from scipy import stats
+
+
+def get_group_statistics(values, group_codes, grouping_codes=None, group_count=None,
+                         grouping_count=None):
+    """
+    :param values: one observation per element
+    :param group_codes: integer group (e.g. system) of every observation
+    :param grouping_codes: integer grouping (e.g. dataset) of every observation,
+        None for a single grouping
+    :return: (counts, sums, sums of squares), groupings x groups arrays
+    """
+    values = np.asarray(values, dtype=float)
+    group_codes = np.asarray(group_codes)
+    if group_count is None:
+        group_count = int(group_codes.max()) + 1
+    if grouping_codes is None:
+        grouping_codes = np.zeros(len(values), dtype=np.int64)
+    grouping_codes = np.asarray(grouping_codes)
+    if grouping_count is None:
+        grouping_count = int(grouping_codes.max()) + 1 if len(grouping_codes) else 1
+
+    cell_codes = grouping_codes * group_count + group_codes
+    cell_count = grouping_count * group_count
+    shape = (grouping_count, group_count)
+    counts = np.bincount(cell_codes, minlength=cell_count).reshape(shape)
+    sums = np.bincount(cell_codes, values, minlength=cell_count).reshape(shape)
+    sums_of_squares = np.bincount(cell_codes, values**2, minlength=cell_count).reshape(shape)
+    return counts, sums, sums_of_squares
+
+
+def get_one_way_anova(counts, sums, sums_of_squares):
+    """
+    :param counts: ... x groups observation counts
+    :param sums: ... x groups sums of the observations
+    :param sums_of_squares: ... x groups sums of the squared observations
+    :return: dict of ... shaped arrays: ss_between, ss_within, ss_total,
+        df_between, df_within, f_value, p_value, eta_squared,
+        partial_eta_squared and cohens_f; groups without observations are
+        left out of the degrees of freedom
+    """
+    counts = np.asarray(counts, dtype=float)
+    sums = np.asarray(sums, dtype=float)
+    sums_of_squares = np.asarray(sums_of_squares, dtype=float)
+
+    total_count = counts.sum(axis=-1)
+    total_sum = sums.sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        group_means = np.where(counts > 0, sums / counts, 0.0)
+        grand_mean = total_sum / total_count
+
+        ss_within = (sums_of_squares - group_means * sums).sum(axis=-1)
+        ss_between = (counts * (group_means - grand_mean[..., None]) ** 2).sum(axis=-1)
+        df_between = (counts > 0).sum(axis=-1) - 1
+        df_within = total_count - df_between - 1
+
+        f_value = (ss_between / df_between) / (ss_within / df_within)
+        eta_squared = ss_between / (ss_between + ss_within)
+        cohens_f = np.sqrt(ss_between / ss_within)
+
+    return {
+        "ss_between": ss_between,
+        "ss_within": ss_within,
+        "ss_total": ss_between + ss_within,
+        "df_between": df_between,
+        "df_within": df_within,
+        "f_value": f_value,
+        "p_value": stats.f.sf(f_value, df_between, df_within),
+        "eta_squared": eta_squared,
+        # with a single factor the partial and the total eta-squared coincide
+        "partial_eta_squared": eta_squared,
+        "cohens_f": cohens_f,
+    }
@@ -0,0 +1,209 @@
+"""Bradley-Terry and Thurstone (case V) strengths from the pairwise comparisons.
+
+Unlike the best-worst scale, these models account for the opponent of every
+win: system i beats system j with probability F(s_i - s_j), where F is the
+logistic CDF (Bradley-Terry) or the standard normal CDF (Thurstone). The
+comparisons are reduced once to the win counts of every compared pair, so an
+iteration costs O(compared pairs) whatever the number of comparisons, and the
+strengths are fitted by Fisher scoring (Newton's method for Bradley-Terry)
+with one sparse (conjugate gradient) Laplacian solve per iteration.
+
+Strengths are on the log-odds (Bradley-Terry) or probit (Thurstone) scale and
+centered to mean zero; the standard errors come from the inverse Fisher
+information of the centered strengths. The maximum likelihood estimate only
+exists if the comparison graph is strongly connected (no group of systems
+that never lost to the rest); otherwise a prior adds pseudo comparisons of
+every system against a fixed-strength phantom opponent.
+"""
+
+import numpy as np
+import pandas as pd
+import scipy.sparse
+import scipy.sparse.csgraph
+import scipy.sparse.linalg
+from scipy import special
+
+MODELS = ("bradley_terry", "thurstone")
+
+
+def get_pair_counts(winner_codes, loser_codes, system_count):
+    """
+    :return: (first system, second system, wins of the first, wins of the
+        second) of every compared pair, first < second
+    """
+    winner_codes = np.asarray(winner_codes, dtype=np.int64)
+    loser_codes = np.asarray(loser_codes, dtype=np.int64)
+    first = np.minimum(winner_codes, loser_codes)
+    second = np.maximum(winner_codes, loser_codes)
+
+    pair_keys, pair_codes = np.unique(first * system_count + second, return_inverse=True)
+    first_wins = np.bincount(
+        pair_codes, weights=winner_codes == first, minlength=len(pair_keys)
+    )
+    second_wins = np.bincount(pair_codes, minlength=len(pair_keys)) - first_wins
+    return pair_keys // system_count, pair_keys % system_count, first_wins, second_wins
+
+
+def add_prior(first, second, first_wins, second_wins, system_count, prior):
+    """
+    Add prior wins and prior losses of every system against a phantom system
+    with index system_count.
+    """
+    systems = np.arange(system_count)
+    return (
+        np.concatenate([first, systems]),
+        np.concatenate([second, np.full(system_count, system_count)]),
+        np.concatenate([first_wins, np.full(system_count, float(prior))]),
+        np.concatenate([second_wins, np.full(system_count, float(prior))]),
+    )
+
+
+def is_strongly_connected(first, second, first_wins, second_wins, system_count):
+    # an edge from the loser to the winner of every observed win
+    losers = np.concatenate([second[first_wins > 0], first[second_wins > 0]])
+    winners = np.concatenate([first[first_wins > 0], second[second_wins > 0]])
+    graph = scipy.sparse.coo_matrix(
+        (np.ones(len(losers)), (losers, winners)), shape=(system_count, system_count)
+    )
+    component_count, _ = scipy.sparse.csgraph.connected_components(graph, connection="strong")
+    return component_count == 1
+
+
+def get_log_cdf_and_pdf(differences, model):
+    """
+    :return: (log F(d), log F(-d), log f(d)) for the model's link F
+    """
+    if model == "bradley_terry":
+        log_cdf = special.log_expit(differences)
+        log_survival = special.log_expit(-differences)
+        return log_cdf, log_survival, log_cdf + log_survival
+    log_cdf = special.log_ndtr(differences)
+    log_survival = special.log_ndtr(-differences)
+    return log_cdf, log_survival, -0.5 * differences**2 - 0.5 * np.log(2 * np.pi)
+
+
+def get_log_likelihood(strengths, first, second, first_wins, second_wins, model):
+    log_cdf, log_survival, _ = get_log_cdf_and_pdf(strengths[first] - strengths[second], model)
+    return np.sum(first_wins * log_cdf) + np.sum(second_wins * log_survival)
+
+
+def get_score_and_information(strengths, first, second, first_wins, second_wins, model):
+    """
+    :return: (gradient of the log-likelihood, sparse Fisher information matrix)
+    """
+    system_count = len(strengths)
+    log_cdf, log_survival, log_pdf = get_log_cdf_and_pdf(
+        strengths[first] - strengths[second], model
+    )
+    # f/F(d) and f/F(-d), the derivatives of log F(d) and log F(-d)
+    cdf_ratio = np.exp(log_pdf - log_cdf)
+    survival_ratio = np.exp(log_pdf - log_survival)
+
+    pair_scores = first_wins * cdf_ratio - second_wins * survival_ratio
+    score = np.bincount(first, pair_scores, system_count) - np.bincount(
+        second, pair_scores, system_count
+    )
+
+    # information of d = s_i - s_j is n f^2 / (F(d) F(-d)), a weighted graph Laplacian
+    pair_weights = (first_wins + second_wins) * cdf_ratio * survival_ratio
+    degrees = np.bincount(first, pair_weights, system_count) + np.bincount(
+        second, pair_weights, system_count
+    )
+    information = scipy.sparse.coo_matrix(
+        (
+            np.concatenate([degrees, -pair_weights, -pair_weights]),
+            (
+                np.concatenate([np.arange(system_count), first, second]),
+                np.concatenate([np.arange(system_count), second, first]),
+            ),
+        ),
+        shape=(system_count, system_count),
+    ).tocsc()
+    return score, information
+
+
+def solve_information(information, score):
+    """
+    Solve information @ step = score by conjugate gradients with a Jacobi
+    preconditioner; the reduced Laplacian is symmetric positive definite and
+    a direct factorization fills in badly on sparse random pairings.
+    """
+    preconditioner = scipy.sparse.diags(1 / information.diagonal())
+    step, _ = scipy.sparse.linalg.cg(information, score, rtol=1e-12, M=preconditioner)
+    return step
+
+
+def fit_pairwise_model(winner_codes, loser_codes, system_count, model="bradley_terry",
+                       prior=0.0, max_iterations=100, tolerance=1e-10):
+    """
+    :param winner_codes: code of the selected system of every comparison
+    :param loser_codes: code of the other system of every comparison
+    :param model: "bradley_terry" or "thurstone"
+    :param prior: pseudo wins and losses of every system against a phantom
+        opponent of strength zero, needed if the comparison graph is not
+        strongly connected
+    :return: (strengths, standard errors), centered to mean zero
+    """
+    if model not in MODELS:
+        raise ValueError(f"Unknown pairwise model {model}, expected one of {MODELS}")
+
+    pair_counts = get_pair_counts(winner_codes, loser_codes, system_count)
+    if prior:
+        pair_counts = add_prior(*pair_counts, system_count, prior)
+        # the phantom is the reference system with a fixed strength of zero
+        parameter_count = system_count + 1
+    else:
+        if not is_strongly_connected(*pair_counts, system_count):
+            raise ValueError(
+                "The comparison graph is not strongly connected, so the maximum "
+                "likelihood strengths do not exist; use a prior"
+            )
+        parameter_count = system_count
+    reference = parameter_count - 1
+    free = np.arange(parameter_count) != reference
+
+    strengths = np.zeros(parameter_count)
+    log_likelihood = get_log_likelihood(strengths, *pair_counts, model)
+    for _ in range(max_iterations):
+        score, information = get_score_and_information(strengths, *pair_counts, model)
+        step = np.zeros(parameter_count)
+        step[free] = solve_information(information[free][:, free], score[free])
+
+        # halve the step until the concave log-likelihood does not decrease
+        step_size = 1.0
+        while True:
+            candidate = strengths + step_size * step
+            candidate_log_likelihood = get_log_likelihood(candidate, *pair_counts, model)
+            if candidate_log_likelihood >= log_likelihood or step_size < 1e-8:
+                break
+            step_size /= 2
+        strengths, log_likelihood = candidate, candidate_log_likelihood
+        if np.max(np.abs(step_size * step)) < tolerance:
+            break
+
+    _, information = get_score_and_information(strengths, *pair_counts, model)
+    covariance = np.zeros((parameter_count, parameter_count))
+    covariance[np.ix_(free, free)] = np.linalg.inv(information[free][:, free].toarray())
+
+    strengths = strengths[:system_count]
+    covariance = covariance[:system_count, :system_count]
+    # covariance of s - mean(s): diag(C) - 2 * row means + grand mean
+    variances = (
+        np.diag(covariance) - 2 * covariance.mean(axis=1) + covariance.mean()
+    )
+    return strengths - strengths.mean(), np.sqrt(np.maximum(variances, 0))
+
+
+def get_pairwise_strengths(systems, winner_codes, loser_codes, models=MODELS, prior=0.0):
+    """
+    :return: dataframe with the strength and standard error of every system
+        under every model
+    """
+    strengths_df = pd.DataFrame({"system": systems})
+    for model in models:
+        strengths, standard_errors = fit_pairwise_model(
+            winner_codes, loser_codes, len(systems), model, prior
+        )
+        strengths_df[f"{model}_strength"] = strengths
+        strengths_df[f"{model}_se"] = standard_errors
+    return strengths_df
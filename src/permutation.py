@@ -0,0 +1,151 @@
+"""Permutation test of the per-item system scores, without normality assumptions.
+
+Under the null hypothesis the systems are exchangeable within an item, so a
+permutation shuffles the scores of every item (row of get_task_scores) across
+the systems. Every system is scored on the same items, so the column sums carry
+all the information: the omnibus statistic is the sum of squared column sums
+(monotone in the one-way F, since the grand total and the total sum of squares
+do not change under the shuffle) and a pairwise difference is the difference of
+two column sums. Both are exact integers, so ties with the observed values are
+counted exactly.
+
+Pairwise p-values are corrected with the single-step max-T procedure
+(Westfall & Young): a pair is compared against the largest absolute pairwise
+difference of each permutation, which controls the family-wise error rate and
+keeps the correlation between the pairs. Permutations run in batches sized to
+a fixed element budget, each batch with its own child of one SeedSequence, so
+memory does not grow with the number of permutations and the results only
+depend on the seed and batch size, not on the number of workers.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# largest permutations x items x systems (or permutations x pairs) block held
+# in memory by one batch
+MAX_BATCH_ELEMENTS = 2**22
+
+
+def get_pair_indices(system_count):
+    """
+    :return: (first system index, second system index) of every pair, in
+        itertools.combinations order
+    """
+    return np.triu_indices(system_count, k=1)
+
+
+def get_permutation_statistics(column_sums, pair_indices):
+    """
+    :param column_sums: ... x systems array of column sums
+    :return: (omnibus statistic, absolute pairwise differences)
+    """
+    omnibus = (column_sums**2).sum(axis=-1)
+    pair_differences = np.abs(column_sums[..., pair_indices[1]] - column_sums[..., pair_indices[0]])
+    return omnibus, pair_differences
+
+
+def permutation_batch(scores, observed_omnibus, observed_differences, permutation_count,
+                      seed_sequence):
+    """
+    :return: (number of permutations with an omnibus statistic at least the
+        observed one, per-pair number with an absolute difference at least the
+        observed one, per-pair number with a maximum absolute difference at
+        least the observed one)
+    """
+    rng = np.random.default_rng(seed_sequence)
+    item_count, system_count = scores.shape
+    pair_indices = get_pair_indices(system_count)
+
+    # independent random order of the systems within every item and permutation
+    permuted_scores = rng.permuted(
+        np.broadcast_to(scores, (permutation_count, item_count, system_count)), axis=2
+    )
+    column_sums = permuted_scores.sum(axis=1)
+    del permuted_scores
+
+    omnibus, pair_differences = get_permutation_statistics(column_sums, pair_indices)
+    omnibus_count = np.count_nonzero(omnibus >= observed_omnibus)
+    pair_counts = (pair_differences >= observed_differences).sum(axis=0)
+    max_differences = pair_differences.max(axis=1, initial=0)
+    max_counts = (max_differences[:, None] >= observed_differences).sum(axis=0)
+    return omnibus_count, pair_counts, max_counts
+
+
+def permutation_test(scores, permutation_count=10000, seed=0, batch_size=None,
+                     max_workers=None, mp_context=None):
+    """
+    :param scores: items x systems integer array, see get_task_scores
+    :param batch_size: permutations per batch, by default as many as fit in
+        MAX_BATCH_ELEMENTS
+    :param mp_context: multiprocessing context of the worker processes, the
+        platform default if None
+    :return: (omnibus p-value, pairwise p-values, max-T adjusted pairwise
+        p-values), pairs in get_pair_indices order
+    """
+    scores = np.asarray(scores, dtype=np.int64)
+    item_count, system_count = scores.shape
+    pair_indices = get_pair_indices(system_count)
+    observed_omnibus, observed_differences = get_permutation_statistics(
+        scores.sum(axis=0), pair_indices
+    )
+
+    if batch_size is None:
+        batch_elements = max(1, item_count * system_count, len(observed_differences))
+        batch_size = max(1, MAX_BATCH_ELEMENTS // batch_elements)
+    batch_sizes = [batch_size] * (permutation_count // batch_size)
+    if permutation_count % batch_size:
+        batch_sizes.append(permutation_count % batch_size)
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+    batch_arguments = [
+        (scores, observed_omnibus, observed_differences, size, seed_sequence)
+        for size, seed_sequence in zip(batch_sizes, seed_sequences)
+    ]
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(batch_arguments))
+    omnibus_count = 0
+    pair_counts = np.zeros(len(observed_differences), dtype=np.int64)
+    max_counts = np.zeros(len(observed_differences), dtype=np.int64)
+    if max_workers <= 1:
+        batch_results = (permutation_batch(*arguments) for arguments in batch_arguments)
+    else:
+        executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context)
+        batch_results = executor.map(permutation_batch, *zip(*batch_arguments))
+    try:
+        # only the counts are kept, so memory does not grow with the batches
+        for batch_omnibus_count, batch_pair_counts, batch_max_counts in batch_results:
+            omnibus_count += batch_omnibus_count
+            pair_counts += batch_pair_counts
+            max_counts += batch_max_counts
+    finally:
+        if max_workers > 1:
+            executor.shutdown()
+
+    # the observed assignment counts as one of the permutations
+    omnibus_p = (omnibus_count + 1) / (permutation_count + 1)
+    pair_p = (pair_counts + 1) / (permutation_count + 1)
+    pair_p_adjusted = (max_counts + 1) / (permutation_count + 1)
+    return omnibus_p, pair_p, pair_p_adjusted
+
+
+def get_permutation_test_table(scores_df, pair_p, pair_p_adjusted, alpha=0.05):
+    """
+    :param scores_df: items x systems scores the test ran on
+    :return: pairwise dataframe laid out like the Tukey HSD summary
+    """
+    systems = list(scores_df.columns)
+    system_means = scores_df.mean(axis=0).to_numpy()
+    first, second = get_pair_indices(len(systems))
+    return pd.DataFrame(
+        {
+            "group1": [systems[i] for i in first],
+            "group2": [systems[j] for j in second],
+            "meandiff": system_means[second] - system_means[first],
+            "p": pair_p,
+            "p-adj": pair_p_adjusted,
+            "reject": pair_p_adjusted < alpha,
+        }
+    )
+
@@ -0,0 +1,261 @@
+"""Run the analysis reports and the downstream scripts as a dependency graph.
+
+Every stage declares the stages it needs; a stage starts as soon as all of
+them have finished, so independent reports run concurrently on a thread pool
+and share the processed comparison table in memory instead of each loading
+or copying it. The total run time then approaches that of the slowest chain
+of dependent stages. The wall time of every stage is printed at the end; a
+failed stage is reported and only the stages depending on it are skipped.
+
+    python src/pipeline.py                       # all stages
+    python src/pipeline.py --stages correlations # one stage and what it needs
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+import analyze_responses
+import quantified_reproducibility
+import session_timing
+import statistical_power_analysis
+from artifact_cache import ArtifactCache
+
+REPRODUCIBILITY_SYSTEM_ORDER = {"vae": 0, "sep_ae": 1, "lbow": 2, "dips": 3}
+
+# the stages start their process pools from pool threads; forking a
+# multi-threaded process can copy a lock held by another thread and deadlock
+# the child, so the workers are spawned as fresh interpreters instead
+PROCESS_POOL_CONTEXT = multiprocessing.get_context("spawn")
+
+
+def load_processed_responses(cache):
+    return analyze_responses.load_and_preprocess_responses(
+        return_attention_check_report=True, cache=cache
+    )
+
+
+def load_result_tables():
+    return (
+        pd.read_csv("results/original/results.csv"),
+        pd.read_csv("results/lab1/tables/results.csv"),
+    )
+
+
+def get_session_timings():
+    timings_df = session_timing.get_session_timings()
+    session_timing.write_session_timings(timings_df)
+    return timings_df
+
+
+def build_figures(timings_df):
+    """
+    Build the stale figures the way plot_results.py does, in Agg worker
+    processes and skipping the figures recorded as up to date in its manifest.
+    """
+    import plot_results
+
+    capped_df, _ = session_timing.cap_timings(timings_df, session_timing.TIME_SPENT_CAP_LEVELS)
+    session_timing.write_time_spent_quantiles(
+        capped_df.quantile(session_timing.TIME_SPENT_QUANTILE_LEVELS)
+    )
+    status = plot_results.build_figures(
+        plot_results.get_figures(timings_df), mp_context=PROCESS_POOL_CONTEXT
+    )
+    failed = {name: error for name, error in status.items() if error not in ("built", "skipped")}
+    if failed:
+        raise RuntimeError(f"Figures failed: {failed}")
+    return status
+
+
+def get_stages(cache=None):
+    """
+    :param cache: ArtifactCache shared by every stage; stages run concurrently
+        on the thread pool, so it has to be safe to share between threads
+    :return: dict of stage name to (function, names of the stages it needs);
+        the function gets the results of those stages as positional arguments
+    """
+    return {
+        "processed": (lambda: load_processed_responses(cache), []),
+        "attention_checks": (
+            lambda processed: analyze_responses.report_attention_checks(processed[1]),
+            ["processed"],
+        ),
+        "datasets_used": (
+            lambda processed: analyze_responses.report_datasets_used(processed[0]),
+            ["processed"],
+        ),
+        "significant_testing": (
+            lambda processed: analyze_responses.report_significant_testing(
+                processed[0], permutation_count=10000, mp_context=PROCESS_POOL_CONTEXT
+            ),
+            ["processed"],
+        ),
+        "metrics": (
+            lambda processed: analyze_responses.report_metrics(
+                processed[0], resample_count=10000, cache=cache,
+                mp_context=PROCESS_POOL_CONTEXT,
+            ),
+            ["processed"],
+        ),
+        "pairwise_ranking": (
+            lambda processed: analyze_responses.report_pairwise_ranking(processed[0]),
+            ["processed"],
+        ),
+        "fleiss_kappa": (
+            lambda processed: analyze_responses.report_fleiss_kappa(processed[0]),
+            ["processed"],
+        ),
+        "krippendorff_alpha": (
+            lambda processed: analyze_responses.report_krippendorff_alpha(processed[0]),
+            ["processed"],
+        ),
+        "rater_influence": (
+            lambda processed: analyze_responses.report_rater_influence(processed[0]),
+            ["processed"],
+        ),
+        "power": (
+            lambda processed: statistical_power_analysis.report_power_analysis(
+                processed[0], cache
+            ),
+            ["processed"],
+        ),
+        "result_tables": (lambda metrics: load_result_tables(), ["metrics"]),
+        "resampled_scales": (
+            lambda processed: quantified_reproducibility.get_resampled_scales(
+                processed[0], mp_context=PROCESS_POOL_CONTEXT
+            ),
+            ["processed"],
+        ),
+        "correlations": (
+            lambda result_tables, resampled_scales: (
+                quantified_reproducibility.calculate_pearson_spearman_correlation(
+                    *result_tables,
+                    REPRODUCIBILITY_SYSTEM_ORDER,
+                    resampled_scales=resampled_scales,
+                )
+            ),
+            ["result_tables", "resampled_scales"],
+        ),
+        "cv": (
+            lambda result_tables: quantified_reproducibility.calculate_coefficient_of_variation(
+                *result_tables, -100, 100, REPRODUCIBILITY_SYSTEM_ORDER
+            ),
+            ["result_tables"],
+        ),
+        "session_timings": (lambda: get_session_timings(), []),
+        # one stage for all figures, they share the manifest of plot_results;
+        # the reproduction results figure reads the table written by metrics
+        "figures": (lambda timings, metrics: build_figures(timings), ["session_timings", "metrics"]),
+    }
+
+
+def select_stages(stages, names):
+    """
+    :return: the named stages and everything they (transitively) need
+    """
+    selected = {}
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name not in stages:
+            raise ValueError(f"Unknown stage {name}, expected one of {list(stages)}")
+        if name not in selected:
+            selected[name] = stages[name]
+            pending.extend(stages[name][1])
+    return {name: stage for name, stage in stages.items() if name in selected}
+
+
+def run_stages(stages, max_workers=None):
+    """
+    Run every stage once all the stages it needs have succeeded.
+    :return: (dict of stage name to result, timing dataframe with the start,
+        end and wall time in seconds and the status of every stage)
+    """
+    results = {}
+    timings = {}
+    status = {}
+    run_start = time.perf_counter()
+
+    def run_stage(name):
+        function, dependencies = stages[name]
+        start = time.perf_counter()
+        try:
+            return function(*(results[dependency] for dependency in dependencies))
+        finally:
+            timings[name] = (start - run_start, time.perf_counter() - run_start)
+
+    max_workers = max_workers or min(len(stages), (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while len(status) < len(stages):
+            settled_count = len(status)
+            for name, (_, dependencies) in stages.items():
+                if name in status or name in running.values():
+                    continue
+                if any(status.get(dependency) in ("failed", "skipped") for dependency in dependencies):
+                    status[name] = "skipped"
+                elif all(status.get(dependency) == "done" for dependency in dependencies):
+                    running[executor.submit(run_stage, name)] = name
+            if not running:
+                if len(status) == settled_count:
+                    raise ValueError("The stages have a dependency cycle")
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                    status[name] = "done"
+                except Exception as error:
+                    print(f"Stage {name} failed: {error!r}")
+                    status[name] = "failed"
+
+    timing_df = pd.DataFrame(
+        [
+            {
+                "stage": name,
+                "status": status[name],
+                "start": timings.get(name, (float("nan"),) * 2)[0],
+                "end": timings.get(name, (float("nan"),) * 2)[1],
+            }
+            for name in stages
+        ]
+    )
+    timing_df["seconds"] = timing_df["end"] - timing_df["start"]
+    return results, timing_df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the analysis pipeline")
+    parser.add_argument("--stages", nargs="+", help="stages to run, with the stages they need")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-cache", action="store_true", help="do not use the artifact cache")
+    parser.add_argument("--list", action="store_true", help="list the stages and exit")
+    args = parser.parse_args()
+
+    stages = get_stages(None if args.no_cache else ArtifactCache())
+    if args.list:
+        for name, (_, dependencies) in stages.items():
+            print(f"{name}: {', '.join(dependencies) or '-'}")
+        return
+    if args.stages:
+        stages = select_stages(stages, args.stages)
+
+    start = time.perf_counter()
+    _, timing_df = run_stages(stages, args.workers)
+    print("\nStage timings")
+    print("=============")
+    print(timing_df.to_string(index=False, float_format="%.2f"))
+    print(f"Total: {time.perf_counter() - start:.2f} s")
+    if (timing_df["status"] != "done").any():
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,61 @@
+"""Figures of the reproduction results and of the time spent on the study pages.
+
+Every figure is built in its own worker process with the non-interactive Agg
+backend and saved as PDF and PNG. A figure is only rebuilt when the hash of
+its input data, its plotting parameters or this module changed since the last
+build (recorded in .cache/figures/manifest.json), or when its files are missing.
+
+    python src/plot_results.py                          # build the stale figures
+    python src/plot_results.py --force --workers 1      # rebuild all, serially
+    python src/plot_results.py --system-name hrq=HRQ-VAE
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
-import ast
-from datetime import datetime
-
 
-def plot_relative_preference():
-    reproduction_results_df = pd.read_csv("results/lab1/tables/results.csv")
-    hosking_results_df = pd.read_csv("results/original/results.csv")
+from artifact_cache import ArtifactCache
+from session_timing import (
+    TIME_SPENT_CAP_LEVELS,
+    TIME_SPENT_QUANTILE_LEVELS,
+    cap_timings,
+    get_session_timings,
+    write_session_timings,
+    write_time_spent_quantiles,
+)
+
+FIGURES_DIR = "results/lab1/figures"
+FIGURE_FORMATS = ["pdf", "png"]
+FIGURE_MANIFEST_PATH = ".cache/figures/manifest.json"
+RESULTS_PATHS = {
+    "Ours": "results/lab1/tables/results.csv",
+    "Orig": "results/original/results.csv",
+}
+
+# legend name of every system; systems missing here are shown by their abbreviation
+SYSTEM_NAMES = {
+    "vae": "VAE",
+    "sep_ae": "Separator",
+    "lbow": "Latent BoW",
+    "dips": "DiPS",
+}
+
+
+def save_figure(name):
+    for figure_format in FIGURE_FORMATS:
+        plt.savefig(os.path.join(FIGURES_DIR, f"{name}.{figure_format}"))
+    plt.close("all")
+
+
+def plot_relative_preference(system_names=None):
+    system_names = {**SYSTEM_NAMES, **(system_names or {})}
+    reproduction_results_df = pd.read_csv(RESULTS_PATHS["Ours"])
+    hosking_results_df = pd.read_csv(RESULTS_PATHS["Orig"])
     reproduction_results_df["From"] = "Ours"
     hosking_results_df["From"] = "Orig"
 
@@ -16,15 +64,8 @@ def plot_relative_preference():
     stacked_df["best_worst_scale"] = stacked_df["best_worst_scale"].apply(
         lambda x: round(x, 2))
 
-    system_abbreviations_to_full = {
-        "vae": "VAE",
-        "lbow": "Latent BoW",
-        "sep_ae": "Separator",
-        "hrq": "HRQ-VAE",
-    }
-
     stacked_df["system"] = stacked_df["system"].apply(
-        lambda x: system_abbreviations_to_full[x])
+        lambda x: system_names.get(x, x))
 
     fig, ax = plt.subplots(1, 1, figsize=(8, 6))
 
@@ -42,48 +83,13 @@ def plot_relative_preference():
     for i in ax.containers:
         ax.bar_label(i, )
 
-    plt.savefig("results/lab1/figures/reproduction_results.pdf")
-    plt.savefig("results/lab1/figures/reproduction_results.png")
-    plt.clf()
-
-
-def plot_time_spent_on_pages():
-    response_df = pd.read_csv("responses/responses.csv")
-
-    def parse_time(time_str):
-        date_part = time_str.split('GMT')[0].strip()
-        return datetime.strptime(date_part, '%a %b %d %Y %H:%M:%S')
-
-    steps = response_df["steps"].apply(lambda x: ast.literal_eval(x))
-
-    welcome_page = steps.apply(lambda x: parse_time(x["welcome_page"]))
-    instructions_page = steps.apply(lambda x: parse_time(x["instructions_page"]))
-    task_page = steps.apply(lambda x: parse_time(x["task_page"]))
-    finished_page = steps.apply(lambda x: parse_time(x["finished_page"]))
-
-    time_spent_on_welcome = (instructions_page - welcome_page).dt.total_seconds()
-    time_spent_on_instructions = (task_page - instructions_page).dt.total_seconds()
-    time_spent_on_task = (finished_page - task_page).dt.total_seconds()
-
-    time_spent_welcome_cap = time_spent_on_welcome.quantile(0.95)
-
-    time_spent_on_welcome.loc[
-        time_spent_on_welcome > time_spent_welcome_cap] = time_spent_welcome_cap
-
-    time_spent_instructions_cap = time_spent_on_instructions.quantile(0.99)
-    time_spent_on_instructions.loc[
-        time_spent_on_instructions > time_spent_instructions_cap] = time_spent_instructions_cap
-
-    time_spent_task_cap = time_spent_on_task.quantile(0.99)
-    time_spent_on_task.loc[
-        time_spent_on_task > time_spent_task_cap] = time_spent_task_cap
+    save_figure("reproduction_results")
 
-    with open("results/lab1/time_spent_on_pages.txt", "w") as f:
-        for i in range(10):
-            f.write(f"Welcome Page {0.1* i} quantile: {time_spent_on_welcome.quantile(0.1 * i):.2f}\n")
-            f.write(f"Instructions Page {0.1* i} quantile: {time_spent_on_instructions.quantile(0.1 * i):.2f}\n")
-            f.write(f"Task Page {0.1* i} quantile: {time_spent_on_task.quantile(0.1 * i):.2f}\n")
 
+def plot_time_spent_hist(timings_df, caps):
+    time_spent_on_welcome = timings_df["welcome"]
+    time_spent_on_instructions = timings_df["instructions"]
+    time_spent_on_task = timings_df["task"]
 
     # plot histogram of time spent on each page using sns.histplot
     fig, axes = plt.subplots(3, 1, figsize=(4, 9))
@@ -91,24 +97,23 @@ def plot_time_spent_on_pages():
     sns.histplot(time_spent_on_instructions, ax=axes[1], kde=True, stat='count', color='blue')
     sns.histplot(time_spent_on_task, ax=axes[2], kde=True, stat='count', color='blue')
 
-    axes[0].set_title(f"Welcome Page (cap: {time_spent_welcome_cap:.2f})")
-    axes[1].set_title(f"Instructions Page (cap: {time_spent_instructions_cap:.2f})")
-    axes[2].set_title(f"Task Page (cap: {time_spent_task_cap:.2f})")
+    axes[0].set_title(f"Welcome Page (cap: {caps['welcome']:.2f})")
+    axes[1].set_title(f"Instructions Page (cap: {caps['instructions']:.2f})")
+    axes[2].set_title(f"Task Page (cap: {caps['task']:.2f})")
 
     axes[0].set_xlabel('Time spent (seconds)')
     axes[1].set_xlabel('Time spent (seconds)')
     axes[2].set_xlabel('Time spent (seconds)')
 
     plt.tight_layout()
-    plt.savefig("results/lab1/figures/time_spent_on_pages_hist.pdf")
-    plt.savefig("results/lab1/figures/time_spent_on_pages_hist.png")
+    save_figure("time_spent_on_pages_hist")
 
-    plt.clf()
 
+def plot_time_spent_box(timings_df):
     time_df = pd.DataFrame({
-        "Consent": time_spent_on_welcome,
-        "Instructions": time_spent_on_instructions,
-        "Task": time_spent_on_task
+        "Consent": timings_df["welcome"],
+        "Instructions": timings_df["instructions"],
+        "Task": timings_df["task"]
     })
 
     # plot boxplot of time spent on each page using sns.boxplot
@@ -116,10 +121,13 @@ def plot_time_spent_on_pages():
     ax = sns.boxplot(data=time_df)
     ax.set_title("Time spent on each page")
     plt.tight_layout()
-    plt.savefig("results/lab1/figures/time_spent_on_pages_box.pdf")
-    plt.savefig("results/lab1/figures/time_spent_on_pages_box.png")
+    save_figure("time_spent_on_pages_box")
 
-    plt.clf()
+
+def plot_time_spent_ecdf(timings_df):
+    time_spent_on_welcome = timings_df["welcome"]
+    time_spent_on_instructions = timings_df["instructions"]
+    time_spent_on_task = timings_df["task"]
 
     fig, axes = plt.subplots(3, 1, figsize=(4, 9))
 
@@ -140,17 +148,147 @@ def plot_time_spent_on_pages():
     # axes[2].set_ylabel('Cumulative Probability')
 
     plt.tight_layout()
-    plt.savefig("results/lab1/figures/time_spent_on_pages_ecdf.pdf")
-    plt.savefig("results/lab1/figures/time_spent_on_pages_ecdf.png")
-    plt.clf()
+    save_figure("time_spent_on_pages_ecdf")
+
+
+def get_figures(timings_df, system_names=None):
+    """
+    :param timings_df: uncapped session timings
+    :return: dict of figure name to (plot function, its arguments, the
+        inputs of its key: input files, parameters and dataframes)
+    """
+    system_names = {**SYSTEM_NAMES, **(system_names or {})}
+    capped_df, caps = cap_timings(timings_df, TIME_SPENT_CAP_LEVELS)
+    time_spent_key = {"parameters": TIME_SPENT_CAP_LEVELS, "frames": [capped_df]}
+    return {
+        "time_spent_on_pages_hist": (
+            plot_time_spent_hist, (capped_df, caps.to_dict()), time_spent_key
+        ),
+        "time_spent_on_pages_box": (plot_time_spent_box, (capped_df,), time_spent_key),
+        "time_spent_on_pages_ecdf": (plot_time_spent_ecdf, (capped_df,), time_spent_key),
+        "reproduction_results": (
+            plot_relative_preference,
+            (system_names,),
+            {"inputs": list(RESULTS_PATHS.values()), "parameters": system_names},
+        ),
+    }
 
 
-def main():
-    plot_time_spent_on_pages()
+def load_figure_manifest(manifest_path=FIGURE_MANIFEST_PATH):
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-    plot_relative_preference()
 
+def save_figure_manifest(manifest, manifest_path=FIGURE_MANIFEST_PATH):
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + ".tmp", manifest_path)
 
-if __name__ == '__main__':
+
+def is_figure_built(name, key, manifest):
+    return manifest.get(name) == key and all(
+        os.path.exists(os.path.join(FIGURES_DIR, f"{name}.{figure_format}"))
+        for figure_format in FIGURE_FORMATS
+    )
+
+
+def init_figure_worker():
+    plt.switch_backend("Agg")
     sns.set_theme(style="darkgrid")
+
+
+def render_figure(plot_function, arguments):
+    """
+    :return: None on success, else the error, so one failed figure does not stop the others
+    """
+    try:
+        plot_function(*arguments)
+    except Exception as error:
+        plt.close("all")
+        return repr(error)
+    return None
+
+
+def build_figures(figures, force=False, max_workers=None, manifest_path=FIGURE_MANIFEST_PATH,
+                  mp_context=None):
+    """
+    Render the figures whose key changed since the last build, each in its own
+    worker process, so pyplot never runs in the caller (which may be a thread
+    of the pipeline).
+    :param figures: see get_figures
+    :param mp_context: multiprocessing context of the worker processes, the
+        platform default if None
+    :return: dict of figure name to "built", "skipped" or the error it failed with
+    """
+    os.makedirs(FIGURES_DIR, exist_ok=True)
+    cache = ArtifactCache()
+    manifest = load_figure_manifest(manifest_path)
+    keys = {
+        name: cache.get_key(f"figure_{name}", code=[__file__], **key_inputs)
+        for name, (_, _, key_inputs) in figures.items()
+    }
+    stale = [
+        name for name in figures if force or not is_figure_built(name, keys[name], manifest)
+    ]
+    status = {name: "skipped" for name in figures if name not in stale}
+
+    errors = {}
+    if stale:
+        max_workers = min(max_workers or os.cpu_count() or 1, len(stale))
+        with ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=mp_context, initializer=init_figure_worker
+        ) as executor:
+            futures = {name: executor.submit(render_figure, *figures[name][:2]) for name in stale}
+            errors = {name: future.result() for name, future in futures.items()}
+
+    for name, error in errors.items():
+        if error is None:
+            manifest[name] = keys[name]
+            status[name] = "built"
+        else:
+            manifest.pop(name, None)
+            status[name] = error
+    save_figure_manifest(manifest, manifest_path)
+    return status
+
+
+def parse_system_names(values):
+    """
+    :param values: "abbreviation=Name" strings
+    """
+    system_names = {}
+    for value in values or []:
+        abbreviation, separator, name = value.partition("=")
+        if not separator:
+            raise ValueError(f"Expected abbreviation=Name, got {value}")
+        system_names[abbreviation] = name
+    return system_names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the figures of the results")
+    parser.add_argument("--force", action="store_true", help="rebuild the up to date figures too")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--system-name", action="append", metavar="ABBREVIATION=NAME",
+                        help="legend name of a system, may be repeated")
+    args = parser.parse_args()
+
+    timings_df = get_session_timings()
+    write_session_timings(timings_df)
+    capped_df, _ = cap_timings(timings_df, TIME_SPENT_CAP_LEVELS)
+    write_time_spent_quantiles(capped_df.quantile(TIME_SPENT_QUANTILE_LEVELS))
+
+    figures = get_figures(timings_df, parse_system_names(args.system_name))
+    status = build_figures(figures, args.force, args.workers)
+    for name, figure_status in status.items():
+        print(f"{name}: {figure_status}")
+    if any(figure_status not in ("built", "skipped") for figure_status in status.values()):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
     main()
@@ -0,0 +1,156 @@
+"""Vectorized power and sample size of the one-way ANOVA F test.
+
+Power is evaluated with the noncentral F distribution over the full grid of
+(groups, effect size, alpha, sample size) in one broadcast call, with the
+conventions of statsmodels' FTestAnovaPower: the effect size is Cohen's f,
+the sample size is the total number of observations over all groups, the
+noncentrality is f^2 * nobs and the degrees of freedom are (k - 1, nobs - k).
+Required sample sizes are solved for all design points at once by bisection.
+Grids are memoized on disk, keyed by a hash of their inputs. This replaces
+power_analysis.r:
+
+    python src/power_grid.py --groups 4 --nobs-per-group 200 --effect-sizes 0.1 0.25 0.4
+"""
+
+import argparse
+import hashlib
+import os
+
+import numpy as np
+from scipy import stats
+
+POWER_GRID_CACHE_DIR = ".cache/power_grid"
+
+
+def get_power(effect_size, nobs, alpha, k_groups):
+    """
+    Power of the F test, broadcast over all arguments.
+    :param effect_size: Cohen's f
+    :param nobs: total number of observations
+    """
+    effect_size, nobs, alpha, k_groups = np.broadcast_arrays(
+        *(np.asarray(value, dtype=float) for value in (effect_size, nobs, alpha, k_groups))
+    )
+    df_num = k_groups - 1
+    df_denom = nobs - k_groups
+    with np.errstate(invalid="ignore"):
+        critical_value = stats.f.isf(alpha, df_num, df_denom)
+        power = stats.ncf.sf(critical_value, df_num, df_denom, effect_size**2 * nobs)
+    return np.where(df_denom > 0, power, np.nan)
+
+
+def get_sample_size(effect_size, alpha, k_groups, power=0.8, tolerance=1e-8, max_nobs=1e9):
+    """
+    Total number of observations reaching the given power, broadcast over all
+    arguments, by vectorized bisection on the (increasing) power curve.
+    :return: continuous sample sizes, as FTestAnovaPower.solve_power; NaN
+        where even max_nobs does not reach the power
+    """
+    effect_size, alpha, k_groups, power = np.broadcast_arrays(
+        *(np.asarray(value, dtype=float) for value in (effect_size, alpha, k_groups, power))
+    )
+    lower = k_groups + 1
+    upper = np.maximum(2 * lower, 10.0)
+    # grow the upper bound until it reaches the power everywhere it can
+    while True:
+        is_short = (get_power(effect_size, upper, alpha, k_groups) < power) & (upper < max_nobs)
+        if not is_short.any():
+            break
+        upper = np.where(is_short, np.minimum(upper * 4, max_nobs), upper)
+    is_reachable = get_power(effect_size, upper, alpha, k_groups) >= power
+
+    while np.any((upper - lower)[is_reachable] > tolerance * upper[is_reachable]):
+        middle = (lower + upper) / 2
+        is_enough = get_power(effect_size, middle, alpha, k_groups) >= power
+        upper = np.where(is_enough, middle, upper)
+        lower = np.where(is_enough, lower, middle)
+    return np.where(is_reachable, upper, np.nan)
+
+
+def get_cache_path(cache_dir, name, *arrays):
+    digest = hashlib.sha256(name.encode())
+    for array in arrays:
+        array = np.ascontiguousarray(array, dtype=float)
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    return os.path.join(cache_dir, f"{name}_{digest.hexdigest()[:32]}.npy")
+
+
+def memoize_grid(cache_dir, name, compute, *arrays):
+    if cache_dir is None:
+        return compute()
+    cache_path = get_cache_path(cache_dir, name, *arrays)
+    if os.path.exists(cache_path):
+        return np.load(cache_path)
+    result = compute()
+    os.makedirs(cache_dir, exist_ok=True)
+    # write to a temporary file first so a reader never sees a partial grid
+    temporary_path = cache_path + ".tmp.npy"
+    np.save(temporary_path, result)
+    os.replace(temporary_path, cache_path)
+    return result
+
+
+def get_power_grid(k_groups, effect_sizes, alphas, nobs, cache_dir=POWER_GRID_CACHE_DIR):
+    """
+    :return: groups x effect sizes x alphas x nobs array of power
+    """
+    k_groups, effect_sizes, alphas, nobs = (
+        np.atleast_1d(np.asarray(value, dtype=float))
+        for value in (k_groups, effect_sizes, alphas, nobs)
+    )
+    return memoize_grid(
+        cache_dir,
+        "power",
+        lambda: get_power(
+            effect_sizes[None, :, None, None],
+            nobs[None, None, None, :],
+            alphas[None, None, :, None],
+            k_groups[:, None, None, None],
+        ),
+        k_groups, effect_sizes, alphas, nobs,
+    )
+
+
+def get_sample_size_grid(k_groups, effect_sizes, alphas, powers=(0.8,),
+                         cache_dir=POWER_GRID_CACHE_DIR):
+    """
+    :return: groups x effect sizes x alphas x powers array of required total
+        sample sizes
+    """
+    k_groups, effect_sizes, alphas, powers = (
+        np.atleast_1d(np.asarray(value, dtype=float))
+        for value in (k_groups, effect_sizes, alphas, powers)
+    )
+    return memoize_grid(
+        cache_dir,
+        "sample_size",
+        lambda: get_sample_size(
+            effect_sizes[None, :, None, None],
+            alphas[None, None, :, None],
+            k_groups[:, None, None, None],
+            powers[None, None, None, :],
+        ),
+        k_groups, effect_sizes, alphas, powers,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Power of the one-way ANOVA F test")
+    parser.add_argument("--groups", type=int, default=4)
+    parser.add_argument("--nobs-per-group", type=int, default=200)
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--effect-sizes", type=float, nargs="+", default=[0.1, 0.25, 0.4])
+    parser.add_argument("--cache-dir", default=POWER_GRID_CACHE_DIR)
+    args = parser.parse_args()
+
+    power = get_power_grid(
+        args.groups, args.effect_sizes, args.alpha, args.groups * args.nobs_per_group,
+        args.cache_dir,
+    )
+    for effect_size, effect_power in zip(args.effect_sizes, power[0, :, 0, 0]):
+        print(f"Effect size (f): {effect_size:.2f}, power approx (lower bound): {effect_power:.3f}")
+
+
+if __name__ == "__main__":
+    main()
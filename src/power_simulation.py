@@ -0,0 +1,303 @@
+"""Monte-Carlo power of the paired-comparison study design.
+
+The analytic ANOVA power assumes independent normal groups; our study instead
+has HITs of 32 slots: every pair of systems on --items-per-hit items drawn
+from a shared pool, in random order and orientation, plus a distractor and an
+inputs attention check. This module generates synthetic HITs with exactly
+that slot structure (the wide responses.csv layout) under a Bradley-Terry
+strength model, runs them through the real analysis path
+(preprocess_responses_df, get_task_scores and the within-item permutation
+test, or the one-way ANOVA) and reports the share of significant replicates
+for every participant count. The slots of a whole batch of replicates are generated in
+one vectorized pass; batches run over a process pool, each with its own child
+of one SeedSequence, so results only depend on the seed and batch size.
+
+    python src/power_simulation.py --participants 20 40 80 123 --replicates 10000
+"""
+
+import argparse
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import special, stats
+
+from analyze_responses import (
+    SYSTEM_ORDER,
+    encode_comparisons,
+    get_task_scores,
+    load_and_preprocess_responses,
+    preprocess_responses_df,
+)
+from pairwise_ranking import fit_pairwise_model
+from permutation import permutation_test
+
+CONTROL_SLOTS = [("distractor", "golds"), ("inputs", "golds")]
+SIMULATED_DATASET = "sim"
+
+
+def simulate_responses_batch(strengths, hit_count, replicate_count, rng, item_count=235,
+                             items_per_hit=5, item_sd=0.0, attention_failure_rate=0.0):
+    """
+    :param strengths: Bradley-Terry log-odds strength of every system
+    :param hit_count: HITs (one per participant) of every replicate
+    :param item_sd: standard deviation of the per item and system deviation
+        from the strengths, shared by every HIT showing the item
+    :param attention_failure_rate: probability that a participant picks the
+        distractor in the distractor check
+    :return: dict of replicates x HITs x slots arrays: systema and systemb
+        codes (into the systems followed by the control names), item index and
+        selected (True when systemb is picked)
+    """
+    system_count = len(strengths)
+    first, second = np.triu_indices(system_count, k=1)
+    pair_count = len(first)
+    comparison_slot_count = items_per_hit * pair_count
+    slot_count = comparison_slot_count + len(CONTROL_SLOTS)
+    shape = (replicate_count, hit_count)
+
+    # distinct items within a HIT, from a pool shared by all HITs of a replicate
+    hit_items = rng.random(shape + (item_count,)).argpartition(items_per_hit - 1, axis=-1)[
+        ..., :items_per_hit
+    ]
+    item_strengths = strengths + item_sd * rng.standard_normal(
+        (replicate_count, item_count, system_count)
+    )
+
+    items = np.repeat(hit_items, pair_count, axis=-1)
+    systema = np.broadcast_to(np.tile(first, items_per_hit), items.shape).copy()
+    systemb = np.broadcast_to(np.tile(second, items_per_hit), items.shape).copy()
+    is_swapped = rng.random(items.shape) < 0.5
+    systema, systemb = np.where(is_swapped, systemb, systema), np.where(is_swapped, systema, systemb)
+
+    replicate_index = np.arange(replicate_count)[:, None, None]
+    strength_differences = (
+        item_strengths[replicate_index, items, systema] - item_strengths[replicate_index, items, systemb]
+    )
+    selected = rng.random(items.shape) >= special.expit(strength_differences)
+
+    # control slots: systema is the control, systemb the gold reference
+    control_codes = system_count + np.arange(len(CONTROL_SLOTS) * 2).reshape(-1, 2)
+    control_systema = np.broadcast_to(control_codes[:, 0], shape + (len(CONTROL_SLOTS),))
+    control_systemb = np.broadcast_to(control_codes[:, 1], shape + (len(CONTROL_SLOTS),))
+    control_selected = np.stack(
+        [
+            # picking the distractor (systema) fails the check
+            rng.random(shape) >= attention_failure_rate,
+            rng.random(shape) < 0.5,
+        ],
+        axis=-1,
+    )
+    control_items = rng.integers(0, item_count, size=shape + (len(CONTROL_SLOTS),))
+
+    slots = {
+        "systema": np.concatenate([systema, control_systema], axis=-1),
+        "systemb": np.concatenate([systemb, control_systemb], axis=-1),
+        "item": np.concatenate([items, control_items], axis=-1),
+        "selected": np.concatenate([selected, control_selected], axis=-1),
+    }
+    # the same random slot order for every field of a HIT
+    slot_order = rng.random(shape + (slot_count,)).argsort(axis=-1)
+    return {field: np.take_along_axis(values, slot_order, axis=-1) for field, values in slots.items()}
+
+
+def get_responses_df(slots, systems):
+    """
+    :param slots: dict of HITs x slots arrays of one replicate, see simulate_responses_batch
+    :return: wide responses dataframe in the responses.csv layout
+    """
+    names = np.array(
+        list(systems) + [name for control in CONTROL_SLOTS for name in control], dtype=object
+    )
+    hit_count, slot_count = slots["systema"].shape
+    columns = {}
+    for i in range(slot_count):
+        columns[f"systema{i}"] = names[slots["systema"][:, i]]
+        columns[f"systemb{i}"] = names[slots["systemb"][:, i]]
+        columns[f"meaning{i}"] = slots["selected"][:, i]
+        columns[f"dataset{i}"] = np.full(hit_count, SIMULATED_DATASET, dtype=object)
+        columns[f"ix{i}"] = slots["item"][:, i]
+    columns["task_id"] = [str(uuid.UUID(int=i)) for i in range(hit_count)]
+    columns["prolific_pid"] = [f"sim_worker_{i}" for i in range(hit_count)]
+    return pd.DataFrame(columns)
+
+
+def get_replicate_p_value(responses_df, test="permutation", permutation_count=1000, seed=0):
+    responses_processed_df = preprocess_responses_df(responses_df)
+    scores_df, _ = get_task_scores(responses_processed_df)
+    if test == "anova":
+        return stats.f_oneway(*scores_df.to_numpy().T).pvalue
+    omnibus_p, _, _ = permutation_test(
+        scores_df.to_numpy(), permutation_count, seed=seed, max_workers=1
+    )
+    return omnibus_p
+
+
+def simulate_batch(strengths, systems, hit_count, replicate_count, seed_sequence, design):
+    """
+    :return: p-value of every replicate of the batch
+    """
+    rng = np.random.default_rng(seed_sequence)
+    test = design.get("test", "permutation")
+    permutation_count = design.get("permutation_count", 1000)
+    slots = simulate_responses_batch(
+        np.asarray(strengths, dtype=float),
+        hit_count,
+        replicate_count,
+        rng,
+        design.get("item_count", 235),
+        design.get("items_per_hit", 5),
+        design.get("item_sd", 0.0),
+        design.get("attention_failure_rate", 0.0),
+    )
+    p_values = np.empty(replicate_count)
+    for replicate in range(replicate_count):
+        responses_df = get_responses_df(
+            {field: values[replicate] for field, values in slots.items()}, systems
+        )
+        p_values[replicate] = get_replicate_p_value(
+            responses_df, test, permutation_count, seed=int(rng.integers(2**32))
+        )
+    return p_values
+
+
+def simulate_power(strengths, systems, hit_counts, replicate_count=1000, alpha=0.05, seed=0,
+                   batch_size=50, max_workers=None, **design):
+    """
+    :param strengths: Bradley-Terry log-odds strength of every system
+    :param hit_counts: participant counts (one HIT each) to evaluate
+    :param design: item_count, items_per_hit, item_sd, attention_failure_rate,
+        test ("permutation" or "anova") and permutation_count. The item
+        scores of the systems are dependent within an item, so the one-way
+        ANOVA is anti-conservative here (a size of about 0.12 at alpha 0.05
+        under equal strengths) and its power is inflated; the within-item
+        permutation test keeps its nominal size
+    :return: dataframe with the power and its Monte-Carlo standard error for
+        every participant count
+    """
+    batch_arguments = []
+    seed_sequences = iter(
+        np.random.SeedSequence(seed).spawn(len(hit_counts) * -(-replicate_count // batch_size))
+    )
+    for hit_count in hit_counts:
+        for start in range(0, replicate_count, batch_size):
+            size = min(batch_size, replicate_count - start)
+            batch_arguments.append(
+                (strengths, systems, hit_count, size, next(seed_sequences), design)
+            )
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(batch_arguments))
+    if max_workers <= 1:
+        batch_results = [simulate_batch(*arguments) for arguments in batch_arguments]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            batch_results = list(executor.map(simulate_batch, *zip(*batch_arguments)))
+
+    p_values = {}
+    for arguments, batch_p_values in zip(batch_arguments, batch_results):
+        p_values.setdefault(arguments[2], []).append(batch_p_values)
+    rows = []
+    for hit_count in hit_counts:
+        is_significant = np.concatenate(p_values[hit_count]) < alpha
+        power = is_significant.mean()
+        rows.append(
+            {
+                "participants": hit_count,
+                "replicates": len(is_significant),
+                "power": power,
+                "power_se": np.sqrt(power * (1 - power) / len(is_significant)),
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def get_required_participant_count(power_df, target_power=0.8):
+    """
+    Smallest participant count reaching the target power, linearly
+    interpolated between the simulated counts; NaN if none reaches it.
+    """
+    participants = power_df["participants"].to_numpy(dtype=float)
+    power = power_df["power"].to_numpy()
+    is_reached = power >= target_power
+    if not is_reached.any():
+        return np.nan
+    i = int(np.argmax(is_reached))
+    if i == 0:
+        return participants[0]
+    fraction = (target_power - power[i - 1]) / (power[i] - power[i - 1])
+    return participants[i - 1] + fraction * (participants[i] - participants[i - 1])
+
+
+def get_fitted_strengths(system_order=None):
+    """
+    Bradley-Terry strengths of the systems fitted on the current responses.
+    """
+    comparisons = encode_comparisons(load_and_preprocess_responses(), system_order)
+    strengths, _ = fit_pairwise_model(
+        comparisons["winner_codes"], comparisons["loser_codes"], len(comparisons["systems"])
+    )
+    return comparisons["systems"], strengths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte-Carlo power of the paired-comparison design")
+    parser.add_argument("--participants", type=int, nargs="+", default=[10, 20, 40, 80, 123])
+    parser.add_argument("--strengths", type=float, nargs="+",
+                        help="Bradley-Terry strengths in SYSTEM_ORDER, fitted on the responses by default")
+    parser.add_argument("--effect-scale", type=float, default=1.0,
+                        help="multiply the strengths, e.g. 0.25 for a quarter of the effect")
+    parser.add_argument("--replicates", type=int, default=1000)
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--target-power", type=float, default=0.8)
+    parser.add_argument("--item-count", type=int, default=235)
+    parser.add_argument("--items-per-hit", type=int, default=5)
+    parser.add_argument("--item-sd", type=float, default=0.0)
+    parser.add_argument("--attention-failure-rate", type=float, default=0.0)
+    parser.add_argument("--test", choices=["permutation", "anova"], default="permutation",
+                        help="anova is anti-conservative for the dependent item scores, see simulate_power")
+    parser.add_argument("--permutation-count", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", help="optional CSV path for the power table")
+    args = parser.parse_args()
+
+    if args.strengths:
+        if len(args.strengths) != len(SYSTEM_ORDER):
+            parser.error(
+                f"--strengths needs one strength per system of SYSTEM_ORDER {SYSTEM_ORDER}, "
+                f"got {len(args.strengths)}"
+            )
+        systems, strengths = SYSTEM_ORDER, np.array(args.strengths)
+    else:
+        systems, strengths = get_fitted_strengths()
+    strengths = args.effect_scale * np.asarray(strengths)
+    print("Strengths:", dict(zip(systems, np.round(strengths, 4).tolist())))
+
+    power_df = simulate_power(
+        strengths,
+        list(systems),
+        args.participants,
+        args.replicates,
+        args.alpha,
+        args.seed,
+        max_workers=args.workers,
+        item_count=args.item_count,
+        items_per_hit=args.items_per_hit,
+        item_sd=args.item_sd,
+        attention_failure_rate=args.attention_failure_rate,
+        test=args.test,
+        permutation_count=args.permutation_count,
+    )
+    print(power_df.to_string(index=False))
+    print(
+        f"Participants for {args.target_power} power:",
+        get_required_participant_count(power_df, args.target_power),
+    )
+    if args.output:
+        power_df.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
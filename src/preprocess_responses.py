@@ -1,8 +1,24 @@
+import argparse
 import ast
 import csv
+import json
+import os
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 
 import pandas as pd
 
+from response_store import convert_csv_to_parquet
+
+DECODE_PATHS = ["json", "literal_eval", "empty", "rejected"]
+REJECT_COLUMNS = ["row_number", "id", "session_id", "error", "json_string"]
+# a row of tasks_joined.csv is identified by its session and its task ("id")
+PROCESSED_KEY_COLUMNS = ["session_id", "id"]
+# fixed dtypes for tasks_joined.csv, so that every chunk of the streaming mode
+# writes a column the same way (e.g. "123" and not "123.0" in a chunk with a
+# missing value) and the output matches the in-memory path
+TASKS_JOINED_DTYPES = defaultdict(lambda: "str", {"task_number": "Int64"})
+
 worker_id_to_anonymized_id = {}
 
 
@@ -16,26 +32,332 @@ def generate_anonymized_id(worker_id):
     return random_string
 
 
-def parse_json_str(json_str):
-    
+def load_anonymization_registry(registry_path):
+    """
+    Restore the worker id -> anon_worker_N mapping and the keys of the rows
+    processed by previous runs, so that ids stay stable across incremental runs.
+    :return: set of (session_id, id) tuples already written to the output
+    """
+    with open(registry_path) as f:
+        registry = json.load(f)
+    worker_id_to_anonymized_id.clear()
+    worker_id_to_anonymized_id.update(registry["worker_id_to_anonymized_id"])
+    return {tuple(key) for key in registry["processed_keys"]}
+
+
+def save_anonymization_registry(registry_path, processed_keys):
+    registry = {
+        "worker_id_to_anonymized_id": worker_id_to_anonymized_id,
+        "processed_keys": sorted(processed_keys),
+    }
+    # write to a temporary file first so an interrupted run keeps the old registry
+    temporary_path = f"{registry_path}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(registry, f)
+    os.replace(temporary_path, registry_path)
+
+
+def get_row_keys(tasks_df):
+    # the key columns are read as strings (TASKS_JOINED_DTYPES), so a key is
+    # the same in every chunk and every run
+    return pd.MultiIndex.from_frame(tasks_df[PROCESSED_KEY_COLUMNS].astype(str))
+
+
+def get_reject(tasks_df, position, error):
+    task_row = tasks_df.iloc[position]
+    return {
+        "row_number": tasks_df.index[position],
+        "id": task_row.get("id"),
+        "session_id": task_row.get("session_id"),
+        "error": error,
+        "json_string": task_row["json_string"],
+    }
+
+
+def drop_processed_rows(tasks_df, processed_keys):
+    """
+    Drop the rows of tasks_df that previous runs already processed, and the
+    rows without a session_id or id, which cannot be registered.
+    :return: (remaining rows, reject records of the rows without a key)
+    """
+    is_missing_key = tasks_df[PROCESSED_KEY_COLUMNS].isna().any(axis=1).to_numpy()
+    reject_list = [
+        get_reject(tasks_df, position, f"Missing key: {'/'.join(PROCESSED_KEY_COLUMNS)}")
+        for position in is_missing_key.nonzero()[0]
+    ]
+    tasks_df = tasks_df[~is_missing_key]
+    return tasks_df[~get_row_keys(tasks_df).isin(processed_keys)], reject_list
+
+
+def prepare_incremental_run(output_path, registry_path, incremental):
+    """
+    :return: (keys of the rows already in the output, output columns to append
+        to or None if the output is written from scratch)
+    """
+    if not incremental or not os.path.exists(output_path):
+        worker_id_to_anonymized_id.clear()
+        return set(), None
+
+    if not os.path.exists(registry_path):
+        raise ValueError(
+            f"{output_path} exists but {registry_path} does not, anonymized ids of an incremental run "
+            f"would collide with the existing ones. Rerun without --incremental to rebuild both."
+        )
+    processed_keys = load_anonymization_registry(registry_path)
+    output_columns = pd.read_csv(output_path, nrows=0).columns.tolist()
+    return processed_keys, output_columns
+
+
+def decode_payload(payload_str):
+    """
+    Decode a payload string, trying the strict JSON decoder first and falling
+    back to ast.literal_eval for Python-repr payloads (True/False, single quotes).
+    :return: (decoded value, name of the decoder that succeeded)
+    """
+    try:
+        return json.loads(payload_str), "json"
+    except ValueError:
+        return ast.literal_eval(payload_str), "literal_eval"
+
+
+def decode_json_str(json_str, anonymize=True):
+    """
+    Decode one json_string cell, including its nested clicks and steps payloads.
+    :return: (response_dict, decode_path, error) where decode_path is one of
+        DECODE_PATHS and error is None unless decode_path is "rejected"
+    """
     # malformed node or string: nan
     # check if the string is empty is nan
     if pd.isna(json_str) or json_str == "nan" or json_str == "":
-        return {}
+        return {}, "empty", None
     try:
-        
-        response_dict = ast.literal_eval(json_str)
-        response_dict["clicks"] = ast.literal_eval(response_dict["clicks"])
-        response_dict["steps"] = ast.literal_eval(response_dict["steps"])
-        response_dict["prolific_pid"] = generate_anonymized_id(response_dict["prolific_pid"])
+        response_dict, decode_path = decode_payload(json_str)
+        for key in ["clicks", "steps"]:
+            if isinstance(response_dict[key], str):
+                response_dict[key], nested_decode_path = decode_payload(response_dict[key])
+                if nested_decode_path == "literal_eval":
+                    decode_path = "literal_eval"
+        if anonymize:
+            response_dict["prolific_pid"] = generate_anonymized_id(response_dict["prolific_pid"])
+        elif "prolific_pid" not in response_dict:
+            raise KeyError("prolific_pid")
 
     except Exception as e:
-        print(f"Error parsing JSON string: {json_str}, {type(json_str)}, {e}")
-        response_dict = {}
-        
+        return {}, "rejected", f"{type(e).__name__}: {e}"
+
+    return response_dict, decode_path, None
+
+
+def parse_json_str(json_str, anonymize=True):
+    response_dict, _, _ = decode_json_str(json_str, anonymize)
     return response_dict
 
 
+def parse_json_str_batch(json_str_list):
+    """
+    Decode a batch of payloads in a worker process. Anonymization is left to the
+    parent process so that anon_worker_N ids follow first-seen order in the input,
+    exactly as in a serial run, no matter how batches are scheduled.
+    """
+    return [decode_json_str(json_str, anonymize=False) for json_str in json_str_list]
+
+
+def collect_decode_results(tasks_df, decode_results, decode_path_counts):
+    """
+    Split the decode results of a chunk into the rows to write with their
+    response dicts and the reject records, adding the decode paths taken to
+    decode_path_counts. Rejected rows are not written (nor registered), so a
+    later incremental run retries them.
+    :return: (rows to write, their response dicts, reject records)
+    """
+    response_dict_list = []
+    reject_list = []
+    written_positions = []
+    for position, (response_dict, decode_path, error) in enumerate(decode_results):
+        decode_path_counts[decode_path] += 1
+        if decode_path == "rejected":
+            reject_list.append(get_reject(tasks_df, position, error))
+        else:
+            written_positions.append(position)
+            response_dict_list.append(response_dict)
+    # positions rather than a boolean list, which would select no columns
+    # instead of no rows when the chunk is empty
+    return tasks_df.iloc[written_positions], response_dict_list, reject_list
+
+
+def write_rejects(reject_list, rejects_path, append=False):
+    if not reject_list and append:
+        return
+    rejects_df = pd.DataFrame(reject_list, columns=REJECT_COLUMNS)
+    rejects_df.to_csv(
+        rejects_path,
+        mode="a" if append else "w",
+        header=not append,
+        index=False,
+        quoting=csv.QUOTE_NONNUMERIC,
+    )
+
+
+def report_decode_path_counts(decode_path_counts, rejects_path):
+    summary = ", ".join(f"{decode_path}: {decode_path_counts[decode_path]}" for decode_path in DECODE_PATHS)
+    print(f"Decoded payloads ({summary})")
+    if decode_path_counts["missing_key"]:
+        print(f"Skipped rows without a {'/'.join(PROCESSED_KEY_COLUMNS)} key: {decode_path_counts['missing_key']}")
+    if decode_path_counts["rejected"] or decode_path_counts["missing_key"]:
+        print(f"Rejected payloads written to {rejects_path}")
+
+
+def anonymize_response_dicts(response_dict_list):
+    for response_dict in response_dict_list:
+        if response_dict:
+            response_dict["prolific_pid"] = generate_anonymized_id(response_dict["prolific_pid"])
+    return response_dict_list
+
+
+def get_response_columns(response_dict_list):
+    for response_dict in response_dict_list:
+        if response_dict:
+            return list(response_dict.keys())
+    return None
+
+
+def expand_response_dicts(tasks_df, response_dict_list, response_columns, output_columns=None):
+    tasks_df = tasks_df.drop(columns=["json_string"])
+    tasks_df["response_dict"] = response_dict_list
+
+    # build every response column in one pass instead of one apply per column;
+    # object columns keep the decoded values as they are, so an int column does
+    # not turn float in a chunk with an empty payload
+    response_df = pd.DataFrame(
+        [[response_dict.get(column) for column in response_columns]
+         for response_dict in response_dict_list],
+        columns=response_columns,
+        index=tasks_df.index,
+        dtype=object,
+    )
+    overwritten_columns = [column for column in response_columns if column in tasks_df.columns]
+    tasks_df[overwritten_columns] = response_df[overwritten_columns]
+    tasks_df = pd.concat([tasks_df, response_df.drop(columns=overwritten_columns)], axis=1)
+
+    if output_columns is not None:
+        tasks_df = tasks_df.reindex(columns=output_columns)
+
+    return tasks_df
+
+
+def preprocess_tasks_joined(input_path, output_path, rejects_path, registry_path, incremental=False):
+    processed_keys, output_columns = prepare_incremental_run(output_path, registry_path, incremental)
+    appending = output_columns is not None
+
+    tasks_joined_df = pd.read_csv(input_path, dtype=TASKS_JOINED_DTYPES)
+    # tasks_results_df = pd.read_csv('responses/task_results.csv')
+    tasks_joined_df, reject_list = drop_processed_rows(tasks_joined_df, processed_keys)
+
+    decode_path_counts = Counter(missing_key=len(reject_list))
+    decode_results = parse_json_str_batch(tasks_joined_df["json_string"].tolist())
+    tasks_joined_df, response_dict_list, decode_reject_list = collect_decode_results(
+        tasks_joined_df, decode_results, decode_path_counts)
+    reject_list += decode_reject_list
+    response_dict_list = anonymize_response_dicts(response_dict_list)
+    response_columns = get_response_columns(response_dict_list) or []
+
+    # the keys come from tasks_joined.csv itself: the payload may carry its own
+    # (or, if empty, no) session_id, which expand_response_dicts writes over it
+    row_keys = get_row_keys(tasks_joined_df)
+    tasks_joined_df = expand_response_dicts(
+        tasks_joined_df, response_dict_list, response_columns, output_columns)
+
+    tasks_joined_df.to_csv(
+        output_path,
+        mode="a" if appending else "w",
+        header=not appending,
+        index=False,
+        quoting=csv.QUOTE_NONNUMERIC,
+    )
+    write_rejects(reject_list, rejects_path, append=appending)
+    save_anonymization_registry(registry_path, processed_keys | set(row_keys))
+    report_decode_path_counts(decode_path_counts, rejects_path)
+
+    return decode_path_counts
+
+
+def preprocess_tasks_joined_streaming(input_path, output_path, rejects_path, registry_path,
+                                      incremental=False, chunk_size=1000, max_workers=None):
+    """
+    Streaming variant of preprocess_tasks_joined: reads the input in chunks of
+    chunk_size rows, parses payloads on a process pool and appends each chunk to
+    the output as soon as it and all chunks before it are done. At most
+    2 * max_workers chunks are in flight, so peak memory depends on chunk_size
+    rather than on the size of the input.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending_chunks = 2 * max_workers
+
+    processed_keys, output_columns = prepare_incremental_run(output_path, registry_path, incremental)
+    header_written = output_columns is not None
+    response_columns = None
+    unwritten_chunks = []
+    new_keys = set()
+    decode_path_counts = Counter()
+    if not header_written:
+        write_rejects([], rejects_path)
+
+    def write_chunk(tasks_df, response_dict_list):
+        nonlocal header_written
+        row_keys = get_row_keys(tasks_df)
+        tasks_df = expand_response_dicts(tasks_df, response_dict_list, response_columns, output_columns)
+        tasks_df.to_csv(
+            output_path,
+            mode="a" if header_written else "w",
+            header=not header_written,
+            index=False,
+            quoting=csv.QUOTE_NONNUMERIC,
+        )
+        header_written = True
+        new_keys.update(row_keys)
+
+    def collect_chunk(tasks_df, future):
+        nonlocal response_columns
+        # chunks complete in submission order, so ids are assigned in input order
+        tasks_df, response_dict_list, reject_list = collect_decode_results(
+            tasks_df, future.result(), decode_path_counts)
+        response_dict_list = anonymize_response_dicts(response_dict_list)
+        write_rejects(reject_list, rejects_path, append=True)
+        if response_columns is None:
+            response_columns = get_response_columns(response_dict_list)
+            if response_columns is None:
+                # no valid payload seen yet, the header is still unknown
+                unwritten_chunks.append((tasks_df, response_dict_list))
+                return
+        while unwritten_chunks:
+            write_chunk(*unwritten_chunks.pop(0))
+        write_chunk(tasks_df, response_dict_list)
+
+    pending_chunks = deque()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for tasks_df in pd.read_csv(input_path, chunksize=chunk_size, dtype=TASKS_JOINED_DTYPES):
+            tasks_df, reject_list = drop_processed_rows(tasks_df, processed_keys)
+            decode_path_counts["missing_key"] += len(reject_list)
+            write_rejects(reject_list, rejects_path, append=True)
+            if tasks_df.empty:
+                continue
+            future = executor.submit(parse_json_str_batch, tasks_df["json_string"].tolist())
+            pending_chunks.append((tasks_df, future))
+            if len(pending_chunks) >= max_pending_chunks:
+                collect_chunk(*pending_chunks.popleft())
+        while pending_chunks:
+            collect_chunk(*pending_chunks.popleft())
+
+    if response_columns is None:
+        response_columns = []
+    while unwritten_chunks:
+        write_chunk(*unwritten_chunks.pop(0))
+    save_anonymization_registry(registry_path, processed_keys | new_keys)
+    report_decode_path_counts(decode_path_counts, rejects_path)
+
+    return decode_path_counts
+
+
 def get_selected_systems(meaning_i):
     if meaning_i is False:
         value = 0
@@ -48,19 +370,31 @@ def get_selected_systems(meaning_i):
 
 
 def main():
-    tasks_joined_df = pd.read_csv('responses/tasks_joined.csv')
-    # tasks_results_df = pd.read_csv('responses/task_results.csv')
-
-    tasks_joined_df["response_dict"] = tasks_joined_df["json_string"].apply(parse_json_str)
+    parser = argparse.ArgumentParser(description="Parse the raw task responses into responses.csv")
+    parser.add_argument("--input", default="responses/tasks_joined.csv")
+    parser.add_argument("--output", default="responses/responses.csv")
+    parser.add_argument("--rejects", default="responses/rejects.csv",
+                        help="where payloads that could not be decoded are written")
+    parser.add_argument("--registry", default="responses/anonymization_registry.json",
+                        help="worker id to anonymized id mapping and processed rows, kept across runs")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only process rows missing from the registry and append them to the output")
+    parser.add_argument("--streaming", action="store_true",
+                        help="read the input in chunks and parse payloads on a process pool")
+    parser.add_argument("--parquet", action="store_true",
+                        help="also write the columnar responses store (see response_store.py)")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
 
-    tasks_joined_df.drop(columns=["json_string"], inplace=True)
-
-    response_columns = list(tasks_joined_df["response_dict"][1].keys())
-
-    for column in response_columns:
-        tasks_joined_df[column] = tasks_joined_df["response_dict"].apply(lambda x: x[column]if column in x else None)
+    if args.streaming:
+        preprocess_tasks_joined_streaming(args.input, args.output, args.rejects, args.registry,
+                                          args.incremental, args.chunk_size, args.workers)
+    else:
+        preprocess_tasks_joined(args.input, args.output, args.rejects, args.registry, args.incremental)
 
-    tasks_joined_df.to_csv("responses/responses.csv", index=False, quoting=csv.QUOTE_NONNUMERIC)
+    if args.parquet:
+        convert_csv_to_parquet(args.output, os.path.splitext(args.output)[0] + ".parquet")
 
 
 if __name__ == "__main__":
@@ -1,7 +1,25 @@
+import argparse
 import csv
+import os
+
+import numpy as np
 import pandas as pd
 from scipy.stats import pearsonr, spearmanr
 import cv
+from analyze_responses import encode_comparisons, load_and_preprocess_responses
+from artifact_cache import ArtifactCache
+from bootstrap import (
+    bootstrap_best_worst_metrics,
+    get_cluster_counts,
+    get_percentile_intervals,
+    get_resampled_correlations,
+)
+
+RESULTS_DIR = "results"
+ORIGINAL_LAB = "original"
+REPRODUCTION_LABS = ["lab1"]
+# the lab whose individual judgments are in responses/, needed for the resampled CIs
+RESPONSES_LAB = "lab1"
 
 
 def sort_by_system_order(df, system_order):
@@ -10,43 +28,79 @@ def sort_by_system_order(df, system_order):
     return df
 
 
-def calculate_pearson_spearman_correlation(original_df, reproduced_df, system_order):
-    # Sort dataframes by the defined system order
-    original_df = sort_by_system_order(original_df.copy(), system_order)
-    reproduced_df = sort_by_system_order(reproduced_df.copy(), system_order)
-
-    # Calculate correlations
-    pearson_corr, pearson_p = pearsonr(
-        original_df["best_worst_scale"], reproduced_df["best_worst_scale"]
+def get_resampled_scales(responses_processed_df, resample_count=10000, resample_level="participant", seed=0,
+                         max_workers=None, mp_context=None):
+    """
+    Best-worst scales of the reproduction recomputed from resampled judgments
+    (participants or items drawn with replacement), see bootstrap.py.
+    :return: resamples x systems dataframe
+    """
+    resample_columns = {"participant": "participant_id", "item": "dataset_id"}
+    comparisons = encode_comparisons(responses_processed_df)
+    win_counts, loss_counts = get_cluster_counts(
+        responses_processed_df[resample_columns[resample_level]],
+        comparisons["winner_codes"],
+        comparisons["loser_codes"],
+        len(comparisons["systems"]),
     )
-    spearman_corr, spearman_p = spearmanr(
-        original_df["best_worst_scale"], reproduced_df["best_worst_scale"]
+    best_worst_scale, _ = bootstrap_best_worst_metrics(
+        win_counts, loss_counts, resample_count, seed, max_workers=max_workers, mp_context=mp_context
     )
+    return pd.DataFrame(best_worst_scale, columns=comparisons["systems"])
+
+
+def calculate_pearson_spearman_correlation(original_df, reproduced_df, system_order,
+                                           tables_dir="results/lab1/tables", resampled_scales=None,
+                                           confidence=0.95):
+    """
+    :param resampled_scales: optional resamples x systems dataframe of
+        reproduced best-worst scales (see get_resampled_scales), adds
+        percentile confidence intervals of both correlations
+    """
+    # Pair the systems evaluated in both, in the defined system order
+    paired_df = sort_by_system_order(
+        original_df[["system", "best_worst_scale"]].merge(
+            reproduced_df[["system", "best_worst_scale"]], on="system", suffixes=("_original", "_reproduced")
+        ),
+        system_order,
+    ).reset_index(drop=True)
+    original_values = paired_df["best_worst_scale_original"]
+    reproduced_values = paired_df["best_worst_scale_reproduced"]
+
+    # Calculate correlations
+    pearson_corr, pearson_p = pearsonr(original_values, reproduced_values)
+    spearman_corr, spearman_p = spearmanr(original_values, reproduced_values)
 
     # Create result dataframes with all information
     result_df = pd.DataFrame(
         {
-            "system": original_df["system"],
-            "original_value": original_df["best_worst_scale"],
-            "reproduced_value": reproduced_df["best_worst_scale"],
-            "pearson_corr": [pearson_corr] * len(original_df),
-            "pearson_p": [pearson_p] * len(original_df),
-            "spearman_corr": [spearman_corr] * len(original_df),
-            "spearman_p": [spearman_p] * len(original_df),
+            "system": paired_df["system"],
+            "original_value": original_values,
+            "reproduced_value": reproduced_values,
+            "pearson_corr": [pearson_corr] * len(paired_df),
+            "pearson_p": [pearson_p] * len(paired_df),
+            "spearman_corr": [spearman_corr] * len(paired_df),
+            "spearman_p": [spearman_p] * len(paired_df),
         }
     )
 
-    # Ensure final result follows system order
-    result_df = sort_by_system_order(result_df, system_order)
+    if resampled_scales is not None:
+        pearson, spearman = get_resampled_correlations(
+            original_values.to_numpy(), resampled_scales[paired_df["system"]].to_numpy()
+        )
+        for name, resampled_correlations in [("pearson", pearson), ("spearman", spearman)]:
+            lower, upper = get_percentile_intervals(resampled_correlations, confidence)
+            result_df[f"{name}_ci_low"] = lower
+            result_df[f"{name}_ci_high"] = upper
 
     # Save results
     result_df.to_csv(
-        "results/lab1/tables/correlations.csv",
+        os.path.join(tables_dir, "correlations.csv"),
         index=False,
         quoting=csv.QUOTE_NONNUMERIC,
     )
     result_df.to_latex(
-        "results/lab1/tables/correlations.tex",
+        os.path.join(tables_dir, "correlations.tex"),
         float_format="{:0.2f}".format,
         escape=True,
     )
@@ -54,7 +108,7 @@ def calculate_pearson_spearman_correlation(original_df, reproduced_df, system_or
     print(result_df)
 
 
-def create_cv_summary(df, system_order):
+def create_cv_summary(df, system_order, tables_dir="results/lab1/tables"):
     # Create summary dataframe with only System, O, R, and CV*
     summary_df = pd.DataFrame(
         {"System": df["system"], "O": df["original_unshifted"], "R": df["reproduced_unshifted"], "CV*": df["CV*"]}
@@ -65,12 +119,12 @@ def create_cv_summary(df, system_order):
 
     # Save summary results
     summary_df.to_csv(
-        "results/lab1/tables/cv_summary.csv",
+        os.path.join(tables_dir, "cv_summary.csv"),
         index=False,
         quoting=csv.QUOTE_NONNUMERIC,
     )
     summary_df.to_latex(
-        "results/lab1/tables/cv_summary.tex",
+        os.path.join(tables_dir, "cv_summary.tex"),
         float_format="{:0.2f}".format,
         escape=True,
     )
@@ -78,57 +132,67 @@ def create_cv_summary(df, system_order):
     print(summary_df)
 
 
-def calculate_coefficient_of_variation(original_df, reproduced_df, range_start, range_end, system_order):
-    # Sort dataframes by the defined system order
-    original_df = sort_by_system_order(original_df.copy(), system_order)
-    reproduced_df = sort_by_system_order(reproduced_df.copy(), system_order)
+def get_shifted_values(values, range_start):
+    # CV assumes positive measurements, so shift a scale starting below 0 to start at 0
+    if range_start < 0:
+        return values + abs(range_start)
+    return values
+
+
+def calculate_coefficient_of_variation(original_df, reproduced_df, range_start, range_end, system_order,
+                                       tables_dir="results/lab1/tables"):
+    # Pair the systems evaluated in both, in the defined system order
+    paired_df = sort_by_system_order(
+        original_df[["system", "best_worst_scale"]].merge(
+            reproduced_df[["system", "best_worst_scale"]], on="system", suffixes=("_original", "_reproduced")
+        ),
+        system_order,
+    )
 
     # Store original values before shifting
-    original_unshifted = original_df["best_worst_scale"]
-    reproduced_unshifted = reproduced_df["best_worst_scale"]
+    original_unshifted = paired_df["best_worst_scale_original"]
+    reproduced_unshifted = paired_df["best_worst_scale_reproduced"]
 
     # Adjust values if needed
-    if range_start < 0:
-        original_values = original_df["best_worst_scale"] + abs(range_start)
-        reproduced_values = reproduced_df["best_worst_scale"] + abs(range_start)
-    else:
-        original_values = original_df["best_worst_scale"]
-        reproduced_values = reproduced_df["best_worst_scale"]
-
-    full_result_list = []
-    for system, orig_unshift, repro_unshift, orig_val, repro_val in zip(
-        original_df["system"],
-        original_unshifted,
-        reproduced_unshifted,
-        original_values,
-        reproduced_values,
-    ):
-        values = [orig_val, repro_val]
-        precision_results = cv.get_precision_results(values)
-        precision_results["system"] = system
-        precision_results["original_unshifted"] = orig_unshift
-        precision_results["reproduced_unshifted"] = repro_unshift
-        precision_results["original_shifted"] = orig_val
-        precision_results["reproduced_shifted"] = repro_val
-        full_result_list.append(precision_results)
-
-    df = pd.DataFrame(full_result_list)
-
-    # Ensure results follow system order
-    df = sort_by_system_order(df, system_order)
-
-    # Reorder columns to put system first
-    cols = df.columns.tolist()
-    cols = ["system"] + [col for col in cols if col != "system"]
-    df = df[cols]
+    original_values = get_shifted_values(original_unshifted, range_start)
+    reproduced_values = get_shifted_values(reproduced_unshifted, range_start)
+
+    # every system at once, as a 2 (original, reproduced) x systems matrix
+    precision_results = cv.get_precision_results_batch(
+        np.vstack([original_values.to_numpy(), reproduced_values.to_numpy()])
+    )
+
+    df = pd.DataFrame(
+        {
+            "system": paired_df["system"].to_numpy(),
+            "values": [
+                str([orig_val, repro_val])
+                for orig_val, repro_val in zip(original_values, reproduced_values)
+            ],
+            "sample size": precision_results["sample size"],
+            "mean": precision_results["mean"],
+            "unbiased stdev": precision_results["unbiased stdev"],
+            "stdev 95% CI": [
+                "[{:.2f}, {:.2f}]".format(low, high)
+                for low, high in zip(
+                    precision_results["stdev CI low"], precision_results["stdev CI high"]
+                )
+            ],
+            "CV*": precision_results["CV*"],
+            "original_unshifted": original_unshifted.to_numpy(),
+            "reproduced_unshifted": reproduced_unshifted.to_numpy(),
+            "original_shifted": original_values.to_numpy(),
+            "reproduced_shifted": reproduced_values.to_numpy(),
+        }
+    )
 
     df.to_csv(
-        "results/lab1/tables/cv_2_way.csv",
+        os.path.join(tables_dir, "cv_2_way.csv"),
         index=False,
         quoting=csv.QUOTE_NONNUMERIC,
     )
     df.to_latex(
-        "results/lab1/tables/cv_2_way.tex",
+        os.path.join(tables_dir, "cv_2_way.tex"),
         float_format="{:0.2f}".format,
         escape=True,
     )
@@ -136,18 +200,81 @@ def calculate_coefficient_of_variation(original_df, reproduced_df, range_start,
     print(df)
 
     # Create and save summary table
-    create_cv_summary(df, system_order)
+    create_cv_summary(df, system_order, tables_dir)
+
+
+def calculate_multi_lab_coefficient_of_variation(lab_results, range_start, system_order, output_path):
+    """
+    CV* of every system across any number of labs, in one batched call. Labs
+    that did not evaluate a system are left out of that system's sample.
+    :param lab_results: dict of lab name to its results dataframe
+    """
+    systems = sorted(
+        set().union(*(lab_df["system"] for lab_df in lab_results.values())),
+        key=lambda system: system_order.get(system, len(system_order)),
+    )
+    # labs x systems, NaN where a lab has no result for a system
+    scale_df = pd.DataFrame(
+        {
+            lab: lab_df.set_index("system")["best_worst_scale"].reindex(systems)
+            for lab, lab_df in lab_results.items()
+        }
+    )
+    precision_results = cv.get_precision_results_batch(
+        get_shifted_values(scale_df.to_numpy().T, range_start)
+    )
+
+    df = scale_df.rename_axis("system").reset_index()
+    for name, result in precision_results.items():
+        df[name] = result
+
+    df.to_csv(output_path, index=False, quoting=csv.QUOTE_NONNUMERIC)
+    print("\nMulti-lab Coefficient of Variation Results:")
+    print(df)
+    return df
+
+
+def get_lab_results_path(results_dir, lab):
+    # reproductions keep their tables in a tables/ subdirectory, the original results do not
+    tables_path = os.path.join(results_dir, lab, "tables", "results.csv")
+    if os.path.exists(tables_path):
+        return tables_path
+    return os.path.join(results_dir, lab, "results.csv")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Quantified reproducibility of the reproduction results")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--original", default=ORIGINAL_LAB, help="lab with the original results")
+    parser.add_argument("--labs", nargs="+", default=REPRODUCTION_LABS, help="reproduction labs")
+    parser.add_argument("--resample-count", type=int, default=10000,
+                        help=f"bootstrap resamples for the correlation CIs of {RESPONSES_LAB}, 0 to skip")
+    args = parser.parse_args()
+
     # Define system order in main function
     system_order_dict = {"vae": 0, "sep_ae": 1, "lbow": 2, "dips": 3}
-    
-    reproduced_results = pd.read_csv("results/lab1/tables/results.csv")
-    original_results = pd.read_csv("results/original/results.csv")
 
-    calculate_pearson_spearman_correlation(original_results, reproduced_results, system_order_dict)
-    calculate_coefficient_of_variation(original_results, reproduced_results, -100, 100, system_order_dict)
+    original_results = pd.read_csv(get_lab_results_path(args.results_dir, args.original))
+    lab_results = {args.original: original_results}
+    for lab in args.labs:
+        reproduced_results = pd.read_csv(get_lab_results_path(args.results_dir, lab))
+        lab_results[lab] = reproduced_results
+        tables_dir = os.path.join(args.results_dir, lab, "tables")
+
+        resampled_scales = None
+        if lab == RESPONSES_LAB and args.resample_count:
+            resampled_scales = get_resampled_scales(
+                load_and_preprocess_responses(cache=ArtifactCache()), args.resample_count
+            )
+        calculate_pearson_spearman_correlation(original_results, reproduced_results, system_order_dict, tables_dir,
+                                               resampled_scales)
+        calculate_coefficient_of_variation(original_results, reproduced_results, -100, 100, system_order_dict,
+                                           tables_dir)
+
+    if len(args.labs) > 1:
+        calculate_multi_lab_coefficient_of_variation(
+            lab_results, -100, system_order_dict, os.path.join(args.results_dir, "cv_all_labs.csv")
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,133 @@
+"""Mergeable t-digest quantile sketch.
+
+A t-digest summarises a stream of values by weighted centroids: small ones
+near both tails, where the caps at the 95th/99th percentile are taken, and
+large ones in the middle. Values are buffered and merged into the centroids in
+one vectorized pass once the buffer is full, so memory stays at about
+compression + buffer_size numbers however many values are added. Two digests
+(e.g. of two collection rounds) merge into a digest of all their values, and a
+digest round-trips through JSON so the digests of several files can be merged
+later without rereading them.
+"""
+
+import numpy as np
+
+DEFAULT_COMPRESSION = 500
+
+
+class TDigest:
+    def __init__(self, compression=DEFAULT_COMPRESSION, buffer_size=None):
+        """
+        :param compression: scale of the number of centroids (at most about
+            compression / 2); larger is more accurate
+        :param buffer_size: values buffered before they are merged into the
+            centroids, 10 * compression by default
+        """
+        self.compression = compression
+        self.buffer_size = buffer_size or 10 * compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+        self._buffer = []
+        self._buffered_count = 0
+
+    @property
+    def count(self):
+        return self.weights.sum() + sum(weights.sum() for _, weights in self._buffer)
+
+    def update(self, values):
+        """
+        Add values to the digest, NaNs are ignored.
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._buffer.append((values, np.ones(len(values))))
+        self._buffered_count += len(values)
+        if self._buffered_count >= self.buffer_size:
+            self.compress()
+
+    def merge(self, other):
+        """
+        Add all values summarised by another digest to this one.
+        """
+        other.compress()
+        if not len(other.weights):
+            return
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._buffer.append((other.means, other.weights))
+        self._buffered_count += len(other.weights)
+        if self._buffered_count >= self.buffer_size:
+            self.compress()
+
+    def compress(self):
+        """
+        Merge the buffer into the centroids. Beyond compression centroids, a
+        centroid gathers the sorted values whose midpoint rank falls into the
+        same unit of the k1 scale function k(q) = compression / (2 pi) * arcsin(2q - 1).
+        """
+        if not self._buffer:
+            return
+        means = np.concatenate([self.means] + [means for means, _ in self._buffer])
+        weights = np.concatenate([self.weights] + [weights for _, weights in self._buffer])
+        self._buffer = []
+        self._buffered_count = 0
+
+        order = np.argsort(means, kind="stable")
+        means = means[order]
+        weights = weights[order]
+        if len(means) <= self.compression:
+            # small enough to keep every centroid, quantiles stay exact
+            self.means = means
+            self.weights = weights
+            return
+        cumulative_weights = np.cumsum(weights)
+        midpoint_quantiles = (cumulative_weights - weights / 2) / cumulative_weights[-1]
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * midpoint_quantiles - 1)
+        buckets = np.floor(k - k[0])
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def quantile(self, levels):
+        """
+        :param levels: quantile levels in [0, 1]
+        :return: array of quantile estimates, interpolated linearly between the
+            centroid ranks as pandas' linear quantile does between values
+        """
+        self.compress()
+        levels = np.asarray(levels, dtype=float)
+        if not len(self.weights):
+            return np.full(levels.shape, np.nan)
+        total_weight = self.weights.sum()
+        # 0-based rank of the centre of every centroid
+        ranks = np.cumsum(self.weights) - (self.weights + 1) / 2
+        is_inner = (ranks > 0) & (ranks < total_weight - 1)
+        ranks = np.r_[0, ranks[is_inner], total_weight - 1]
+        means = np.r_[self.min, self.means[is_inner], self.max]
+        return np.interp(levels * (total_weight - 1), ranks, means)
+
+    def to_dict(self):
+        self.compress()
+        return {
+            "compression": self.compression,
+            "min": float(self.min),
+            "max": float(self.max),
+            "means": self.means.tolist(),
+            "weights": self.weights.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        digest = cls(state["compression"])
+        digest.min = state["min"]
+        digest.max = state["max"]
+        digest.means = np.array(state["means"], dtype=float)
+        digest.weights = np.array(state["weights"], dtype=float)
+        return digest
@@ -0,0 +1,100 @@
+"""Columnar storage for responses/responses.csv.
+
+responses.parquet holds the same table as responses.csv with the system*/dataset*
+columns dictionary encoded, so a consumer can load only the columns it needs
+(e.g. the selections without the sentence texts, or only steps) instead of
+re-parsing the whole wide CSV. The CSV stays the exported, versioned copy.
+
+    python src/response_store.py                # responses.csv -> responses.parquet
+    python src/response_store.py --export-csv   # responses.parquet -> responses.csv
+"""
+
+import argparse
+import csv
+import os
+import re
+
+import pandas as pd
+
+RESPONSES_CSV_PATH = "responses/responses.csv"
+RESPONSES_PARQUET_PATH = "responses/responses.parquet"
+
+CATEGORICAL_COLUMN_PATTERN = re.compile(r"^(systema|systemb|dataset)\d+$")
+
+
+def get_categorical_columns(columns):
+    return [column for column in columns if CATEGORICAL_COLUMN_PATTERN.match(column)]
+
+
+def write_responses_parquet(responses_df, parquet_path=RESPONSES_PARQUET_PATH):
+    responses_df = responses_df.copy()
+    for column in get_categorical_columns(responses_df.columns):
+        responses_df[column] = responses_df[column].astype("category")
+    responses_df.to_parquet(parquet_path, index=False)
+
+
+def convert_csv_to_parquet(csv_path=RESPONSES_CSV_PATH, parquet_path=RESPONSES_PARQUET_PATH):
+    write_responses_parquet(pd.read_csv(csv_path), parquet_path)
+
+
+def export_parquet_to_csv(parquet_path=RESPONSES_PARQUET_PATH, csv_path=RESPONSES_CSV_PATH):
+    responses_df = pd.read_parquet(parquet_path)
+    for column in get_categorical_columns(responses_df.columns):
+        responses_df[column] = responses_df[column].astype(object)
+    responses_df.to_csv(csv_path, index=False, quoting=csv.QUOTE_NONNUMERIC)
+
+
+def is_parquet_current(csv_path=RESPONSES_CSV_PATH, parquet_path=RESPONSES_PARQUET_PATH):
+    """
+    The parquet store is used only if it is at least as recent as the CSV, so a
+    rerun of preprocess_responses.py is never shadowed by a stale store.
+    """
+    if not os.path.exists(parquet_path):
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    return os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path)
+
+
+def read_response_columns(csv_path=RESPONSES_CSV_PATH, parquet_path=RESPONSES_PARQUET_PATH):
+    if is_parquet_current(csv_path, parquet_path):
+        import pyarrow.parquet as pq
+
+        return pq.read_schema(parquet_path).names
+    return pd.read_csv(csv_path, nrows=0).columns.tolist()
+
+
+def read_responses(columns=None, csv_path=RESPONSES_CSV_PATH, parquet_path=RESPONSES_PARQUET_PATH):
+    """
+    Load the responses table, reading only the given columns.
+    :param columns: list of column names, or a callable that selects names from
+        the full header (as for usecols in pd.read_csv); None reads everything
+    :return: responses dataframe, from the parquet store when it is current and
+        from the CSV otherwise
+    """
+    if callable(columns):
+        columns = [
+            column for column in read_response_columns(csv_path, parquet_path) if columns(column)
+        ]
+
+    if is_parquet_current(csv_path, parquet_path):
+        return pd.read_parquet(parquet_path, columns=columns)
+    return pd.read_csv(csv_path, usecols=columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert between responses.csv and responses.parquet")
+    parser.add_argument("--csv", default=RESPONSES_CSV_PATH)
+    parser.add_argument("--parquet", default=RESPONSES_PARQUET_PATH)
+    parser.add_argument("--export-csv", action="store_true",
+                        help="write the CSV from the parquet store instead of the reverse")
+    args = parser.parse_args()
+
+    if args.export_csv:
+        export_parquet_to_csv(args.parquet, args.csv)
+    else:
+        convert_csv_to_parquet(args.csv, args.parquet)
+
+
+if __name__ == "__main__":
+    main()
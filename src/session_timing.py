@@ -0,0 +1,256 @@
+"""Per-session page timings from the `steps` column of the responses.
+
+Every session logs the time it reached each page as a JavaScript date string
+inside a dict literal, e.g. 'task_page': 'Tue May 13 2025 14:02:31 GMT-0400
+(Eastern Daylight Time)'. All page timestamps of all sessions are pulled out
+with one regular expression pass and parsed with one pd.to_datetime call,
+instead of a literal_eval and a strptime per cell,
+giving a compact table with the seconds spent on every page, one row per
+session, that the plots and other analyses reuse.
+
+When the step logs of all collection rounds do not fit in memory, the
+streaming mode reads only the steps column in chunks and feeds the seconds of
+every page into a mergeable t-digest instead. It gives the same caps, deciles
+and ECDF data up to the sketch error, in memory independent of the number of
+sessions, and the sketches saved for several files can be merged later.
+
+    python src/session_timing.py   # writes results/lab1/session_timings.csv
+    python src/session_timing.py --streaming round1.parquet round2.csv --save-sketches sketches.json
+    python src/session_timing.py --streaming --merge-sketches round1.json round2.json
+"""
+
+import argparse
+import csv
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from quantile_sketch import DEFAULT_COMPRESSION, TDigest
+from response_store import (
+    RESPONSES_CSV_PATH,
+    RESPONSES_PARQUET_PATH,
+    is_parquet_current,
+    read_responses,
+)
+
+SESSION_TIMINGS_PATH = "results/lab1/session_timings.csv"
+TIME_SPENT_PATH = "results/lab1/time_spent_on_pages.txt"
+TIME_SPENT_ECDF_PATH = "results/lab1/time_spent_ecdf.csv"
+
+# quantile every page's time is capped at before plotting
+TIME_SPENT_CAP_LEVELS = {"welcome": 0.95, "instructions": 0.99, "task": 0.99}
+TIME_SPENT_QUANTILE_LEVELS = [0.1 * i for i in range(10)]
+PAGE_TITLES = {"welcome": "Welcome Page", "instructions": "Instructions Page", "task": "Task Page"}
+
+# page -> the page that follows it; the time on a page is the difference
+PAGE_TRANSITIONS = {
+    "welcome": ("welcome_page", "instructions_page"),
+    "instructions": ("instructions_page", "task_page"),
+    "task": ("task_page", "finished_page"),
+}
+PAGES = ["welcome_page", "instructions_page", "task_page", "finished_page"]
+# one optional lookahead per page, so a single pass finds every page in any
+# key order and a missing page only leaves its own column empty; the weekday
+# and the time zone suffix are dropped, all pages of a session share it
+STEP_PATTERN = "".join(
+    rf"(?=(?:.*'{page}': '\w{{3}} (?P<{page}>\w{{3}} \d{{2}} \d{{4}} \d{{2}}:\d{{2}}:\d{{2}}))?)"
+    for page in PAGES
+)
+MONTHS = {
+    month: f"{number:02d}"
+    for number, month in enumerate(
+        ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], 1
+    )
+}
+
+
+def parse_step_timestamps(steps):
+    """
+    :param steps: series of `steps` dict literals, one per session
+    :return: dataframe with one datetime column per page, indexed like steps
+    """
+    # e.g. "May 13 2025 14:01:39"
+    timestamps = steps.astype(str).str.extract(STEP_PATTERN).stack(future_stack=True)
+    # rewritten as ISO dates, which pd.to_datetime parses without a per-row strptime
+    iso_timestamps = (
+        timestamps.str[7:11] + "-" + timestamps.str[:3].map(MONTHS) + "-"
+        + timestamps.str[4:6] + " " + timestamps.str[12:]
+    )
+    timestamps = pd.to_datetime(iso_timestamps, format="%Y-%m-%d %H:%M:%S")
+    return timestamps.unstack().reindex(index=steps.index, columns=PAGES)
+
+
+def get_page_seconds(steps):
+    """
+    :return: dataframe with the seconds spent on the welcome, instructions and
+        task pages, indexed like steps
+    """
+    timestamps = parse_step_timestamps(steps)
+    return pd.DataFrame(
+        {
+            page: (timestamps[next_page] - timestamps[page_start]).dt.total_seconds()
+            for page, (page_start, next_page) in PAGE_TRANSITIONS.items()
+        }
+    )
+
+
+def get_session_timings(responses_df=None):
+    """
+    :param responses_df: responses with the task_id and steps columns, read
+        from the response store if None
+    :return: dataframe indexed by task_id with the seconds spent on the
+        welcome, instructions and task pages
+    """
+    if responses_df is None:
+        responses_df = read_responses(columns=["task_id", "steps"])
+    timings_df = get_page_seconds(responses_df["steps"])
+    timings_df.index = pd.Index(responses_df["task_id"].to_numpy(), name="task_id")
+    return timings_df
+
+
+def write_session_timings(timings_df, path=SESSION_TIMINGS_PATH):
+    timings_df.to_csv(path, index=True, quoting=csv.QUOTE_NONNUMERIC)
+
+
+def read_session_timings(path=SESSION_TIMINGS_PATH):
+    return pd.read_csv(path, index_col="task_id")
+
+
+def cap_timings(timings_df, cap_levels):
+    """
+    Cap every page at a quantile of its own timings, all quantiles from one call.
+    :param cap_levels: dict of page to the quantile it is capped at
+    :return: (capped timings, series of the cap of every page)
+    """
+    pages = list(cap_levels)
+    quantiles = timings_df[pages].quantile(sorted(set(cap_levels.values())))
+    caps = pd.Series({page: quantiles.at[level, page] for page, level in cap_levels.items()})
+    capped_df = timings_df.copy()
+    capped_df[pages] = timings_df[pages].clip(upper=caps, axis=1)
+    return capped_df, caps
+
+
+def write_time_spent_quantiles(quantiles, path=TIME_SPENT_PATH):
+    """
+    :param quantiles: dataframe of the (capped) seconds of every page, indexed
+        by quantile level
+    """
+    with open(path, "w") as f:
+        for level, row in quantiles.iterrows():
+            for page, title in PAGE_TITLES.items():
+                f.write(f"{title} {level} quantile: {row[page]:.2f}\n")
+
+
+def iter_steps_chunks(paths, chunk_size=10000):
+    """
+    Read only the steps column of response files (CSV or parquet), chunk_size
+    rows at a time.
+    """
+    for path in paths:
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=["steps"]):
+                yield batch.column("steps").to_pandas()
+        else:
+            for chunk_df in pd.read_csv(path, usecols=["steps"], chunksize=chunk_size):
+                yield chunk_df["steps"]
+
+
+def get_timing_sketches(paths, chunk_size=10000, compression=DEFAULT_COMPRESSION):
+    """
+    :return: dict of page to the t-digest of its seconds over all sessions of all files
+    """
+    sketches = {page: TDigest(compression) for page in PAGE_TRANSITIONS}
+    for steps in iter_steps_chunks(paths, chunk_size):
+        page_seconds = get_page_seconds(steps)
+        for page, sketch in sketches.items():
+            sketch.update(page_seconds[page].to_numpy())
+    return sketches
+
+
+def merge_timing_sketches(sketches_list):
+    merged_sketches = {}
+    for sketches in sketches_list:
+        for page, sketch in sketches.items():
+            merged_sketches.setdefault(page, TDigest(sketch.compression)).merge(sketch)
+    return merged_sketches
+
+
+def write_timing_sketches(sketches, path):
+    with open(path, "w") as f:
+        json.dump({page: sketch.to_dict() for page, sketch in sketches.items()}, f)
+
+
+def read_timing_sketches(path):
+    with open(path) as f:
+        return {page: TDigest.from_dict(state) for page, state in json.load(f).items()}
+
+
+def summarize_timing_sketches(sketches, cap_levels=TIME_SPENT_CAP_LEVELS,
+                              quantile_levels=TIME_SPENT_QUANTILE_LEVELS, ecdf_points=101):
+    """
+    Streaming counterpart of cap_timings and the quantiles of the capped timings.
+    Capping is monotone, so a quantile of the capped timings is the quantile of
+    the timings, capped.
+    :return: (series of the cap of every page, dataframe of the capped
+        quantiles indexed by level, dataframe of the capped seconds of every
+        page at ecdf_points evenly spaced cumulative probabilities)
+    """
+    ecdf_levels = np.linspace(0, 1, ecdf_points)
+    caps = {}
+    quantiles = {}
+    ecdf = {"probability": ecdf_levels}
+    for page, sketch in sketches.items():
+        cap_level = cap_levels.get(page, 1.0)
+        # one quantile call per page for the cap, the quantiles and the ECDF
+        estimates = sketch.quantile(np.r_[cap_level, quantile_levels, ecdf_levels])
+        caps[page] = estimates[0]
+        capped_estimates = np.minimum(estimates[1:], caps[page])
+        quantiles[page] = capped_estimates[: len(quantile_levels)]
+        ecdf[page] = capped_estimates[len(quantile_levels):]
+    return (
+        pd.Series(caps),
+        pd.DataFrame(quantiles, index=pd.Index(quantile_levels, name="level")),
+        pd.DataFrame(ecdf),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-session page timings")
+    parser.add_argument("paths", nargs="*",
+                        help="response files (CSV or parquet) to stream, the response store by default")
+    parser.add_argument("--streaming", action="store_true",
+                        help="summarise the timings with quantile sketches instead of a per-session table")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--compression", type=int, default=DEFAULT_COMPRESSION)
+    parser.add_argument("--merge-sketches", nargs="+", default=[],
+                        help="sketch files of earlier runs to merge in")
+    parser.add_argument("--save-sketches", help="JSON path to save the (merged) sketches to")
+    args = parser.parse_args()
+
+    if not args.streaming:
+        write_session_timings(get_session_timings())
+        return
+
+    paths = args.paths
+    if not paths and not args.merge_sketches:
+        paths = [RESPONSES_PARQUET_PATH if is_parquet_current() else RESPONSES_CSV_PATH]
+    sketches_list = [read_timing_sketches(path) for path in args.merge_sketches]
+    if paths:
+        sketches_list.append(get_timing_sketches(paths, args.chunk_size, args.compression))
+    sketches = merge_timing_sketches(sketches_list)
+    if args.save_sketches:
+        write_timing_sketches(sketches, args.save_sketches)
+
+    caps, quantiles, ecdf_df = summarize_timing_sketches(sketches)
+    write_time_spent_quantiles(quantiles)
+    ecdf_df.to_csv(TIME_SPENT_ECDF_PATH, index=False, quoting=csv.QUOTE_NONNUMERIC)
+    print(f"Sessions: {int(next(iter(sketches.values())).count)}")
+    print("Caps:", caps.round(2).to_dict())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,19 @@
 import csv
 
-import statsmodels.stats.power as smp
+import numpy as np
+import pandas as pd
 from numpy import std, mean, sqrt
-from statsmodels.formula.api import ols
-from statsmodels.stats.anova import anova_lm
 
-from analyze_responses import get_task_scores, load_and_preprocess_responses
+from analyze_responses import METRICS_CODE_PATHS, get_task_scores, load_and_preprocess_responses
+from artifact_cache import ArtifactCache
+from effect_size import get_one_way_anova
+from power_grid import get_power, get_power_grid, get_sample_size, get_sample_size_grid
 
 
 def calculate_sample_size(groups, alpha, effect_size):
     # Define parameters
     power = 0.8  # Desired power level
 
-    # Create an instance of the FTestAnovaPower class
-    power_analysis = smp.FTestAnovaPower()
-
     # % We used the pwr library (Champely, 2020) in R (R
     # % Core Team, 2023) to run the following command:
     # % pwr.anova.test(k=5,f=.3,sig.level=.05,n=20)
@@ -22,11 +21,7 @@ def calculate_sample_size(groups, alpha, effect_size):
     # % systems (5), desired effect size (0.3 or greater), significance
 
     # Calculate sample size
-    sample_size = power_analysis.solve_power(effect_size=effect_size,
-                                             nobs=None,
-                                             alpha=alpha,
-                                             power=power,
-                                             k_groups=groups)
+    sample_size = float(get_sample_size(effect_size, alpha, groups, power))
 
     print("Required Sample Size:", sample_size)
 
@@ -34,13 +29,8 @@ def calculate_sample_size(groups, alpha, effect_size):
 
 
 def calculate_power(n_groups, alpha, effect_size, sample_size):
-    # Define parameters
-
-    # Create an instance of the FTestAnovaPower class
-    power_analysis = smp.FTestAnovaPower()
-
     # Calculate power
-    power = power_analysis.solve_power(effect_size=effect_size, nobs=sample_size, alpha=alpha, k_groups=n_groups)
+    power = float(get_power(effect_size, sample_size, alpha, n_groups))
 
     return power
 
@@ -52,34 +42,53 @@ def calculate_cohen_d(x, y):
     return (mean(x) - mean(y)) / sqrt(((nx - 1) * std(x, ddof=1) ** 2 + (ny - 1) * std(y, ddof=1) ** 2) / dof)
 
 
-def measure_empirical_effect_size(scores_df):
-    # Initialize list to store Cohen's d for each pairwise comparison
-    cohen_d_list = []
-
-    reshaped_data = scores_df.melt(var_name='predictor', value_name='response')
+def get_anova_table(scores_df):
+    """
+    One-way ANOVA of the item scores by system, computed in closed form from
+    the per-system sums, laid out like anova_lm's table.
+    """
+    scores = scores_df.to_numpy(dtype=float)
+    anova = get_one_way_anova(
+        np.full(scores.shape[1], len(scores)), scores.sum(axis=0), (scores**2).sum(axis=0)
+    )
+
+    anova_table = pd.DataFrame(
+        {
+            "sum_sq": [anova["ss_between"], anova["ss_within"]],
+            "df": [float(anova["df_between"]), float(anova["df_within"])],
+            "F": [anova["f_value"], np.nan],
+            "PR(>F)": [anova["p_value"], np.nan],
+        },
+        index=["C(predictor)", "Residual"],
+    )
+    return anova_table, anova
 
-    # Fit ANOVA model
-    model = ols('response ~ C(predictor)', data=reshaped_data).fit()
-    anova_table = anova_lm(model, typ=2)
 
-    # Calculate partial eta-squared
-    ss_between = anova_table['sum_sq'] / anova_table['sum_sq'].sum()
-    partial_eta_squared = ss_between / (len(anova_table) - 1)
+def measure_empirical_effect_size(scores_df):
+    """
+    :return: (Cohen's f of the systems, the effect size calculate_power expects,
+        partial eta-squared)
+    """
+    anova_table, anova = get_anova_table(scores_df)
 
-    print("Partial eta-squared:")
-    print(partial_eta_squared)
+    print("Partial eta-squared:", anova["partial_eta_squared"])
+    print("Cohen's f:", anova["cohens_f"])
 
     anova_table.to_csv("results/lab1/tables/anova_table.csv", index=False, quoting=csv.QUOTE_NONNUMERIC,
                        float_format='%.2f')
     anova_table.to_latex("results/lab1/tables/anova_table.tex", index=False, float_format='%.2f', escape=True)
-    effect_size, residual = partial_eta_squared.tolist()
 
-    return effect_size, residual
+    return anova["cohens_f"], anova["partial_eta_squared"]
 
 
-def main():
-    responses_processed_df = load_and_preprocess_responses()
-    scores_df, system_count_dict = get_task_scores(responses_processed_df)
+def report_power_analysis(responses_processed_df, cache=None):
+    if cache is None:
+        scores_df, system_count_dict = get_task_scores(responses_processed_df)
+    else:
+        scores_df, system_count_dict = cache.get_or_compute(
+            cache.get_key("task_scores", code=METRICS_CODE_PATHS, frames=[responses_processed_df]),
+            lambda: get_task_scores(responses_processed_df),
+        )
 
     # cohen j (1988) Statistical Power Analysis for Behavioral Sciences
     # Before looking at how to work out effect size, it might be worth looking at Cohen’s (1988) guidelines. According to him:
@@ -100,14 +109,19 @@ def main():
 
     print(
         f"groups: {groups}, desired_alpha: {desired_alpha}, sample_size: {sample_size}")
-    for effect_size_name, effect_size in effect_size_dict.items():
-        power = calculate_power(groups, desired_alpha, effect_size, sample_size)
+    effect_sizes = list(effect_size_dict.values())
+    powers = get_power_grid(groups, effect_sizes, desired_alpha, sample_size)[0, :, 0, 0]
+    required_sample_sizes = get_sample_size_grid(groups, effect_sizes, desired_alpha)[0, :, 0, 0]
+    for (effect_size_name, effect_size), power, required_sample_size in zip(
+        effect_size_dict.items(), powers, required_sample_sizes
+    ):
         print(f"{effect_size_name} ({effect_size}) effect, power: {power}")
-        required_sample_size = calculate_sample_size(groups, desired_alpha, effect_size)
+        print("Required Sample Size:", required_sample_size)
 
     # current_power = calculate_power(groups, desired_alpha, desired_effect_size, sample_size)
 
-    effect_size, residual = measure_empirical_effect_size(scores_df)
+    effect_size, partial_eta_squared = measure_empirical_effect_size(scores_df)
+    current_power = calculate_power(groups, desired_alpha, effect_size, sample_size)
 
     adjusted_alpha = 0.052  # increase alpha to 0.1 to achieve desired power
 
@@ -118,12 +132,18 @@ def main():
         f.write(f"desired_alpha: {desired_alpha}\n")
         f.write(f"sample_size: {sample_size}\n")
         f.write(f"effect_size: {effect_size}\n")
-        f.write(f"residual: {residual}\n")
+        f.write(f"partial_eta_squared: {partial_eta_squared}\n")
         f.write(f"current_power: {current_power}\n")
         f.write(f"required_sample_size: {required_sample_size}\n")
         f.write(f"adjusted_alpha: {adjusted_alpha}\n")
         f.write(f"adjusted_power: {adjusted_power}\n")
 
 
+def main():
+    cache = ArtifactCache()
+    responses_processed_df = load_and_preprocess_responses(cache=cache)
+    report_power_analysis(responses_processed_df, cache)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,58 @@
+"""Interned storage for the input/outputa/outputb sentences of the comparison table.
+
+Each item is shown to several raters, so the same source sentence and system
+output appear on many rows of the long table. A TextPool keeps every unique
+sentence once and the table built by preprocess_responses_df(responses_df,
+text_pool) stores int32 ids into it; code that needs the actual text looks it
+up on demand. load_and_preprocess_responses(include_text=True) returns such a
+table with its pool, and resolve_texts looks up the texts of the rows a report
+needs. Without include_text the texts are not loaded at all.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class TextPool:
+    def __init__(self):
+        self._text_to_id = {}
+        self._texts = []
+        self._texts_array = None
+
+    def __len__(self):
+        return len(self._texts)
+
+    def intern(self, values):
+        """
+        Add the unique values to the pool.
+        :param values: array-like of sentences (NaN is interned like any other value)
+        :return: int32 array of pool ids, one per value
+        """
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=False)
+
+        unique_ids = np.empty(len(uniques), dtype=np.int32)
+        for i, text in enumerate(uniques):
+            # all missing values share one id
+            key = None if pd.isna(text) else text
+            text_id = self._text_to_id.get(key)
+            if text_id is None:
+                text_id = len(self._texts)
+                self._text_to_id[key] = text_id
+                self._texts.append(text)
+                self._texts_array = None
+            unique_ids[i] = text_id
+
+        return unique_ids[codes]
+
+    def lookup(self, text_ids):
+        """
+        :param text_ids: array-like of pool ids
+        :return: object array with the sentence of each id
+        """
+        if self._texts_array is None:
+            self._texts_array = np.asarray(self._texts, dtype=object)
+        return self._texts_array[np.asarray(text_ids)]
+
+    def memory_usage(self):
+        """Approximate size of the pooled sentences in bytes."""
+        return int(pd.Series(self._texts, dtype=object).memory_usage(deep=True, index=False))
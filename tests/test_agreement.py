@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from agreement import (
+    FleissKappaAccumulator,
+    fleiss_kappa_from_counts,
+    get_rater_influence,
+    krippendorff_alpha_nominal,
+)
+
+# Krippendorff (2011), "Computing Krippendorff's Alpha-Reliability", the
+# nominal example with missing values: 4 coders x 12 units, alpha = 0.743
+KRIPPENDORFF_RELIABILITY_DATA = [
+    [1, 2, 3, 3, 2, 1, 4, 1, 2, np.nan, np.nan, np.nan],
+    [1, 2, 3, 3, 2, 2, 4, 1, 2, 5, np.nan, 3],
+    [np.nan, 3, 3, 3, 2, 3, 4, 2, 2, 5, 1, np.nan],
+    [1, 2, 3, 3, 2, 4, 4, 1, 2, 5, 1, np.nan],
+]
+
+# the worked example of the Wikipedia article on Fleiss' kappa: 10 subjects,
+# 14 raters, 5 categories, kappa = 0.210
+FLEISS_COUNTS = [
+    [0, 0, 0, 0, 14],
+    [0, 2, 6, 4, 2],
+    [0, 0, 3, 5, 6],
+    [0, 3, 9, 2, 0],
+    [2, 2, 8, 1, 1],
+    [7, 7, 0, 0, 0],
+    [3, 2, 6, 3, 0],
+    [2, 5, 3, 2, 2],
+    [6, 5, 2, 1, 0],
+    [0, 2, 2, 3, 7],
+]
+
+
+def get_judgments(reliability_data):
+    """
+    :return: (unit, rater, value) arrays of the non-missing cells of a raters x units matrix
+    """
+    reliability_data = np.asarray(reliability_data, dtype=float)
+    raters, units = np.nonzero(~np.isnan(reliability_data))
+    return units, raters, reliability_data[raters, units]
+
+
+def test_krippendorff_alpha_reference_value():
+    units, _, values = get_judgments(KRIPPENDORFF_RELIABILITY_DATA)
+    assert krippendorff_alpha_nominal(units, values) == pytest.approx(0.743, abs=5e-4)
+
+
+def test_krippendorff_alpha_matches_krippendorff_package():
+    krippendorff = pytest.importorskip("krippendorff")
+    rng = np.random.default_rng(0)
+    reliability_data = rng.integers(0, 3, size=(6, 40)).astype(float)
+    reliability_data[rng.random(reliability_data.shape) < 0.4] = np.nan
+    units, _, values = get_judgments(reliability_data)
+    expected = krippendorff.alpha(reliability_data=reliability_data, level_of_measurement="nominal")
+    assert krippendorff_alpha_nominal(units, values) == pytest.approx(expected)
+
+
+def test_krippendorff_alpha_single_value():
+    with pytest.raises(ValueError):
+        krippendorff_alpha_nominal([0, 0, 1, 1], [1, 1, 1, 1])
+
+
+def test_fleiss_kappa_reference_value():
+    assert fleiss_kappa_from_counts(FLEISS_COUNTS) == pytest.approx(0.20993, abs=5e-5)
+
+
+def test_fleiss_kappa_matches_statsmodels():
+    inter_rater = pytest.importorskip("statsmodels.stats.inter_rater")
+    rng = np.random.default_rng(0)
+    counts = rng.multinomial(5, [0.5, 0.3, 0.2], size=30)
+    assert fleiss_kappa_from_counts(counts) == pytest.approx(inter_rater.fleiss_kappa(counts))
+
+
+def test_fleiss_kappa_accumulator_batches_and_merge():
+    items = np.repeat(np.arange(len(FLEISS_COUNTS)), 14)
+    values = np.concatenate([np.repeat(np.arange(5), row) for row in FLEISS_COUNTS])
+    order = np.random.default_rng(0).permutation(len(items))
+    items, values = items[order], values[order]
+
+    batched = FleissKappaAccumulator()
+    for start in range(0, len(items), 25):
+        batched.update(items[start : start + 25], values[start : start + 25])
+    assert batched.kappa() == pytest.approx(0.20993, abs=5e-5)
+
+    half = len(items) // 2
+    merged = FleissKappaAccumulator().update(items[:half], values[:half])
+    merged.merge(FleissKappaAccumulator().update(items[half:], values[half:]))
+    pd.testing.assert_frame_equal(merged.count_matrix(), batched.count_matrix())
+    assert merged.kappa() == pytest.approx(batched.kappa())
+
+
+def test_rater_influence_matches_recomputation():
+    units, raters, values = get_judgments(KRIPPENDORFF_RELIABILITY_DATA)
+    influence_df = get_rater_influence(units, raters, values)
+    for rater in np.unique(raters):
+        is_kept = raters != rater
+        unit_category_counts = pd.crosstab(units[is_kept], values[is_kept]).to_numpy()
+        assert influence_df.loc[rater, "krippendorff_alpha_without"] == pytest.approx(
+            krippendorff_alpha_nominal(units[is_kept], values[is_kept])
+        )
+        assert influence_df.loc[rater, "fleiss_kappa_without"] == pytest.approx(
+            fleiss_kappa_from_counts(unit_category_counts)
+        )
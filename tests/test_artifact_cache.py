@@ -0,0 +1,75 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from artifact_cache import ArtifactCache
+
+
+def test_get_or_compute_computes_once(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "artifacts"))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return pd.DataFrame({"score": [1, 2, 3]})
+
+    key = cache.get_key("scores", parameters={"seed": 0})
+    first = cache.get_or_compute(key, compute)
+    second = cache.get_or_compute(key, compute)
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(first, second)
+    # a new instance reads the artifact back from disk
+    assert ArtifactCache(str(tmp_path / "artifacts")).get(key)[0]
+
+
+def test_key_changes_with_inputs(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "artifacts"))
+    input_path = tmp_path / "responses.csv"
+    input_path.write_text("a,b\n1,2\n")
+    df = pd.DataFrame({"a": [1, 2]})
+
+    def get_key(parameters=None, frame=df):
+        return cache.get_key("table", inputs=[str(input_path)], parameters=parameters, frames=[frame])
+
+    key = get_key({"seed": 0})
+    assert get_key({"seed": 0}) == key
+    assert get_key({"seed": 1}) != key
+    assert get_key({"seed": 0}, frame=df.assign(a=[1, 3])) != key
+    assert get_key({"seed": 0}, frame=df.astype(float)) != key
+
+    input_path.write_text("a,b\n1,3\n")
+    # same size, so the cached digest must not be reused on the mtime alone
+    os.utime(input_path, ns=(0, os.stat(input_path).st_mtime_ns + 1))
+    assert get_key({"seed": 0}) != key
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "artifacts"), max_bytes=25_000)
+    for i in range(3):
+        cache.put(f"artifact-{i}", np.zeros(1000))
+        # distinct recencies regardless of the file system's timestamp resolution
+        os.utime(cache._get_artifact_path(f"artifact-{i}"), ns=(i * 10**9, i * 10**9))
+    assert cache.get("artifact-0")[0]
+
+    cache.put("artifact-3", np.zeros(1000))
+    assert [cache.get(f"artifact-{i}")[0] for i in range(4)] == [True, False, True, True]
+
+
+def test_shared_between_threads(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "artifacts"), max_bytes=50_000)
+    input_paths = []
+    for i in range(20):
+        input_path = tmp_path / f"input_{i}.txt"
+        input_path.write_text(str(i))
+        input_paths.append(str(input_path))
+
+    def work(i):
+        key = cache.get_key("artifact", inputs=[input_paths[i % 20]], parameters={"i": i % 10})
+        return cache.get_or_compute(key, lambda: np.full(1000, i % 10))[0]
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(work, range(400)))
+    assert results == [i % 10 for i in range(400)]
+    assert not [name for name in os.listdir(tmp_path / "artifacts") if name.endswith(".tmp")]
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from scipy import special, stats
+
+from pairwise_ranking import fit_pairwise_model, get_pairwise_strengths
+
+
+def get_comparisons(pair_wins):
+    """
+    :param pair_wins: dict of (winner code, loser code) to number of wins
+    :return: (winner codes, loser codes)
+    """
+    winner_codes = np.concatenate([np.full(count, winner) for (winner, _), count in pair_wins.items()])
+    loser_codes = np.concatenate([np.full(count, loser) for (_, loser), count in pair_wins.items()])
+    return winner_codes, loser_codes
+
+
+def test_two_systems_closed_form():
+    # 30 wins of system 0 and 10 of system 1
+    winner_codes, loser_codes = get_comparisons({(0, 1): 30, (1, 0): 10})
+
+    strengths, standard_errors = fit_pairwise_model(winner_codes, loser_codes, 2, "bradley_terry")
+    assert strengths[0] - strengths[1] == pytest.approx(np.log(3))
+    # the standard error of the log-odds is sqrt(1 / wins + 1 / losses), half of it per centered strength
+    assert standard_errors[0] == pytest.approx(np.sqrt(1 / 30 + 1 / 10) / 2)
+
+    strengths, _ = fit_pairwise_model(winner_codes, loser_codes, 2, "thurstone")
+    assert strengths[0] - strengths[1] == pytest.approx(stats.norm.ppf(0.75))
+
+
+def test_recovers_strengths():
+    rng = np.random.default_rng(0)
+    true_strengths = np.array([0.8, 0.2, -0.3, -0.7])
+    first = rng.integers(0, 4, size=20_000)
+    second = (first + rng.integers(1, 4, size=len(first))) % 4
+    first_wins = rng.random(len(first)) < special.expit(true_strengths[first] - true_strengths[second])
+    winner_codes = np.where(first_wins, first, second)
+    loser_codes = np.where(first_wins, second, first)
+
+    strengths_df = get_pairwise_strengths(["a", "b", "c", "d"], winner_codes, loser_codes)
+    assert strengths_df["bradley_terry_strength"].sum() == pytest.approx(0, abs=1e-12)
+    np.testing.assert_allclose(
+        strengths_df["bradley_terry_strength"], true_strengths - true_strengths.mean(),
+        atol=4 * strengths_df["bradley_terry_se"].max(),
+    )
+    np.testing.assert_array_equal(
+        strengths_df["thurstone_strength"].argsort(), strengths_df["bradley_terry_strength"].argsort()
+    )
+
+
+def test_not_strongly_connected():
+    # system 0 never lost
+    winner_codes, loser_codes = get_comparisons({(0, 1): 5, (0, 2): 5, (1, 2): 3, (2, 1): 4})
+    with pytest.raises(ValueError):
+        fit_pairwise_model(winner_codes, loser_codes, 3)
+
+    strengths, standard_errors = fit_pairwise_model(winner_codes, loser_codes, 3, prior=1.0)
+    assert np.isfinite(strengths).all() and np.isfinite(standard_errors).all()
+    assert strengths.argmax() == 0
+
+
+def test_unknown_model():
+    with pytest.raises(ValueError):
+        fit_pairwise_model([0], [1], 2, "elo")
@@ -0,0 +1,56 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from permutation import get_pair_indices, get_permutation_statistics, permutation_test
+
+
+def get_exact_p_values(scores):
+    """
+    :return: (omnibus p-value, pairwise p-values, max-T adjusted pairwise
+        p-values) over every within-item permutation of a small score matrix
+    """
+    pair_indices = get_pair_indices(scores.shape[1])
+    observed_omnibus, observed_differences = get_permutation_statistics(scores.sum(axis=0), pair_indices)
+    row_permutations = [
+        [row[list(order)] for order in itertools.permutations(range(scores.shape[1]))]
+        for row in scores
+    ]
+    column_sums = np.array([np.sum(rows, axis=0) for rows in itertools.product(*row_permutations)])
+    omnibus, pair_differences = get_permutation_statistics(column_sums, pair_indices)
+    return (
+        np.mean(omnibus >= observed_omnibus),
+        (pair_differences >= observed_differences).mean(axis=0),
+        (pair_differences.max(axis=1)[:, None] >= observed_differences).mean(axis=0),
+    )
+
+
+def test_matches_exhaustive_enumeration():
+    scores = np.array([[2, 0, -1], [3, 1, 0], [1, 1, -2], [2, -1, 0], [0, 2, -2]])
+    p_values = permutation_test(scores, permutation_count=50_000, seed=1, max_workers=1)
+    for p, exact_p in zip(p_values, get_exact_p_values(scores)):
+        np.testing.assert_allclose(p, exact_p, atol=0.01)
+
+
+def test_does_not_depend_on_the_worker_count():
+    scores = np.random.default_rng(0).integers(-3, 4, size=(40, 4))
+    serial = permutation_test(scores, permutation_count=2000, seed=3, batch_size=300, max_workers=1)
+    parallel = permutation_test(scores, permutation_count=2000, seed=3, batch_size=300, max_workers=2)
+    for serial_p, parallel_p in zip(serial, parallel):
+        np.testing.assert_array_equal(serial_p, parallel_p)
+
+
+def test_identical_systems():
+    scores = np.tile(np.arange(6)[:, None], (1, 3))
+    omnibus_p, pair_p, pair_p_adjusted = permutation_test(scores, permutation_count=99, max_workers=1)
+    assert omnibus_p == 1
+    np.testing.assert_array_equal(pair_p, 1)
+    np.testing.assert_array_equal(pair_p_adjusted, 1)
+
+
+def test_adjusted_p_values_are_not_smaller():
+    scores = np.random.default_rng(2).integers(-3, 4, size=(30, 4)) + [0, 0, 1, 2]
+    _, pair_p, pair_p_adjusted = permutation_test(scores, permutation_count=999, max_workers=1)
+    assert (pair_p_adjusted >= pair_p).all()
+    assert pair_p_adjusted.min() == pytest.approx(1 / 1000)
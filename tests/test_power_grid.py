@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pytest
+from statsmodels.stats.power import FTestAnovaPower
+
+from power_grid import get_power, get_power_grid, get_sample_size, get_sample_size_grid
+
+EFFECT_SIZES = [0.1, 0.25, 0.4]
+ALPHAS = [0.01, 0.05]
+NOBS = [20, 80, 400]
+
+
+def test_power_matches_statsmodels():
+    power_analysis = FTestAnovaPower()
+    for effect_size in EFFECT_SIZES:
+        for alpha in ALPHAS:
+            for nobs in NOBS:
+                expected = power_analysis.power(effect_size, nobs, alpha, k_groups=4)
+                assert get_power(effect_size, nobs, alpha, 4) == pytest.approx(expected)
+    # not enough observations for the groups
+    assert np.isnan(get_power(0.25, 4, 0.05, 4))
+
+
+def test_sample_size_matches_statsmodels():
+    expected = FTestAnovaPower().solve_power(0.25, alpha=0.05, power=0.8, k_groups=4)
+    assert get_sample_size(0.25, 0.05, 4) == pytest.approx(expected, rel=1e-6)
+    sample_sizes = get_sample_size(np.array(EFFECT_SIZES), 0.05, 4, power=0.9)
+    np.testing.assert_allclose(get_power(EFFECT_SIZES, sample_sizes, 0.05, 4), 0.9, rtol=1e-6)
+    # no effect never reaches the power
+    assert np.isnan(get_sample_size(0.0, 0.05, 4, max_nobs=1e6))
+
+
+def test_grids_are_memoized(tmp_path):
+    cache_dir = str(tmp_path / "power_grid")
+    power_grid = get_power_grid([3, 4], EFFECT_SIZES, ALPHAS, NOBS, cache_dir=cache_dir)
+    assert power_grid.shape == (2, 3, 2, 3)
+    assert power_grid[1, 1, 1, 2] == pytest.approx(get_power(EFFECT_SIZES[1], NOBS[2], ALPHAS[1], 4))
+    np.testing.assert_array_equal(
+        get_power_grid([3, 4], EFFECT_SIZES, ALPHAS, NOBS, cache_dir=cache_dir), power_grid
+    )
+
+    sample_size_grid = get_sample_size_grid(4, EFFECT_SIZES, 0.05, [0.8, 0.9], cache_dir=cache_dir)
+    assert sample_size_grid.shape == (1, 3, 1, 2)
+    np.testing.assert_array_equal(
+        get_sample_size_grid(4, EFFECT_SIZES, 0.05, [0.8, 0.9], cache_dir=None), sample_size_grid
+    )
+    assert len(os.listdir(cache_dir)) == 2
@@ -0,0 +1,107 @@
+import json
+
+import pandas as pd
+import pytest
+
+import preprocess_responses
+
+
+def make_payload(worker_id, session_id, meaning):
+    return json.dumps(
+        {
+            "prolific_pid": worker_id,
+            "session_id": session_id,
+            "meaning0": meaning,
+            "clicks": "{'user_agent': 'test'}",
+            "steps": "{'welcome_page': 'Tue May 13 2025 14:01:39 GMT-0400 (Eastern Daylight Time)'}",
+        }
+    )
+
+
+def write_tasks_joined(path, rows):
+    pd.DataFrame(rows, columns=["task_number", "id", "session_id", "json_string"]).to_csv(path, index=False)
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return {
+        "input_path": str(tmp_path / "tasks_joined.csv"),
+        "output_path": str(tmp_path / "responses.csv"),
+        "rejects_path": str(tmp_path / "rejects.csv"),
+        "registry_path": str(tmp_path / "registry.json"),
+    }
+
+
+@pytest.fixture
+def tasks_joined_rows():
+    return [
+        # the payload's session_id differs from the one in tasks_joined.csv
+        (1, "task-a", "123", make_payload("worker-1", "payload-session-1", True)),
+        (2, "task-b", "124", make_payload("worker-2", "payload-session-2", False)),
+        # empty payload
+        (3, "task-c", "125", None),
+        (4, "task-d", "126", make_payload("worker-1", "payload-session-1", False)),
+    ]
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_empty_payload_is_written_and_registered(paths, tasks_joined_rows, streaming):
+    write_tasks_joined(paths["input_path"], tasks_joined_rows)
+    if streaming:
+        decode_path_counts = preprocess_responses.preprocess_tasks_joined_streaming(
+            **paths, chunk_size=2, max_workers=1
+        )
+    else:
+        decode_path_counts = preprocess_responses.preprocess_tasks_joined(**paths)
+
+    assert decode_path_counts["empty"] == 1
+    assert len(pd.read_csv(paths["output_path"])) == 4
+    with open(paths["registry_path"]) as f:
+        registry = json.load(f)
+    assert registry["processed_keys"] == [
+        ["123", "task-a"], ["124", "task-b"], ["125", "task-c"], ["126", "task-d"]
+    ]
+    assert registry["worker_id_to_anonymized_id"] == {"worker-1": "anon_worker_0", "worker-2": "anon_worker_1"}
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_incremental_rerun(paths, tasks_joined_rows, streaming):
+    def run():
+        if streaming:
+            preprocess_responses.preprocess_tasks_joined_streaming(
+                **paths, incremental=True, chunk_size=2, max_workers=1
+            )
+        else:
+            preprocess_responses.preprocess_tasks_joined(**paths, incremental=True)
+        return pd.read_csv(paths["output_path"])
+
+    write_tasks_joined(paths["input_path"], tasks_joined_rows)
+    first_df = run()
+
+    # no new data: nothing is appended
+    pd.testing.assert_frame_equal(run(), first_df)
+
+    # a new row of a known and one of a new worker: only they are appended,
+    # with stable anonymized ids
+    tasks_joined_rows.append((5, "task-e", "127", make_payload("worker-3", "payload-session-3", True)))
+    tasks_joined_rows.append((6, "task-f", "128", make_payload("worker-2", "payload-session-2", True)))
+    write_tasks_joined(paths["input_path"], tasks_joined_rows)
+    rerun_df = run()
+    assert len(rerun_df) == 6
+    pd.testing.assert_frame_equal(rerun_df.iloc[:4], first_df)
+    assert rerun_df["prolific_pid"].iloc[4:].tolist() == ["anon_worker_2", "anon_worker_1"]
+
+
+def test_rejected_payload_is_retried(paths, tasks_joined_rows):
+    tasks_joined_rows[1] = (2, "task-b", "124", "{not a payload")
+    write_tasks_joined(paths["input_path"], tasks_joined_rows)
+    decode_path_counts = preprocess_responses.preprocess_tasks_joined(**paths, incremental=True)
+    assert decode_path_counts["rejected"] == 1
+    assert pd.read_csv(paths["rejects_path"])["id"].tolist() == ["task-b"]
+    assert len(pd.read_csv(paths["output_path"])) == 3
+
+    tasks_joined_rows[1] = (2, "task-b", "124", make_payload("worker-2", "payload-session-2", False))
+    write_tasks_joined(paths["input_path"], tasks_joined_rows)
+    preprocess_responses.preprocess_tasks_joined(**paths, incremental=True)
+    output_df = pd.read_csv(paths["output_path"])
+    assert sorted(output_df["id"]) == ["task-a", "task-b", "task-c", "task-d"]
@@ -0,0 +1,90 @@
+import json
+
+import numpy as np
+
+from quantile_sketch import TDigest
+
+LEVELS = [0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 1]
+
+
+def get_rank_error(values, estimates, levels):
+    """
+    :return: largest distance between the requested quantile levels and the
+        fraction of values below each estimate
+    """
+    values = np.sort(values)
+    ranks = np.searchsorted(values, estimates) / len(values)
+    return np.abs(ranks - np.asarray(levels)).max()
+
+
+def test_exact_below_compression():
+    values = np.random.default_rng(0).exponential(30, size=400)
+    digest = TDigest(compression=500)
+    digest.update(values[:150])
+    digest.update(np.r_[values[150:], np.nan])
+    assert digest.count == 400
+    np.testing.assert_allclose(digest.quantile(LEVELS), np.quantile(values, LEVELS))
+
+
+def test_empty_digest():
+    assert np.isnan(TDigest().quantile([0.5])).all()
+
+
+def test_merge():
+    rng = np.random.default_rng(0)
+    first_values = rng.exponential(30, size=50_000)
+    second_values = rng.normal(200, 20, size=30_000)
+    first = TDigest(compression=200)
+    second = TDigest(compression=200)
+    for chunk in np.array_split(first_values, 7):
+        first.update(chunk)
+    for chunk in np.array_split(second_values, 3):
+        second.update(chunk)
+
+    merged = TDigest(compression=200)
+    merged.merge(first)
+    merged.merge(second)
+    all_values = np.r_[first_values, second_values]
+
+    assert merged.count == len(all_values)
+    assert len(merged.means) <= 200
+    estimates = merged.quantile(LEVELS)
+    assert estimates[0] == all_values.min()
+    assert estimates[-1] == all_values.max()
+    assert get_rank_error(all_values, estimates, LEVELS) < 0.005
+    # the tails are kept at a much finer resolution than the middle
+    tail_levels = [0.001, 0.01, 0.99, 0.999]
+    assert get_rank_error(all_values, merged.quantile(tail_levels), tail_levels) < 0.001
+
+
+def test_merge_small_digests_stays_exact():
+    rng = np.random.default_rng(1)
+    digests = [TDigest(compression=500) for _ in range(3)]
+    values = []
+    for digest in digests:
+        digest_values = rng.integers(0, 600, size=100).astype(float)
+        digest.update(digest_values)
+        values.append(digest_values)
+
+    merged = TDigest(compression=500)
+    for digest in digests:
+        merged.merge(digest)
+    np.testing.assert_allclose(merged.quantile(LEVELS), np.quantile(np.concatenate(values), LEVELS))
+
+
+def test_dict_round_trip():
+    digest = TDigest(compression=100)
+    digest.update(np.random.default_rng(0).lognormal(3, 1, size=20_000))
+    state = json.loads(json.dumps(digest.to_dict()))
+    restored = TDigest.from_dict(state)
+
+    assert restored.compression == digest.compression
+    assert restored.count == digest.count
+    np.testing.assert_array_equal(restored.quantile(LEVELS), digest.quantile(LEVELS))
+
+    # a restored digest keeps accepting values like the original
+    extra_values = np.arange(1000, dtype=float)
+    digest.update(extra_values)
+    restored.update(extra_values)
+    np.testing.assert_array_equal(restored.quantile(LEVELS), digest.quantile(LEVELS))
+    assert restored.to_dict() == digest.to_dict()
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from session_timing import cap_timings, get_page_seconds
+
+
+def get_steps(**pages):
+    return str({
+        f"{page}_page": f"Tue May 13 2025 {time} GMT-0400 (Eastern Daylight Time)"
+        for page, time in pages.items()
+    })
+
+
+def test_page_seconds():
+    steps = pd.Series(
+        [
+            get_steps(welcome="14:01:39", instructions="14:02:09", task="14:05:00", finished="14:20:00"),
+            # keys in another order, and a page crossing midnight into the next day
+            "{'finished_page': 'Wed May 14 2025 00:00:10 GMT+0100 (British Summer Time)', "
+            + get_steps(task="23:59:50", instructions="23:59:00", welcome="23:58:00")[1:],
+            # missing finished page
+            get_steps(welcome="10:00:00", instructions="10:00:05", task="10:00:15"),
+        ],
+        index=[7, 8, 9],
+    )
+    page_seconds = get_page_seconds(steps)
+    expected = pd.DataFrame(
+        {
+            "welcome": [30.0, 60.0, 5.0],
+            "instructions": [171.0, 50.0, 10.0],
+            "task": [900.0, 20.0, np.nan],
+        },
+        index=[7, 8, 9],
+    )
+    pd.testing.assert_frame_equal(page_seconds, expected)
+
+
+def test_cap_timings():
+    timings_df = pd.DataFrame({"welcome": np.arange(101.0), "task": np.arange(101.0) * 2})
+    capped_df, caps = cap_timings(timings_df, {"welcome": 0.9, "task": 0.5})
+    assert caps.to_dict() == {"welcome": 90.0, "task": 100.0}
+    assert capped_df["welcome"].max() == 90.0
+    assert capped_df["task"].max() == 100.0
+    pd.testing.assert_series_equal(capped_df["welcome"].iloc[:90], timings_df["welcome"].iloc[:90])
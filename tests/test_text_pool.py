@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from analyze_responses import SLOT_TEXT_FIELDS, resolve_texts
+from text_pool import TextPool
+
+
+def test_intern_and_lookup():
+    text_pool = TextPool()
+    first_ids = text_pool.intern(["a", "b", "a", np.nan])
+    second_ids = text_pool.intern(["b", "c", None])
+
+    assert len(text_pool) == 4
+    assert first_ids.dtype == np.int32
+    assert first_ids[0] == first_ids[2]
+    assert second_ids[0] == first_ids[1]
+    # all missing values share one id
+    assert second_ids[2] == first_ids[3]
+    assert text_pool.lookup(second_ids[:2]).tolist() == ["b", "c"]
+
+
+def test_resolve_texts():
+    texts_df = pd.DataFrame(
+        {
+            "input": ["source 1", "source 1", "source 2"],
+            "outputa": ["output 1", "output 2", "output 1"],
+            "outputb": ["output 2", "output 1", "output 3"],
+        },
+        index=[3, 5, 8],
+    )
+    text_pool = TextPool()
+    responses_processed_df = pd.DataFrame(
+        {f"{field}_id": text_pool.intern(texts_df[field]) for field in SLOT_TEXT_FIELDS},
+        index=texts_df.index,
+    )
+
+    assert len(text_pool) == 5
+    pd.testing.assert_frame_equal(resolve_texts(responses_processed_df, text_pool), texts_df)
+    pd.testing.assert_frame_equal(
+        resolve_texts(responses_processed_df.iloc[1:], text_pool), texts_df.iloc[1:]
+    )